@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from pathlib import Path
@@ -19,6 +19,35 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def add_missing_columns(bind, metadata=None) -> list:
+    """
+    Add model columns missing from existing tables (create_all only creates
+    whole tables), so a database from an older version keeps working.
+    Scalar Python defaults become the column's DEFAULT for existing rows.
+    Returns the "table.column" names added.
+    """
+    metadata = metadata or Base.metadata
+    existing_tables = set(inspect(bind).get_table_names())
+    added = []
+    with bind.begin() as conn:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(dialect=conn.dialect)}'
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                if isinstance(default, (bool, int, float)):
+                    ddl += f" DEFAULT {int(default) if isinstance(default, bool) else default}"
+                elif isinstance(default, str):
+                    ddl += " DEFAULT '" + default.replace("'", "''") + "'"
+                conn.execute(text(ddl))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
 def get_db():
     db = SessionLocal()
     try:
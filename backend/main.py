@@ -1,16 +1,23 @@
+import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from starlette.routing import Match
 from sqlalchemy.orm import Session
-from backend.database import engine, Base, get_db, SessionLocal
+from backend.database import engine, Base, get_db, SessionLocal, add_missing_columns
 from backend import models
 from backend.routers import inbox, prompts, agent, action_items, playground, followups, meetings, dossier, agentic, analytics, rag
 from backend.logger import get_logger
+from backend.services.llm_metrics import llm_metrics, current_endpoint
 
 logger = get_logger(__name__)
 
-# Create tables
+# Create tables, and add columns introduced since an existing database was created
 Base.metadata.create_all(bind=engine)
+_added_columns = add_missing_columns(engine)
+if _added_columns:
+    logger.info(f"Added columns to existing tables: {', '.join(_added_columns)}")
 
 
 @asynccontextmanager
@@ -20,18 +27,31 @@ async def lifespan(app: FastAPI):
     Auto-seeds database on startup for ephemeral environments.
     """
     from backend.services import inbox_service
+    from backend.services.ingest_service import backfill_clean_bodies, backfill_redacted_bodies
     db = SessionLocal()
     try:
         inbox_service.load_mock_data(db)
         logger.info("Database auto-seeded on startup.")
+        cleaned = backfill_clean_bodies(db)
+        if cleaned:
+            logger.info(f"Computed clean_body for {cleaned} existing emails.")
+        redacted = backfill_redacted_bodies(db)
+        if redacted:
+            logger.info(f"Computed redacted_body for {redacted} existing emails.")
     except Exception as e:
         logger.error(f"Auto-seed failed: {e}")
     finally:
         db.close()
-    
+
+    # Durable processing jobs (services/job_queue); queued or interrupted jobs resume here
+    from backend.services.job_queue import job_queue
+    job_queue.start(int(os.getenv("JOB_WORKERS", "1")))
+
     yield  # Application runs here
-    
-    # Shutdown logic (if needed)
+
+    job_queue.stop()
+    from backend.services.dark_patterns_service import shutdown_scan_pool
+    shutdown_scan_pool()
     logger.info("Application shutting down.")
 
 
@@ -45,6 +65,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def label_llm_calls(request: Request, call_next):
+    """Label LLM metrics with the matched route template (e.g. "GET /agent/actions/{email_id}")."""
+    endpoint = request.url.path
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            endpoint = getattr(route, "path", endpoint)
+            break
+    token = current_endpoint.set(f"{request.method} {endpoint}")
+    try:
+        return await call_next(request)
+    finally:
+        current_endpoint.reset(token)
+
 # Register all routers
 app.include_router(inbox.router)
 app.include_router(prompts.router)
@@ -76,7 +111,16 @@ async def status():
         "llm": {
             "mode": "MOCK" if llm_service.is_mock else f"REAL ({llm_service.provider})",
             "provider": llm_service.provider,
-            "key_present": bool(llm_service.api_key)
+            "key_present": bool(llm_service.api_key),
+            "cache": llm_service.cache.stats(),
+            "providers": {
+                name: {**health, "model": llm_service.models[name], "rate_limit": llm_service.rate_limiters[name].stats()}
+                for name, health in llm_service.router.stats().items()
+            },
+            "max_concurrency": llm_service.max_concurrency,
+            "coalesced_requests": llm_service.coalesced,
+            "retry_budget": llm_service.retry_policy.budget.stats(),
+            "metrics": llm_metrics.summary()
         },
         "rag": rag_service.get_status(),
         "classifier": {
@@ -86,6 +130,12 @@ async def status():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """LLM call metrics in Prometheus text format."""
+    return PlainTextResponse(llm_metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/seed")
 def seed_db(db: Session = Depends(get_db)):
     """
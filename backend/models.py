@@ -10,8 +10,12 @@ class Email(Base):
     sender = Column(String, index=True)
     subject = Column(String, index=True)
     body = Column(Text)
+    clean_body = Column(Text, nullable=True)  # Body without quoted history/signatures/boilerplate, for LLM & embedding paths
+    redacted_body = Column(Text, nullable=True)  # clean_body with PII redacted once at ingest, for LLM prompts
+    redaction_version = Column(Integer, nullable=True)  # pii_service.REDACTION_VERSION used for redacted_body
     timestamp = Column(DateTime, default=datetime.utcnow)
     category = Column(String, default="Pending Analysis")
+    category_source = Column(String, default="classifier")  # classifier, confirmed (user agreed), user (user changed)
     is_read = Column(Boolean, default=False)
     
     # Sentiment Analysis
@@ -33,6 +37,11 @@ class Email(Base):
     rag_sources = Column(JSON, default=[])  # List of source document IDs/Names
     human_edited = Column(Boolean, default=False)  # True if user modified the draft
     processing_time_seconds = Column(Float, default=0.0)  # Time taken for AI to process
+    processing_tier = Column(String, nullable=True)  # skip, rules or llm (services/processing_policy)
+    summary = Column(Text, nullable=True)  # One-sentence summary written at processing time, used for chat context
+    key_facts = Column(JSON, nullable=True)  # Up to 3 short facts (people, amounts, dates) from processing
+    content_hash = Column(String, nullable=True)  # Hash of sender/subject/body when last processed
+    pipeline_version = Column(Integer, nullable=True)  # agent_service.PIPELINE_VERSION when last processed
     
     # Relationships
     action_items = relationship("ActionItem", back_populates="email")
@@ -79,3 +88,65 @@ class FollowUp(Base):
     status = Column(String, default="pending")  # pending, completed, overdue
     created_at = Column(DateTime, default=datetime.utcnow)
 
+
+class Job(Base):
+    """Durable background job (services/job_queue), e.g. processing a list of emails."""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, default="process_emails")
+    email_ids = Column(JSON, default=[])  # Work items, processed in order
+    force = Column(Boolean, default=False)  # Reprocess emails that are already up to date
+    status = Column(String, default="queued", index=True)  # queued, running, done, failed
+    attempts = Column(Integer, default=0)  # Times a worker has claimed the job
+    max_attempts = Column(Integer, default=3)
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)  # Items finished; a retried job resumes from here
+    failed = Column(Integer, default=0)  # Items that raised while processing
+    error = Column(Text, nullable=True)  # Last error
+    worker = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)  # Refreshed while running; a stale heartbeat means the worker died
+    run_after = Column(DateTime, nullable=True)  # Retry backoff
+
+class StageTiming(Base):
+    """Per-stage timing of an email's last processing run (services/stage_graph)."""
+    __tablename__ = "stage_timings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    email_id = Column(String, ForeignKey("emails.id"), index=True)
+    stage = Column(String)  # classify, dark_patterns, route, extract, batch_extract, ...
+    offset_seconds = Column(Float)  # Start time relative to the start of processing
+    seconds = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ChatSession(Base):
+    """Server-side agent chat conversation (services/chat_session_service)."""
+    __tablename__ = "chat_sessions"
+    # Ids of pruned sessions are never reused, so a stale session_id can't reach another conversation
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True, index=True)
+    email_id = Column(String, ForeignKey("emails.id"), nullable=True)  # Chat about one email
+    summary = Column(Text, default="")  # Rolling summary of turns no longer sent verbatim
+    summarized_count = Column(Integer, default=0)  # Messages folded into the summary
+    context_email_ids = Column(JSON, default=[])  # Emails whose context was already sent, in order
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    messages = relationship("ChatMessage", back_populates="session", order_by="ChatMessage.id",
+                            cascade="all, delete-orphan")
+
+class ChatMessage(Base):
+    __tablename__ = "chat_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("chat_sessions.id"), index=True)
+    role = Column(String)  # user, assistant
+    content = Column(Text)
+    prompt_tokens = Column(Integer, nullable=True)  # Estimated size of the prompt that produced an assistant reply
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    session = relationship("ChatSession", back_populates="messages")
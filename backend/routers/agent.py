@@ -1,44 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
 from backend.database import get_db
-from backend.database import get_db, SessionLocal
 from backend.services import agent_service
+from backend.services.job_queue import job_queue, job_to_dict
+from backend.services.chat_session_service import chat_session_service, session_to_dict
 
-import time
+import json
 
-def run_process_email_background(email_id: str):
+def _sse_response(events):
     """
-    Wrapper to run process_email in a background task with its own DB session.
-    FastAPI's Depends(get_db) session is closed after the request finishes,
-    so we must create a new session for background tasks.
+    Wrap an iterator of event dicts as a Server-Sent Events response.
+    Deltas are sent as `data:` messages, the final event as `event: done`
+    and a provider failure mid-stream as `event: error`.
     """
-    db = SessionLocal()
-    try:
-        agent_service.process_email(db, email_id)
-    finally:
-        db.close()
-
-
-def run_batch_process_background(email_ids: list):
-    """
-    Process multiple emails SEQUENTIALLY with a delay between each call.
-    This avoids hitting free-tier rate limits on Groq/Gemini during demos.
-    """
-    for i, email_id in enumerate(email_ids):
-        db = SessionLocal()
+    def stream():
         try:
-            agent_service.process_email(db, email_id)
+            for event in events:
+                prefix = "event: done\n" if event.get("done") else ""
+                yield f"{prefix}data: {json.dumps(event)}\n\n"
         except Exception as e:
-            # Log but don't crash the whole batch
-            print(f"Error processing {email_id}: {e}")
-        finally:
-            db.close()
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
 
-        # Throttle: wait 1.5s between API calls to respect rate limits
-        if i < len(email_ids) - 1:
-            time.sleep(1.5)
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 router = APIRouter(
@@ -49,6 +39,10 @@ router = APIRouter(
 class ChatRequest(BaseModel):
     query: str
     email_id: Optional[str] = None
+    session_id: Optional[int] = None  # Continue a conversation; a new one is started if omitted
+
+class ChatSessionRequest(BaseModel):
+    email_id: Optional[str] = None
 
 class DraftRequest(BaseModel):
     email_id: str
@@ -57,25 +51,83 @@ class DraftRequest(BaseModel):
     length: str = "concise"
 
 @router.post("/process/{email_id}")
-def process_email_endpoint(email_id: str, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    # Run in background to not block UI
-    background_tasks.add_task(run_process_email_background, email_id)
-    return {"message": "Processing started"}
+def process_email_endpoint(email_id: str, force: bool = False, db: Session = Depends(get_db)):
+    """
+    Queue the email for processing; poll GET /agent/jobs/{job_id} for progress.
+    An email already processed with unchanged content is skipped unless force=true.
+    """
+    job = job_queue.enqueue(db, [email_id], force=force)
+    return {"message": "Processing started", "job_id": job.id}
 
 @router.post("/process-all")
-def process_all_emails(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    """Process all emails sequentially with throttling to avoid rate limits."""
-    from backend.models import Email
-    emails = db.query(Email).limit(20).all()
-    email_ids = [email.id for email in emails]
-    # Single sequential background task instead of 20 concurrent ones
-    background_tasks.add_task(run_batch_process_background, email_ids)
-    return {"message": f"Batch processing started for {len(email_ids)} emails (sequential)"}
+def process_all_emails(force: bool = False, db: Session = Depends(get_db)):
+    """
+    Queue one job for every email that is new, changed or processed by an
+    older pipeline version (every email with force=true). Workers process it
+    in chunks, concurrently on the async LLM path and paced by the provider
+    rate limiter.
+    """
+    if force:
+        from backend.models import Email
+        email_ids = [email_id for (email_id,) in db.query(Email.id).order_by(Email.timestamp.desc())]
+    else:
+        email_ids = agent_service.stale_email_ids(db)
+    job = job_queue.enqueue(db, email_ids, force=force)
+    return {"message": f"Batch processing started for {len(email_ids)} emails", "job_id": job.id}
+
+@router.get("/jobs")
+def list_jobs(limit: int = 20, db: Session = Depends(get_db)):
+    return [job_to_dict(job) for job in job_queue.recent(db, limit)]
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = job_queue.get(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
+
+def _chat_session(request: ChatRequest, db: Session):
+    if request.session_id is None:
+        return chat_session_service.new(request.email_id)  # Stored with its first successful turn
+    session = chat_session_service.get(db, request.session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return session
 
 @router.post("/chat")
 def chat(request: ChatRequest, db: Session = Depends(get_db)):
-    response = agent_service.chat_agent(db, request.query, request.email_id)
-    return {"response": response}
+    """
+    Ask the agent a question. Pass the returned session_id with follow-ups:
+    the server keeps the history and the context already sent.
+    """
+    session = _chat_session(request, db)
+    response = chat_session_service.chat(db, session, request.query)
+    return {"response": response, "session_id": session.id}
+
+@router.post("/chat/stream")
+def chat_stream(request: ChatRequest, db: Session = Depends(get_db)):
+    """Streamed /chat; the final `done` event carries the session_id."""
+    session = _chat_session(request, db)
+    return _sse_response(chat_session_service.stream_chat(db, session, request.query))
+
+@router.post("/chat/sessions")
+def create_chat_session(request: ChatSessionRequest, db: Session = Depends(get_db)):
+    return session_to_dict(chat_session_service.create(db, request.email_id))
+
+@router.get("/chat/sessions/{session_id}")
+def get_chat_session(session_id: int, db: Session = Depends(get_db)):
+    session = chat_session_service.get(db, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return session_to_dict(session, messages=True)
+
+@router.delete("/chat/sessions/{session_id}")
+def delete_chat_session(session_id: int, db: Session = Depends(get_db)):
+    session = chat_session_service.get(db, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    chat_session_service.delete(db, session)
+    return {"message": "Chat session deleted"}
 
 @router.post("/draft")
 def create_draft(request: DraftRequest, db: Session = Depends(get_db)):
@@ -84,6 +136,14 @@ def create_draft(request: DraftRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Could not generate draft")
     return draft
 
+@router.post("/draft/stream")
+def create_draft_stream(request: DraftRequest, db: Session = Depends(get_db)):
+    """Stream the draft as it is generated; the Draft is saved when the stream completes."""
+    events = agent_service.stream_draft(db, request.email_id, request.instructions, request.tone, request.length)
+    if events is None:
+        raise HTTPException(status_code=400, detail="Could not generate draft")
+    return _sse_response(events)
+
 # --- Agentic Capabilities (Moved from agentic.py to ensure loading) ---
 from backend.services import agentic_service
 from typing import Dict, Any
@@ -120,6 +180,13 @@ def generate_smart_reply(request: SmartReplyRequest, db: Session = Depends(get_d
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/smart-reply/stream")
+def generate_smart_reply_stream(request: SmartReplyRequest, db: Session = Depends(get_db)):
+    events = agentic_service.stream_smart_reply(db, request.email_id, request.intent)
+    if events is None:
+        raise HTTPException(status_code=404, detail="Email not found")
+    return _sse_response(events)
+
 @router.get("/intents")
 def get_available_intents():
     return {
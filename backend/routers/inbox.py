@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List
+from pydantic import BaseModel
+from typing import List, Optional
 from backend.database import get_db
-from backend.services import inbox_service, gmail_service
+from backend.services import inbox_service, gmail_service, dark_patterns_service
 from backend.schemas import Email, EmailDetail
 
 router = APIRouter(
@@ -31,6 +32,19 @@ def sync_gmail(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/dark-patterns/scan")
+def scan_dark_patterns(chunk_size: int = 500, workers: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    Re-run dark pattern detection over the whole mailbox and store the results.
+
+    - chunk_size: emails read and updated per batch
+    - workers: scanner processes (default DARK_PATTERN_SCAN_WORKERS or CPU count; 1 = inline).
+      Mailboxes under DARK_PATTERN_SCAN_MIN_ROWS emails are always scanned inline.
+    """
+    if chunk_size < 1 or (workers is not None and workers < 1):
+        raise HTTPException(status_code=400, detail="chunk_size and workers must be positive")
+    return dark_patterns_service.scan_mailbox(db, chunk_size=chunk_size, workers=workers)
+
 @router.get("/", response_model=List[EmailDetail])
 def read_emails(skip: int = 0, limit: int = 100, sort_by: str = "date", db: Session = Depends(get_db)):
     """
@@ -41,6 +55,21 @@ def read_emails(skip: int = 0, limit: int = 100, sort_by: str = "date", db: Sess
     emails = inbox_service.get_emails(db, skip=skip, limit=limit, sort_by=sort_by)
     return emails
 
+class CategoryUpdate(BaseModel):
+    category: Optional[str] = None  # None confirms the current (classifier) category
+
+
+@router.put("/{email_id}/category", response_model=EmailDetail)
+def update_category(email_id: str, update: CategoryUpdate, db: Session = Depends(get_db)):
+    """
+    Confirm or correct an email's category.
+    Labelled emails are used as training data by training/train_from_db.py.
+    """
+    db_email = inbox_service.set_category(db, email_id, update.category)
+    if db_email is None:
+        raise HTTPException(status_code=404, detail="Email not found")
+    return db_email
+
 @router.delete("/{email_id}")
 def delete_email(email_id: str, db: Session = Depends(get_db)):
     from backend.models import Email
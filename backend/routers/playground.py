@@ -4,6 +4,8 @@ from pydantic import BaseModel
 from backend.database import get_db
 from backend.models import Email
 from backend.services.llm_service import llm_service
+from backend.services.pii_service import pii_service
+from backend.services.ingest_service import prompt_body, prompt_field
 
 router = APIRouter(
     prefix="/playground",
@@ -20,11 +22,14 @@ def test_prompt(request: TestPromptRequest, db: Session = Depends(get_db)):
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
 
-    # Simple variable substitution
-    prompt_text = request.template.replace("{subject}", email.subject).replace("{body}", email.body).replace("{sender}", email.sender)
+    # Simple variable substitution; only the user's template needs a fresh PII scan
+    template = pii_service.strip_markers(request.template)
+    prompt_text = (template.replace("{subject}", prompt_field(email.subject))
+                   .replace("{body}", prompt_body(email))
+                   .replace("{sender}", prompt_field(email.sender)))
     
     try:
-        response = llm_service.generate_text(prompt_text)
+        response = llm_service.generate_text(prompt_text, prompt_type="playground")
         return {"response": response}
     except Exception as e:
         print(f"Playground Error: {e}")
@@ -10,6 +10,7 @@ class EmailBase(BaseModel):
     body: str
     timestamp: datetime
     category: str = "Uncategorized"
+    category_source: Optional[str] = "classifier"
     is_read: bool = False
     
     # Sentiment & Urgency
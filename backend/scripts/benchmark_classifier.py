@@ -0,0 +1,109 @@
+"""
+Classifier Micro-Batching Benchmark
+Compares direct per-email predict() calls against the MicroBatcher
+at 1, 16 and 64 concurrent callers.
+
+USAGE:
+    python backend/scripts/benchmark_classifier.py [--requests 512] [--max-batch 32] [--max-wait-ms 2]
+"""
+
+import sys
+import os
+import argparse
+import statistics
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.services.classifier_v2 import EmailClassifierV2, MicroBatcher, build_classifier_pipeline
+
+SAMPLE_EMAILS = [
+    ("Urgent: Q4 Report Due", "I need the Q4 report by EOD tomorrow. Please include the sales figures.", "boss@company.com"),
+    ("Tech Weekly: AI is taking over", "This week in tech: AI agents are the new hotness. Read more...", "newsletter@techcrunch.com"),
+    ("Your invoice #4821", "Your payment of $49.00 was received. Thank you for your business.", "billing@stripe.com"),
+    ("Flight confirmation", "Your flight to Berlin departs Friday at 7:45 AM. Check in online.", "noreply@airline.com"),
+    ("You won a cruise!", "Congratulations winner! Click here to claim your prize now!!!", "lottery@prize-winner.biz"),
+    ("Dinner on Sunday?", "Are you coming over for dinner this Sunday? Love, Mom", "mom@gmail.com"),
+    ("50% off everything", "Our biggest sale of the year starts today. Use code SAVE50.", "deals@store.com"),
+    ("New connection request", "Jane Doe wants to connect with you on LinkedIn.", "notifications@linkedin.com"),
+]
+
+
+def _load_classifier() -> EmailClassifierV2:
+    """Use the trained model if it loads, otherwise fit a reference pipeline on synthetic data."""
+    clf = EmailClassifierV2()
+    if clf.model is None:
+        print("Trained model unavailable - fitting reference pipeline on synthetic data...")
+        from backend.training.train_model import generate_semantic_dataset
+        df = generate_semantic_dataset(n_per_category=60)
+        clf.model = build_classifier_pipeline()
+        clf.model.fit(df["text"], df["label"])
+    return clf
+
+
+def _run(concurrency: int, total_requests: int, predict) -> dict:
+    """Fire total_requests predictions from `concurrency` threads; return latency/throughput stats."""
+    per_thread = max(1, total_requests // concurrency)
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency)
+
+    def worker(offset: int):
+        local = []
+        barrier.wait()
+        for i in range(per_thread):
+            subject, body, sender = SAMPLE_EMAILS[(offset + i) % len(SAMPLE_EMAILS)]
+            t0 = time.perf_counter()
+            predict(subject, body, sender)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark classifier micro-batching")
+    parser.add_argument("--requests", type=int, default=512, help="Total predictions per scenario")
+    parser.add_argument("--max-batch", type=int, default=32, help="MicroBatcher max batch size")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="MicroBatcher max wait per batch")
+    args = parser.parse_args()
+
+    clf = _load_classifier()
+    clf.predict(*SAMPLE_EMAILS[0])  # Warm-up
+
+    print("=" * 72)
+    print("CLASSIFIER MICRO-BATCHING BENCHMARK")
+    print("=" * 72)
+    print(f"{'callers':>8} | {'mode':>8} | {'req/s':>9} | {'p50 ms':>8} | {'p95 ms':>8} | {'avg batch':>9}")
+    print("-" * 72)
+
+    for concurrency in (1, 16, 64):
+        direct = _run(concurrency, args.requests, clf.predict)
+        print(f"{concurrency:>8} | {'direct':>8} | {direct['throughput']:>9.1f} | "
+              f"{direct['p50_ms']:>8.2f} | {direct['p95_ms']:>8.2f} | {'-':>9}")
+
+        batcher = MicroBatcher(clf, max_batch_size=args.max_batch, max_wait_ms=args.max_wait_ms)
+        batched = _run(concurrency, args.requests, batcher.predict)
+        avg_batch = batcher.items / max(batcher.batches, 1)
+        print(f"{concurrency:>8} | {'batched':>8} | {batched['throughput']:>9.1f} | "
+              f"{batched['p50_ms']:>8.2f} | {batched['p95_ms']:>8.2f} | {avg_batch:>9.1f}")
+
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
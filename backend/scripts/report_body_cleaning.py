@@ -0,0 +1,94 @@
+"""
+Body Cleaning Token Report
+Measures how many prompt tokens ingest-time cleaning (services/ingest_service.clean_body)
+saves on the mock and demo inboxes, and optionally on the live database.
+
+Tokens are estimated at ~4 characters per token (same estimate the rate limiter uses).
+
+USAGE:
+    python backend/scripts/report_body_cleaning.py [--db] [--verbose]
+"""
+
+import sys
+import os
+import argparse
+import json
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.services.ingest_service import clean_body
+from backend.services.rate_limiter import estimate_tokens
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+INBOXES = {
+    "mock_inbox": os.path.join(DATA_DIR, "mock_inbox.json"),
+    "demo_emails": os.path.join(DATA_DIR, "demo_emails.json"),
+}
+
+
+def measure(name: str, emails: list, verbose: bool = False) -> dict:
+    raw_tokens = clean_tokens = 0
+    for email in emails:
+        body = email.get("body") or ""
+        raw, clean = estimate_tokens(body), estimate_tokens(clean_body(body))
+        raw_tokens += raw
+        clean_tokens += clean
+        if verbose:
+            print(f"   {raw:>6} -> {clean:>6}  {email.get('subject', '')[:60]}")
+    saved = raw_tokens - clean_tokens
+    return {
+        "inbox": name,
+        "emails": len(emails),
+        "raw_tokens": raw_tokens,
+        "clean_tokens": clean_tokens,
+        "saved_tokens": saved,
+        "reduction": saved / raw_tokens if raw_tokens else 0.0,
+    }
+
+
+def load_db_emails() -> list:
+    from backend.database import SessionLocal
+    from backend.models import Email
+
+    db = SessionLocal()
+    try:
+        return [{"subject": s, "body": b} for s, b in db.query(Email.subject, Email.body)]
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token reduction from ingest-time body cleaning")
+    parser.add_argument("--db", action="store_true", help="Also measure emails stored in the database")
+    parser.add_argument("--verbose", action="store_true", help="Print per-email token counts")
+    args = parser.parse_args()
+
+    sources = {}
+    for name, path in INBOXES.items():
+        with open(path, "r") as f:
+            sources[name] = json.load(f)
+    if args.db:
+        sources["database"] = load_db_emails()
+
+    print("=" * 72)
+    print("BODY CLEANING - PROMPT TOKEN REDUCTION")
+    print("=" * 72)
+    print(f"{'inbox':<14} | {'emails':>6} | {'raw tokens':>10} | {'clean tokens':>12} | {'saved':>6} | {'reduction':>9}")
+    total = {"raw_tokens": 0, "clean_tokens": 0, "emails": 0}
+    for name, emails in sources.items():
+        if args.verbose:
+            print(f"\n{name}:")
+        r = measure(name, emails, args.verbose)
+        for key in total:
+            total[key] += r[key]
+        print(f"{name:<14} | {r['emails']:>6} | {r['raw_tokens']:>10} | {r['clean_tokens']:>12} | "
+              f"{r['saved_tokens']:>6} | {r['reduction']:>8.1%}")
+
+    saved = total["raw_tokens"] - total["clean_tokens"]
+    reduction = saved / total["raw_tokens"] if total["raw_tokens"] else 0.0
+    print("-" * 72)
+    print(f"{'total':<14} | {total['emails']:>6} | {total['raw_tokens']:>10} | {total['clean_tokens']:>12} | "
+          f"{saved:>6} | {reduction:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
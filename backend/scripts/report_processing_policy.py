@@ -0,0 +1,102 @@
+"""
+Processing Policy Report
+Runs the local stages (classifier + dark-pattern scan) over the mock and demo
+inboxes and reports how many emails the processing policy
+(services/processing_policy) routes to skip / rules / llm, i.e. the
+fraction of LLM extraction calls avoided.
+
+USAGE:
+    python backend/scripts/report_processing_policy.py [--verbose] [--sweep]
+        [--skip-confidence 0.95] [--rules-confidence 0.80]
+"""
+
+import sys
+import os
+import argparse
+import json
+from collections import Counter
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.services.classifier_v2 import EmailClassifierV2, build_classifier_pipeline
+from backend.services.dark_patterns_service import detect_dark_patterns
+from backend.services.processing_policy import policy_from_env, SKIP, RULES, LLM
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+INBOXES = {
+    "mock_inbox": os.path.join(DATA_DIR, "mock_inbox.json"),
+    "demo_emails": os.path.join(DATA_DIR, "demo_emails.json"),
+}
+
+
+def _load_classifier() -> EmailClassifierV2:
+    """Use the trained model if it loads, otherwise fit a reference pipeline on synthetic data."""
+    clf = EmailClassifierV2()
+    if clf.model is None:
+        print("Trained model unavailable - fitting reference pipeline on synthetic data...")
+        from backend.training.train_model import generate_semantic_dataset
+        df = generate_semantic_dataset(n_per_category=150)
+        clf.model = build_classifier_pipeline()
+        clf.model.fit(df["text"], df["label"])
+    return clf
+
+
+def route(policy, clf, emails: list, verbose: bool = False) -> Counter:
+    predictions = clf.predict_batch(emails)
+    tiers = Counter()
+    for email, (category, confidence) in zip(emails, predictions):
+        dark = detect_dark_patterns(email.get("subject", ""), email.get("body", ""))
+        tier = policy.decide(category, confidence, dark["has_dark_patterns"], dark["severity"])
+        tiers[tier] += 1
+        if verbose:
+            print(f"   {tier:<5} {category:<16} {confidence:>5.0%}  {email.get('subject', '')[:50]}")
+    return tiers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fraction of LLM extraction calls avoided by the processing policy")
+    parser.add_argument("--skip-confidence", type=float, help="Override PROCESSING_SKIP_CONFIDENCE")
+    parser.add_argument("--rules-confidence", type=float, help="Override PROCESSING_RULES_CONFIDENCE")
+    parser.add_argument("--verbose", action="store_true", help="Print the tier chosen for every email")
+    parser.add_argument("--sweep", action="store_true", help="Also report the avoided fraction across rules thresholds")
+    args = parser.parse_args()
+
+    policy = policy_from_env()
+    if args.skip_confidence is not None:
+        policy.skip_confidence = args.skip_confidence
+    if args.rules_confidence is not None:
+        policy.rules_confidence = args.rules_confidence
+    clf = _load_classifier()
+    inboxes = {}
+    for name, path in INBOXES.items():
+        with open(path, "r") as f:
+            inboxes[name] = json.load(f)
+
+    print("=" * 64)
+    print("PROCESSING POLICY - LLM CALLS AVOIDED")
+    print("=" * 64)
+    print(f"{'inbox':<14} | {'emails':>6} | {'skip':>5} | {'rules':>5} | {'llm':>5} | {'avoided':>8}")
+    total = Counter()
+    for name, emails in inboxes.items():
+        if args.verbose:
+            print(f"\n{name}:")
+        tiers = route(policy, clf, emails, args.verbose)
+        total.update(tiers)
+        avoided = (tiers[SKIP] + tiers[RULES]) / len(emails) if emails else 0.0
+        print(f"{name:<14} | {len(emails):>6} | {tiers[SKIP]:>5} | {tiers[RULES]:>5} | {tiers[LLM]:>5} | {avoided:>7.1%}")
+
+    count = sum(total.values())
+    avoided = (total[SKIP] + total[RULES]) / count if count else 0.0
+    print("-" * 64)
+    print(f"{'total':<14} | {count:>6} | {total[SKIP]:>5} | {total[RULES]:>5} | {total[LLM]:>5} | {avoided:>7.1%}")
+
+    if args.sweep:
+        emails = [email for batch in inboxes.values() for email in batch]
+        print(f"\n{'rules confidence':>16} | {'avoided (all inboxes)':>21}")
+        for threshold in (0.5, 0.6, 0.7, 0.8, 0.9):
+            policy.rules_confidence = threshold
+            tiers = route(policy, clf, emails)
+            print(f"{threshold:>16.2f} | {(tiers[SKIP] + tiers[RULES]) / len(emails):>21.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from backend.database import SessionLocal, engine
 from backend import models
 from backend.models import Email, ActionItem
+from backend.services.ingest_service import ingest_bodies
 
 # Create tables if they don't exist (just in case)
 models.Base.metadata.create_all(bind=engine)
@@ -337,6 +338,7 @@ def seed_data():
                 sender=e_data["sender"],
                 subject=e_data["subject"],
                 body=e_data["body"],
+                **ingest_bodies(e_data["body"]),
                 timestamp=e_data["timestamp"],
                 is_read=e_data.get("is_read", False),
                 category=e_data.get("category", "Uncategorized"),
@@ -1,15 +1,68 @@
+import asyncio
+import hashlib
 import json
+import os
+import re
+import time
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from backend.models import Email, Prompt, ActionItem, Draft, FollowUp
+from backend.models import Email, Prompt, ActionItem, Draft, FollowUp, StageTiming
 from backend.services.llm_service import llm_service
+from backend.services.rate_limiter import estimate_tokens
 from backend.services.sentiment_service import analyze_sentiment
 from backend.services.dark_patterns_service import detect_dark_patterns
 from backend.services.followup_service import extract_followups
 from backend.services.inbox_service import predict_category
+from backend.services.ingest_service import prompt_body, prompt_field, plain_body
+from backend.services.pii_service import pii_service
+from backend.services.processing_policy import (
+    processing_policy, extract_with_rules, skipped_extraction, lead_summary, LLM, RULES, SKIP,
+)
+from backend.services.stage_graph import StageGraph
 from backend.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Batched extraction: several emails share one JSON-mode prompt
+BATCH_EXTRACTION = os.getenv("LLM_BATCH_EXTRACTION", "true").lower() in ("1", "true", "yes")
+BATCH_TOKEN_BUDGET = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "6000"))   # Prompt tokens per batch
+BATCH_MAX_EMAILS = int(os.getenv("LLM_BATCH_MAX_EMAILS", "10"))
+
+# Start the LLM extraction alongside the local stages instead of after the
+# processing-policy decision: lower latency per email, but the call is made
+# (and billed) even when the policy then routes the email to skip/rules.
+# Async path only: a blocking call in a worker thread can't be cancelled
+SPECULATIVE_EXTRACTION = os.getenv("PIPELINE_SPECULATIVE_EXTRACTION", "false").lower() in ("1", "true", "yes")
+
+# Bump when the classifier, processing policy or extraction prompt changes so
+# already-processed emails are picked up again by process-all
+PIPELINE_VERSION = 2  # 2: summary and key_facts
+
+_EXTRACTION_FIELDS = """{{
+    "urgency_score": 1-10 (10 being most urgent),
+    "sentiment": "positive" | "negative" | "neutral" | "urgent",
+    "deadline": {{
+        "has_deadline": true/false,
+        "deadline_text": "original text like 'by 5 PM today' or null",
+        "deadline_iso": "ISO 8601 datetime or null"
+    }},
+    "action_items": [
+        {{ "description": "task description", "deadline": "date or null" }}
+    ],
+    "followups": [
+        {{ "commitment": "what was promised", "committed_by": "me" or sender_email, "due_date": "date or null" }}
+    ],
+    "summary": "one sentence, at most 25 words",
+    "key_facts": ["up to 3 short facts: people, amounts, dates, decisions"]
+}}"""
+
+_URGENCY_GUIDELINES = """Urgency Guidelines:
+- 10: Explicit deadline within 2 hours or ASAP
+- 8-9: Deadline today or tomorrow
+- 6-7: Deadline within the week
+- 4-5: No explicit deadline but action required
+- 1-3: Informational, no action needed"""
+
 
 def _parse_llm_json(response: str) -> dict:
     """
@@ -82,134 +135,458 @@ def _parse_llm_json_array(response: str) -> list:
 
     return []
 
-def process_email(db: Session, email_id: str):
+def process_email(db: Session, email_id: str, force: bool = False):
     """
     Process an email using hybrid AI:
     1. Local classifier for categorization (fast, no API calls)
     2. LLM for complex tasks: action items, followups, deadline extraction
+    Emails already processed with the same content and PIPELINE_VERSION are
+    skipped (returns None) unless force is set.
+    Blocking wrapper around the stage graph; the LLM call runs in a worker thread.
+    SPECULATIVE_EXTRACTION doesn't apply here: a thread can't be cancelled, so
+    a speculative call the policy no longer needs would still be waited for.
     """
-    email = db.query(Email).filter(Email.id == email_id).first()
+    return asyncio.run(_process_email(db, email_id, force, blocking_llm=True))
+
+
+async def process_email_async(db: Session, email_id: str, force: bool = False):
+    """
+    Async variant of process_email for batch runs.
+    The LLM call is awaited so many emails can be in flight at once, bounded
+    by the provider rate limiter and semaphore.
+    """
+    return await _process_email(db, email_id, force, blocking_llm=False)
+
+
+async def _process_email(db: Session, email_id: str, force: bool, blocking_llm: bool):
+    """
+    Stages: classify + dark_patterns (worker threads) -> route (processing
+    policy) -> extract (LLM) or rules. The extraction prompt doesn't depend on
+    the local stages, so with SPECULATIVE_EXTRACTION (async path) the LLM
+    call starts alongside them and is cancelled if the policy routes the
+    email away.
+    All results are written in one transaction at the end.
+    """
+    started = time.perf_counter()
+    email = _load_for_processing(db, email_id, force)
     if not email:
-        logger.warning(f"Email {email_id} not found")
         return None
 
-    logger.info(f"Processing email {email_id}")
-    email.category = "Analyzing..."
+    graph = _local_stage_graph(email)
+    prompt = build_extraction_prompt(email)
+    extract_after = () if SPECULATIVE_EXTRACTION and not blocking_llm else ("route",)
+    if blocking_llm:
+        def extract(results):
+            if results.get("route", LLM) == LLM:
+                return _try_llm(llm_service.generate_text, prompt, use_cache=not force)
+    else:
+        async def extract(results):
+            if results.get("route", LLM) == LLM:
+                return await _atry_llm(llm_service.agenerate_text, prompt, use_cache=not force)
+    graph.add("extract", extract, after=extract_after)
+    await graph.run(started)
+
+    _apply_local_results(email, graph.results)
+    if graph.results["route"] == LLM:
+        try:
+            _apply_extraction(db, email, graph.results["extract"])
+        except Exception as e:
+            logger.warning(f"LLM extraction failed: {e}. Using classifier result only.")
+            # Category is already set by classifier, just set defaults
+            email.sentiment = "neutral"
+            email.urgency_score = 5
+            _apply_summary(email, {})
+    else:
+        _apply_extraction_data(db, email, graph.results["rules"])
+
+    _record_timings(db, email, graph.timings, time.perf_counter() - started)
+    db.commit()
+    return email
+
+
+def _try_llm(generate, prompt: str, use_cache: bool = True):
     try:
-        db.commit()
+        return generate(prompt, json_mode=True, use_cache=use_cache, prompt_type="extraction")
+    except Exception as e:
+        logger.warning(f"LLM extraction call failed: {e}")
+        return None
+
+
+async def _atry_llm(agenerate, prompt: str, use_cache: bool = True):
+    try:
+        return await agenerate(prompt, json_mode=True, use_cache=use_cache, prompt_type="extraction")
     except Exception as e:
-        logger.error(f"Failed to commit initial status: {e}")
-        db.rollback()
-
-    # =========================================================
-    # STEP 1: LOCAL CLASSIFIER (fast, no API calls)
-    # =========================================================
-    category, confidence = predict_category(
-        email.subject, 
-        email.body, 
-        email.sender
+        logger.warning(f"LLM extraction call failed: {e}")
+        return None
+
+
+def content_hash(email: Email) -> str:
+    """Hash of the fields the pipeline reads; a change means the email must be reprocessed."""
+    content = "\x00".join((email.sender or "", email.subject or "", email.body or ""))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def is_up_to_date(email: Email) -> bool:
+    return email.pipeline_version == PIPELINE_VERSION and email.content_hash == content_hash(email)
+
+
+def _mark_processed(email: Email):
+    email.content_hash = content_hash(email)
+    email.pipeline_version = PIPELINE_VERSION
+
+
+def stale_email_ids(db: Session, chunk_size: int = 500) -> list:
+    """Ids (newest first) of emails never processed, edited since, or processed by an older pipeline."""
+    rows = (
+        db.query(Email.id, Email.sender, Email.subject, Email.body, Email.content_hash, Email.pipeline_version)
+        .order_by(Email.timestamp.desc())
+        .yield_per(chunk_size)
     )
-    email.category = category
-    email.confidence_score = confidence
-    logger.info(f"🤖 Classified: {category} ({confidence:.0%})")
+    return [row.id for row in rows if row.pipeline_version != PIPELINE_VERSION or row.content_hash != content_hash(row)]
+
+
+# category_source values set by a person (services/inbox_service); reprocessing never overwrites them
+HUMAN_CATEGORY_SOURCES = ("user", "confirmed")
+
+
+def _load_for_processing(db: Session, email_id: str, force: bool = False):
+    """Returns the email, or None if it doesn't exist or is already up to date (unless force)."""
+    email = db.query(Email).filter(Email.id == email_id).first()
+    if not email:
+        logger.warning(f"Email {email_id} not found")
+        return None
+    if not force and is_up_to_date(email):
+        logger.info(f"Email {email_id} already processed by pipeline v{PIPELINE_VERSION}, skipping")
+        return None
+    logger.info(f"Processing email {email_id}")
+    return email
+
+
+def _local_stage_graph(email: Email) -> StageGraph:
+    """
+    Local stages (no API calls). Stages only see plain values read here,
+    never the session or ORM object, since they run in worker threads.
+    """
+    subject, body, sender, plain = email.subject, email.body, email.sender, plain_body(email)
+    labelled = email.category if email.category_source in HUMAN_CATEGORY_SOURCES else None
+    graph = StageGraph()
+
+    # STEP 1: LOCAL CLASSIFIER (fast, no API calls; concurrent callers share a micro-batch)
+    graph.add("classify", lambda results: predict_category(subject, body, sender))
 
-    # =========================================================
     # STEP 2: DARK PATTERNS DETECTION (regex-based, free)
-    # =========================================================
-    dark_patterns_result = detect_dark_patterns(email.subject, email.body)
+    graph.add("dark_patterns", lambda results: detect_dark_patterns(subject, body))
+
+    # Processing policy: "skip" and "rules" emails are completed without the LLM
+    def route(results):
+        category, confidence = results["classify"]
+        if labelled:
+            category, confidence = labelled, 1.0
+        dark = results["dark_patterns"]
+        tier = processing_policy.decide(category, confidence, dark["has_dark_patterns"], dark["severity"])
+        if tier != LLM:
+            graph.cancel("extract")  # A speculative LLM call is no longer needed
+        return tier
+    graph.add("route", route, after=("classify", "dark_patterns"), blocking=False)
+
+    def rules(results):
+        category = labelled or results["classify"][0]
+        if results["route"] == RULES:
+            return extract_with_rules(subject, plain, category)
+        if results["route"] == SKIP:
+            return skipped_extraction(category)
+        return None
+    graph.add("rules", rules, after=("route",), blocking=False)
+    return graph
+
+
+def _apply_local_results(email: Email, results: dict):
+    category, confidence = results["classify"]
+    if email.category_source in HUMAN_CATEGORY_SOURCES:
+        # A label the user set or confirmed wins over the classifier (and stays a training label)
+        category, confidence = email.category, 1.0
+        logger.info(f"Keeping {email.category_source} category {category} for {email.id}")
+    else:
+        email.category = category
+        email.confidence_score = confidence
+        logger.info(f"🤖 Classified: {category} ({confidence:.0%})")
+
+    dark_patterns_result = results["dark_patterns"]
     email.has_dark_patterns = dark_patterns_result.get("has_dark_patterns", False)
     email.dark_patterns = json.dumps(dark_patterns_result.get("patterns_found", []))
     email.dark_pattern_severity = dark_patterns_result.get("severity", "low")
 
-    # =========================================================
-    # STEP 3: LLM ANALYSIS (only for complex extraction tasks)
-    # Classification is already done - LLM only extracts metadata
-    # =========================================================
-    prompt_text = f"""Analyze this email and extract structured information.
+    email.processing_tier = results["route"]
+    if email.processing_tier != LLM:
+        logger.info(f"Processing tier for {email.id}: {email.processing_tier} ({category}, {confidence:.0%})")
+
+
+def _record_timings(db: Session, email: Email, timings: dict, total: float):
+    """Replace the email's stage timings with this run's; processing_time_seconds is the wall time."""
+    db.query(StageTiming).filter(StageTiming.email_id == email.id).delete()
+    for stage, (offset, seconds) in timings.items():
+        db.add(StageTiming(email_id=email.id, stage=stage, offset_seconds=round(offset, 4), seconds=round(seconds, 4)))
+    email.processing_time_seconds = round(total, 3)
 
-Subject: {email.subject}
-From: {email.sender}
-Body: {email.body}
+
+def build_extraction_prompt(email: Email) -> str:
+    """
+    STEP 3: LLM ANALYSIS (only for complex extraction tasks)
+    Classification is already done - LLM only extracts metadata
+    """
+    return f"""Analyze this email and extract structured information.
+
+Subject: {prompt_field(email.subject)}
+From: {prompt_field(email.sender)}
+Body: {prompt_body(email)}
 
 Return a JSON object with ONLY the following (category is already determined):
-{{
-    "urgency_score": 1-10 (10 being most urgent),
-    "sentiment": "positive" | "negative" | "neutral" | "urgent",
-    "deadline": {{
-        "has_deadline": true/false,
-        "deadline_text": "original text like 'by 5 PM today' or null",
-        "deadline_iso": "ISO 8601 datetime or null"
-    }},
-    "action_items": [
-        {{ "description": "task description", "deadline": "date or null" }}
-    ],
-    "followups": [
-        {{ "commitment": "what was promised", "committed_by": "me" or sender_email, "due_date": "date or null" }}
-    ]
-}}
+{_EXTRACTION_FIELDS.format()}
 
-Urgency Guidelines:
-- 10: Explicit deadline within 2 hours or ASAP
-- 8-9: Deadline today or tomorrow
-- 6-7: Deadline within the week
-- 4-5: No explicit deadline but action required
-- 1-3: Informational, no action needed
+{_URGENCY_GUIDELINES}
 
 Respond ONLY with valid JSON."""
 
-    try:
-        response = llm_service.generate_text(prompt_text, json_mode=True)
-        
-        data = _parse_llm_json(response)
 
+def _batch_email_block(email: Email) -> str:
+    return f"""=== EMAIL id={email.id} ===
+Subject: {prompt_field(email.subject)}
+From: {prompt_field(email.sender)}
+Body: {prompt_body(email)}
+=== END EMAIL ==="""
 
-        if not data:
-            raise Exception("Empty/Invalid JSON from LLM")
-        
-        # Populate fields from LLM
-        email.sentiment = data.get("sentiment", "neutral")
-        email.emotion = data.get("emotion", email.sentiment)
-        email.urgency_score = data.get("urgency_score", 5)
-        
-        # Extract deadline
-        deadline_data = data.get("deadline", {})
-        if deadline_data and deadline_data.get("has_deadline"):
-            email.deadline_text = deadline_data.get("deadline_text")
-            deadline_iso = deadline_data.get("deadline_iso")
-            if deadline_iso:
-                try:
-                    from datetime import datetime as dt
-                    email.deadline_datetime = dt.fromisoformat(deadline_iso.replace('Z', '+00:00'))
-                except:
-                    pass
-        
-        # Populate Actions
-        for action in data.get("action_items", []):
-            db_action = ActionItem(
-                email_id=email.id,
-                description=action.get("description", "Unknown task"),
-                deadline=action.get("deadline")
-            )
-            db.add(db_action)
-            
-        # Populate Followups
-        for followup in data.get("followups", []):
-            db_followup = FollowUp(
-                email_id=email.id,
-                commitment=followup.get("commitment", ""),
-                committed_by=followup.get("committed_by", email.sender),
-                due_date=followup.get("due_date")
-            )
-            db.add(db_followup)
 
+def build_batch_extraction_prompt(emails: list) -> str:
+    """One extraction prompt for several emails; the instruction block is sent once."""
+    blocks = "\n\n".join(_batch_email_block(e) for e in emails)
+    return f"""Analyze each of the following emails and extract structured information.
+
+{blocks}
+
+Return a JSON object keyed by email id (use each id exactly as given). Each value must contain ONLY the following (category is already determined):
+{_EXTRACTION_FIELDS.format()}
+
+Example shape: {{"<email id>": {{"urgency_score": 5, ...}}, "<other email id>": {{...}}}}
+
+{_URGENCY_GUIDELINES}
+
+Respond ONLY with valid JSON."""
+
+
+def plan_extraction_batches(emails: list, token_budget: int = None, max_emails: int = None) -> list:
+    """
+    Greedily pack emails into batches whose prompt stays within token_budget.
+    An email too large for the budget on its own gets a batch of one.
+    """
+    token_budget = token_budget or BATCH_TOKEN_BUDGET
+    max_emails = max_emails or BATCH_MAX_EMAILS
+    overhead = estimate_tokens(build_batch_extraction_prompt([]))
+
+    batches, current, used = [], [], overhead
+    for email in emails:
+        cost = estimate_tokens(_batch_email_block(email))
+        if current and (used + cost > token_budget or len(current) >= max_emails):
+            batches.append(current)
+            current, used = [], overhead
+        current.append(email)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def plan_email_batches(db: Session, email_ids: list) -> list:
+    """Batches of email ids (in the given order) for process_emails_batched_async."""
+    emails = {e.id: e for e in db.query(Email).filter(Email.id.in_(email_ids)).all()}
+    ordered = [emails[i] for i in email_ids if i in emails]
+    return [[e.id for e in batch] for batch in plan_extraction_batches(ordered)]
+
+
+def parse_batch_results(response: str, email_ids: list) -> dict:
+    """
+    Map email id -> extraction dict from a batched response.
+    Tolerates a {"results": {...}} wrapper, a list of objects carrying an
+    "id", and truncated/malformed JSON (each id's object is decoded on its own).
+    Ids whose result can't be recovered are simply missing from the output.
+    """
+    wanted = {str(i) for i in email_ids}
+    data = _parse_llm_json(response)
+    if isinstance(data, dict) and isinstance(data.get("results"), (dict, list)):
+        data = data["results"]
+    if not data:
+        data = _parse_llm_json_array(response)
+
+    results = {}
+    if isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict):
+                key = str(item.get("id", item.get("email_id", "")))
+                if key in wanted:
+                    results[key] = item
+    elif isinstance(data, dict):
+        for key, value in data.items():
+            if str(key) in wanted and isinstance(value, dict):
+                results[str(key)] = value
+
+    # Salvage individual objects from a response that didn't parse as a whole
+    decoder = json.JSONDecoder()
+    for key in wanted - results.keys():
+        match = re.search(r'"' + re.escape(key) + r'"\s*:\s*\{', response or "")
+        if not match:
+            continue
+        try:
+            value, _ = decoder.raw_decode(response, match.end() - 1)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            results[key] = value
+    return results
+
+
+async def process_emails_batched_async(db: Session, email_ids: list, force: bool = False):
+    """
+    Process several emails with one batched extraction call.
+    The local stages of all emails run concurrently first; emails whose
+    batched result is missing or unusable fall back to a single-email call.
+    processing_time_seconds is the time from the start of the batch until
+    that email's result was applied. Everything is committed once.
+    """
+    started = time.perf_counter()
+    processed = [email for email in (_load_for_processing(db, email_id, force) for email_id in email_ids) if email]
+    graphs = [_local_stage_graph(email) for email in processed]
+    await asyncio.gather(*(graph.run(started) for graph in graphs))
+
+    emails = []
+    for email, graph in zip(processed, graphs):
+        _apply_local_results(email, graph.results)
+        if graph.results["route"] == LLM:
+            emails.append(email)
+        else:
+            _apply_extraction_data(db, email, graph.results["rules"])
+            _record_timings(db, email, graph.timings, time.perf_counter() - started)
+    if not emails:
+        db.commit()
+        return processed
+
+    results = {}
+    batch_started = time.perf_counter()
+    try:
+        response = await llm_service.agenerate_text(build_batch_extraction_prompt(emails), json_mode=True,
+                                                   use_cache=not force, prompt_type="batch_extraction")
+        results = parse_batch_results(response, [e.id for e in emails])
     except Exception as e:
-        logger.warning(f"LLM extraction failed: {e}. Using classifier result only.")
-        # Category is already set by classifier, just set defaults
-        email.sentiment = "neutral"
-        email.urgency_score = 5
+        logger.warning(f"Batched extraction failed for {len(emails)} emails: {e}")
+    batch_timing = (batch_started - started, time.perf_counter() - batch_started)
 
+    fallbacks = 0
+    graph_of = {email.id: graph for email, graph in zip(processed, graphs)}
+    for email in emails:
+        timings = dict(graph_of[email.id].timings, batch_extract=batch_timing)
+        try:
+            data = results.get(str(email.id))
+            if data:
+                _apply_extraction_data(db, email, data)
+            else:
+                fallbacks += 1
+                extract_started = time.perf_counter()
+                response = await llm_service.agenerate_text(build_extraction_prompt(email), json_mode=True,
+                                                           use_cache=not force, prompt_type="extraction")
+                timings["extract"] = (extract_started - started, time.perf_counter() - extract_started)
+                _apply_extraction(db, email, response)
+        except Exception as e:
+            logger.warning(f"LLM extraction failed for {email.id}: {e}. Using classifier result only.")
+            email.sentiment = "neutral"
+            email.urgency_score = 5
+            _apply_summary(email, {})
+        _record_timings(db, email, timings, time.perf_counter() - started)
+
+    logger.info(f"Batched extraction: {len(emails)} of {len(processed)} emails, {fallbacks} single-email fallbacks")
     db.commit()
-    return email
+    return processed
+
+
+def _apply_extraction(db: Session, email: Email, response: str):
+    """Populate email fields, action items and followups from the LLM's JSON response."""
+    data = _parse_llm_json(response)
+
+    if not data:
+        raise Exception("Empty/Invalid JSON from LLM")
+    
+    _apply_extraction_data(db, email, data)
+
+
+def _apply_summary(email: Email, data: dict):
+    """Compact summary and key facts for chat context; falls back to the body's lead sentences."""
+    summary = data.get("summary")
+    email.summary = " ".join(summary.split()) if isinstance(summary, str) and summary.strip() else \
+        lead_summary(pii_service.strip_markers(email.redacted_body or plain_body(email)))
+    facts = data.get("key_facts")
+    email.key_facts = [str(fact) for fact in facts[:3]] if isinstance(facts, list) else []
+
+
+def _apply_extraction_data(db: Session, email: Email, data: dict):
+    """
+    Apply an extraction result. Reprocessing replaces the email's pending
+    action items and followups; ones the user has already moved on
+    (completed, in progress, ...) are kept and not added again. Marks the
+    email as processed by the current pipeline.
+    """
+    kept_actions = set()
+    for item in db.query(ActionItem).filter(ActionItem.email_id == email.id):
+        if item.status == "pending":
+            db.delete(item)
+        else:
+            kept_actions.add(item.description)
+    kept_followups = set()
+    for item in db.query(FollowUp).filter(FollowUp.email_id == email.id):
+        if item.status == "pending":
+            db.delete(item)
+        else:
+            kept_followups.add(item.commitment)
+
+    # Populate fields from LLM
+    _apply_summary(email, data)
+    email.sentiment = data.get("sentiment", "neutral")
+    email.emotion = data.get("emotion", email.sentiment)
+    email.urgency_score = data.get("urgency_score", 5)
+    
+    # Extract deadline; one found by an earlier run is dropped if this run finds none
+    email.deadline_text = None
+    email.deadline_datetime = None
+    deadline_data = data.get("deadline", {})
+    if deadline_data and deadline_data.get("has_deadline"):
+        email.deadline_text = deadline_data.get("deadline_text")
+        deadline_iso = deadline_data.get("deadline_iso")
+        if deadline_iso:
+            try:
+                from datetime import datetime as dt
+                email.deadline_datetime = dt.fromisoformat(deadline_iso.replace('Z', '+00:00'))
+            except:
+                pass
+    
+    # Populate Actions
+    for action in data.get("action_items", []):
+        if action.get("description", "Unknown task") in kept_actions:
+            continue
+        db_action = ActionItem(
+            email_id=email.id,
+            description=action.get("description", "Unknown task"),
+            deadline=action.get("deadline")
+        )
+        db.add(db_action)
+        
+    # Populate Followups
+    for followup in data.get("followups", []):
+        if followup.get("commitment", "") in kept_followups:
+            continue
+        db_followup = FollowUp(
+            email_id=email.id,
+            commitment=followup.get("commitment", ""),
+            committed_by=followup.get("committed_by", email.sender),
+            due_date=followup.get("due_date")
+        )
+        db.add(db_followup)
+    _mark_processed(email)
 
 
 def generate_draft(db: Session, email_id: str, instructions: str = None, tone: str = "professional", length: str = "concise"):
@@ -218,26 +595,62 @@ def generate_draft(db: Session, email_id: str, instructions: str = None, tone: s
     if not email:
         return None
 
+    prompt_text = build_draft_prompt(db, email, instructions, tone, length)
+    if prompt_text:
+        draft_body = llm_service.generate_text(prompt_text, prompt_type="draft")
+        return _save_draft(db, email, draft_body)
+    return None
+
+
+def stream_draft(db: Session, email_id: str, instructions: str = None, tone: str = "professional", length: str = "concise"):
+    """
+    Stream a draft reply as {"delta": ...} events, then persist the Draft
+    and finish with {"done": True, "draft_id": ...}.
+    Returns None if the draft cannot be generated (so callers can 400 before streaming).
+    """
+    email = db.query(Email).filter(Email.id == email_id).first()
+    if not email:
+        return None
+
+    prompt_text = build_draft_prompt(db, email, instructions, tone, length)
+    if not prompt_text:
+        return None
+
+    def events():
+        chunks = []
+        for chunk in llm_service.stream_text(prompt_text, prompt_type="draft"):
+            chunks.append(chunk)
+            yield {"delta": chunk}
+        draft = _save_draft(db, email, "".join(chunks))
+        yield {"done": True, "draft_id": draft.id, "subject": draft.subject}
+
+    return events()
+
+
+def build_draft_prompt(db: Session, email: Email, instructions: str = None, tone: str = "professional", length: str = "concise"):
+    """Fill the stored reply prompt for this email, or None if no reply prompt exists."""
     reply_prompt = db.query(Prompt).filter(Prompt.prompt_type == "reply").first()
-    if reply_prompt:
-        template = reply_prompt.template
-        template += f"\n\nStyle Guidelines:\n- Tone: {tone}\n- Length: {length}"
+    if not reply_prompt:
+        return None
 
-        if instructions:
-            template += f"\n\nAdditional Instructions: {instructions}"
-        
-        prompt_text = template.replace("{body}", email.body)
-        draft_body = llm_service.generate_text(prompt_text)
-        
-        draft = Draft(
-            email_id=email.id,
-            subject=f"Re: {email.subject}",
-            body=draft_body
-        )
-        db.add(draft)
-        db.commit()
-        return draft
-    return None
+    template = pii_service.strip_markers(reply_prompt.template)
+    template += f"\n\nStyle Guidelines:\n- Tone: {tone}\n- Length: {length}"
+
+    if instructions:
+        template += f"\n\nAdditional Instructions: {pii_service.strip_markers(instructions)}"
+    
+    return template.replace("{body}", prompt_body(email))
+
+
+def _save_draft(db: Session, email: Email, draft_body: str) -> Draft:
+    draft = Draft(
+        email_id=email.id,
+        subject=f"Re: {email.subject}",
+        body=draft_body
+    )
+    db.add(draft)
+    db.commit()
+    return draft
 
 
 from backend.services.rag_service import rag_service
@@ -245,31 +658,86 @@ from backend.services.rag_service import rag_service
 
 def chat_agent(db: Session, query: str, email_id: str = None):
     """Chat with the AI agent about emails."""
+    return llm_service.generate_text(build_chat_prompt(db, query, email_id), prompt_type="chat")
+
+
+def stream_chat(db: Session, query: str, email_id: str = None):
+    """Chat with the AI agent, yielding {"delta": ...} events as the answer is generated."""
+    prompt = build_chat_prompt(db, query, email_id)
+    for chunk in llm_service.stream_text(prompt, prompt_type="chat"):
+        yield {"delta": chunk}
+    yield {"done": True}
+
+
+# Columns needed for chat context; bodies are never loaded. Emails not yet
+# processed fall back to the start of their body, cut in SQL.
+_CHAT_CONTEXT_COLUMNS = (
+    Email.id, Email.sender, Email.subject, Email.timestamp, Email.category, Email.key_facts,
+    func.coalesce(Email.summary, func.substr(func.coalesce(Email.redacted_body, Email.clean_body, Email.body), 1, 400))
+    .label("summary"),
+)
+
+
+def chat_context_emails(db: Session, email_ids: list = None, limit: int = 10) -> list:
+    """
+    Compact rows for chat context: the given ids (kept in that order, one IN
+    query) or the `limit` most recent emails.
+    """
+    query = db.query(*_CHAT_CONTEXT_COLUMNS)
+    if email_ids is None:
+        return query.order_by(Email.timestamp.desc()).limit(limit).all()
+    rows = {row.id: row for row in query.filter(Email.id.in_(email_ids))}
+    return [rows[i] for i in email_ids if i in rows]
+
+
+def chat_context_block(row) -> str:
+    date = row.timestamp.strftime("%Y-%m-%d") if row.timestamp else "unknown date"
+    block = f"ID: {row.id} | {date} | From: {prompt_field(row.sender)} | Subject: {prompt_field(row.subject)} | " \
+            f"Category: {row.category}\nSummary: {lead_summary(prompt_field(row.summary))}"
+    if row.key_facts:
+        block += "\nKey facts: " + prompt_field("; ".join(row.key_facts))
+    return block
+
+
+def retrieve_chat_emails(db: Session, query: str) -> list:
+    """Chat context rows: RAG hits for the query, else the most recent emails."""
+    relevant_emails = []
+    if not rag_service.is_mock and "summarize" not in query.lower():
+        hits = [str(r["id"]) for r in rag_service.search(query, k=5) if r.get("id")]
+        relevant_emails = chat_context_emails(db, hits) if hits else []
+    return relevant_emails or chat_context_emails(db)
+
+
+def email_chat_context(email: Email) -> str:
+    return f"Context Email:\nSender: {prompt_field(email.sender)}\nSubject: {prompt_field(email.subject)}\n" \
+           f"Body: {prompt_body(email)}\n\n"
+
+
+def inbox_chat_context(rows) -> str:
+    if not rows:
+        return ""
+    context = "Here are the most relevant/recent emails found in the inbox:\n\n"
+    context += "\n\n".join(chat_context_block(row) for row in rows)
+    return context + "\n\nEnd of relevant emails.\n\n"
+
+
+def build_chat_prompt(db: Session, query: str, email_id: str = None) -> str:
+    """Assemble the chat prompt: email / RAG / recent-inbox context plus relationship context."""
+    query = pii_service.strip_markers(query)
     context = ""
     if email_id:
         email = db.query(Email).filter(Email.id == email_id).first()
         if email:
-            context = f"Context Email:\nSender: {email.sender}\nSubject: {email.subject}\nBody: {email.body}\n\n"
+            context = email_chat_context(email)
     else:
-        relevant_emails = []
-        
-        if not rag_service.is_mock:
-            rag_results = rag_service.search(query, k=5)
-            for r in rag_results:
-                relevant_emails.append(type('Email', (), r)())
-        
-        if not relevant_emails or "summarize" in query.lower():
-            relevant_emails = db.query(Email).order_by(Email.timestamp.desc()).limit(10).all()
-        
-        if relevant_emails:
-            context = "Here are the most relevant/recent emails found in the inbox:\n\n"
-            for e in relevant_emails:
-                context += f"ID: {e.id}\nSender: {e.sender}\nSubject: {e.subject}\nDate: {e.timestamp}\nBody: {e.body[:300]}...\nCategory: {e.category}\n\n"
-            context += "End of relevant emails.\n\n"
+        context = inbox_chat_context(retrieve_chat_emails(db, query))
+    return compose_chat_prompt(db, query, context, with_graph=not email_id)
+
 
+def compose_chat_prompt(db: Session, query: str, context: str, with_graph: bool = True) -> str:
     prompt = f"You are a helpful Email Productivity Agent. You have access to the user's emails provided in the context below.\n\nIMPORTANT: Format your response using Markdown. Use headers (##) for sections, bullet points (-) for lists, and bolding (**) for emphasis.\n\n{context}User Query: {query}\n\nAgent Response:"
     
-    if not email_id:
+    if with_graph:
         from backend.services.graph_service import get_context_for_chat
         graph_context = get_context_for_chat(db, query)
         if graph_context:
@@ -288,4 +756,4 @@ IMPORTANT: Use the Relationship Context to provide personalized answers.
 Format your response using Markdown.
 Agent Response:"""
 
-    return llm_service.generate_text(prompt)
+    return prompt
@@ -13,6 +13,7 @@ from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from backend.models import Email, Draft, ActionItem
 from backend.services.llm_service import llm_service
+from backend.services.ingest_service import prompt_body, prompt_field
 
 
 class ActionType(Enum):
@@ -305,14 +306,42 @@ def execute_quick_action(db: Session, action_type: str, params: dict) -> Dict[st
 
 def generate_smart_reply(db: Session, email_id: str, intent: str = "default") -> str:
     """Generate a context-aware smart reply using Graph-RAG"""
-    from backend.services.graph_service import get_context_for_reply
-    
     email = db.query(Email).filter(Email.id == email_id).first()
     if not email:
         return ""
     
+    prompt = build_smart_reply_prompt(db, email, intent)
+
+    try:
+        response = llm_service.generate_text(prompt, prompt_type="smart_reply")
+        return response
+    except Exception as e:
+        print(f"Smart reply generation failed: {e}")
+        return ""
+
+
+def stream_smart_reply(db: Session, email_id: str, intent: str = "default"):
+    """Stream a smart reply as {"delta": ...} events. Returns None if the email doesn't exist."""
+    email = db.query(Email).filter(Email.id == email_id).first()
+    if not email:
+        return None
+    
+    prompt = build_smart_reply_prompt(db, email, intent)
+    
+    def events():
+        for chunk in llm_service.stream_text(prompt, prompt_type="smart_reply"):
+            yield {"delta": chunk}
+        yield {"done": True}
+    
+    return events()
+
+
+def build_smart_reply_prompt(db: Session, email: Email, intent: str = "default") -> str:
+    """Reply prompt for an email: relationship context from the knowledge graph plus intent instruction."""
+    from backend.services.graph_service import get_context_for_reply
+    
     # Get context from knowledge graph
-    context = get_context_for_reply(db, email_id)
+    context = get_context_for_reply(db, email.id)
     
     # Intent-based templates
     intent_instructions = {
@@ -329,9 +358,9 @@ def generate_smart_reply(db: Session, email_id: str, intent: str = "default") ->
     prompt = f"""You are composing a reply to this email.
 
 ORIGINAL EMAIL:
-From: {email.sender}
-Subject: {email.subject}
-Body: {email.body}
+From: {prompt_field(email.sender)}
+Subject: {prompt_field(email.subject)}
+Body: {prompt_body(email)}
 
 CONTEXT FROM RELATIONSHIP HISTORY:
 {context if context else "No previous history with this sender."}
@@ -341,9 +370,4 @@ INSTRUCTION: {instruction}
 Write a professional, concise reply. Keep it under 100 words unless the situation requires more detail.
 Do not include subject line, just the body of the reply."""
 
-    try:
-        response = llm_service.generate_text(prompt)
-        return response
-    except Exception as e:
-        print(f"Smart reply generation failed: {e}")
-        return ""
+    return prompt
@@ -0,0 +1,226 @@
+"""
+Chat Sessions
+Agent chat conversations kept server-side, so a follow-up question doesn't
+resend the whole inbox context and transcript:
+
+- The first turn gets the same prompt as a stateless /agent/chat call; the
+  emails it included are remembered on the session.
+- Follow-ups send those emails as one reference line each and full context
+  blocks only for emails retrieved for the first time (the delta). Chats
+  about one email send its compact summary instead of the whole body.
+- Only the last CHAT_HISTORY_MESSAGES messages are sent verbatim. Once
+  CHAT_SUMMARY_BATCH older messages have piled up they are folded into a
+  rolling summary of at most CHAT_SUMMARY_CHARS characters.
+
+Every part of a follow-up prompt is bounded, so prompt size (and latency)
+stays flat however long the conversation gets.
+
+A chat without a session_id gets a session that is only stored with its
+first successful turn, so failed calls leave no rows behind. Sessions idle
+for CHAT_SESSION_TTL_DAYS are pruned whenever a new one is stored.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from backend.models import ChatMessage, ChatSession, Email
+from backend.services import agent_service
+from backend.services.ingest_service import prompt_field
+from backend.services.llm_service import llm_service
+from backend.services.pii_service import pii_service
+from backend.services.processing_policy import lead_summary
+from backend.services.rate_limiter import estimate_tokens
+from backend.logger import get_logger
+
+logger = get_logger(__name__)
+
+USER, ASSISTANT = "user", "assistant"
+
+
+def session_to_dict(session: ChatSession, messages: bool = False) -> dict:
+    data = {
+        "id": session.id,
+        "email_id": session.email_id,
+        "summary": session.summary,
+        "message_count": len(session.messages),
+        "created_at": session.created_at,
+        "updated_at": session.updated_at,
+    }
+    if messages:
+        data["messages"] = [
+            {"role": m.role, "content": m.content, "prompt_tokens": m.prompt_tokens, "created_at": m.created_at}
+            for m in session.messages
+        ]
+    return data
+
+
+class ChatSessionService:
+    def __init__(self, history_messages: int = 4, summary_batch: int = 4, max_context_emails: int = 20,
+                 message_chars: int = 600, summary_chars: int = 1200, ttl_days: float = 30):
+        self.history_messages = history_messages
+        self.summary_batch = summary_batch
+        self.max_context_emails = max_context_emails
+        self.message_chars = message_chars
+        self.summary_chars = summary_chars
+        self.ttl_days = ttl_days
+
+    # --- Sessions ---
+
+    @staticmethod
+    def new(email_id: str = None) -> ChatSession:
+        """A session that is stored with its first turn (see _save_turn)."""
+        now = datetime.utcnow()
+        return ChatSession(email_id=email_id, summary="", summarized_count=0, context_email_ids=[],
+                           created_at=now, updated_at=now)
+
+    def create(self, db: Session, email_id: str = None) -> ChatSession:
+        session = self.new(email_id)
+        self.prune(db)
+        db.add(session)
+        db.commit()
+        db.refresh(session)
+        return session
+
+    def prune(self, db: Session) -> int:
+        """Delete sessions idle for more than ttl_days (0 keeps them forever); committed by the caller."""
+        if self.ttl_days <= 0:
+            return 0
+        expired = db.query(ChatSession.id).filter(
+            ChatSession.updated_at < datetime.utcnow() - timedelta(days=self.ttl_days))
+        db.query(ChatMessage).filter(ChatMessage.session_id.in_(expired.scalar_subquery())) \
+            .delete(synchronize_session=False)
+        return db.query(ChatSession).filter(ChatSession.id.in_(expired.scalar_subquery())) \
+            .delete(synchronize_session=False)
+
+    def get(self, db: Session, session_id: int):
+        return db.get(ChatSession, session_id)
+
+    def delete(self, db: Session, session: ChatSession):
+        db.delete(session)
+        db.commit()
+
+    # --- Turns ---
+
+    def chat(self, db: Session, session: ChatSession, query: str) -> str:
+        """Answer the next question of the session and store both messages."""
+        prompt = self.build_prompt(db, session, query)
+        response = llm_service.generate_text(prompt, prompt_type="chat")
+        self._save_turn(db, session, query, response, prompt)
+        return response
+
+    def stream_chat(self, db: Session, session: ChatSession, query: str):
+        """Like chat(), as {"delta": ...} events; the turn is stored when the stream completes."""
+        prompt = self.build_prompt(db, session, query)
+        chunks = []
+        for chunk in llm_service.stream_text(prompt, prompt_type="chat"):
+            chunks.append(chunk)
+            yield {"delta": chunk}
+        self._save_turn(db, session, query, "".join(chunks), prompt)
+        yield {"done": True, "session_id": session.id}
+
+    def build_prompt(self, db: Session, session: ChatSession, query: str) -> str:
+        """
+        Prompt for the next turn. Records the emails sent as context on the
+        session (committed with the turn).
+        """
+        query = pii_service.strip_markers(query)
+        if not session.messages:
+            return self._first_prompt(db, session, query)
+
+        self._fold_history(session)
+        if session.email_id:
+            rows = agent_service.chat_context_emails(db, [session.email_id])
+            known, context = [], agent_service.inbox_chat_context(rows)
+        else:
+            known, context = self._context_delta(db, session, query)
+
+        sections = ["You are a helpful Email Productivity Agent continuing a conversation about the user's emails.\n\n"
+                    "IMPORTANT: Format your response using Markdown. Use headers (##) for sections, bullet points (-) "
+                    "for lists, and bolding (**) for emphasis."]
+        if session.summary:
+            sections.append(f"CONVERSATION SO FAR:\n{session.summary}")
+        if known:
+            sections.append("EMAILS ALREADY DISCUSSED:\n" + "\n".join(self._reference_line(row) for row in known))
+        if context:
+            sections.append(context.strip())
+        history = session.messages[session.summarized_count:]
+        if history:
+            sections.append("RECENT MESSAGES:\n" + "\n".join(self._message_line(m) for m in history))
+        sections.append(f"User Query: {query}\n\nAgent Response:")
+        return "\n\n".join(sections)
+
+    def _first_prompt(self, db: Session, session: ChatSession, query: str) -> str:
+        context = ""
+        if session.email_id:
+            email = db.query(Email).filter(Email.id == session.email_id).first()
+            if email:
+                context = agent_service.email_chat_context(email)
+        else:
+            rows = agent_service.retrieve_chat_emails(db, query)
+            context = agent_service.inbox_chat_context(rows)
+            session.context_email_ids = [row.id for row in rows][-self.max_context_emails:]
+        return agent_service.compose_chat_prompt(db, query, context, with_graph=not session.email_id)
+
+    def _context_delta(self, db: Session, session: ChatSession, query: str):
+        """Rows of emails sent on earlier turns, and context blocks for the newly retrieved ones."""
+        sent = list(session.context_email_ids or [])
+        new_rows = [row for row in agent_service.retrieve_chat_emails(db, query) if row.id not in sent]
+        known = agent_service.chat_context_emails(db, sent)
+        # Oldest references drop out first so the list stays bounded
+        session.context_email_ids = (sent + [row.id for row in new_rows])[-self.max_context_emails:]
+        return known, agent_service.inbox_chat_context(new_rows)
+
+    def _fold_history(self, session: ChatSession):
+        """Fold messages older than the verbatim window into the rolling summary, a batch at a time."""
+        history = session.messages[session.summarized_count:]
+        if len(history) < self.history_messages + self.summary_batch:
+            return
+        folded = history[:len(history) - self.history_messages]
+        transcript = "\n".join(self._message_line(m) for m in folded)
+        prompt = (
+            f"Update the summary of a conversation between a user and their email assistant. Keep the facts, "
+            f"email IDs, names, dates and decisions the assistant may need later. Reply with the summary only, "
+            f"under {self.summary_chars} characters.\n\n"
+            f"CURRENT SUMMARY:\n{session.summary or '(none)'}\n\nNEW MESSAGES:\n{transcript}\n\nUpdated summary:"
+        )
+        try:
+            summary = llm_service.generate_text(prompt, prompt_type="chat_summary")
+        except Exception as e:
+            logger.warning(f"Chat summary failed for session {session.id}, keeping lead sentences: {e}")
+            summary = " ".join([session.summary or ""] + [self._message_line(m, 200) for m in folded])
+        session.summary = lead_summary(summary, self.summary_chars)
+        session.summarized_count += len(folded)
+
+    def _save_turn(self, db: Session, session: ChatSession, query: str, response: str, prompt: str):
+        if session.id is None:
+            self.prune(db)
+            db.add(session)
+        session.messages.append(ChatMessage(role=USER, content=query))
+        session.messages.append(ChatMessage(role=ASSISTANT, content=response, prompt_tokens=estimate_tokens(prompt)))
+        session.updated_at = datetime.utcnow()
+        db.commit()
+
+    @staticmethod
+    def _reference_line(row) -> str:
+        date = row.timestamp.strftime("%Y-%m-%d") if row.timestamp else "unknown date"
+        return f"- ID: {row.id} | {date} | From: {prompt_field(row.sender)} | Subject: {prompt_field(row.subject)}"
+
+    def _message_line(self, message: ChatMessage, limit: int = None) -> str:
+        speaker = "User" if message.role == USER else "Agent"
+        return f"{speaker}: {lead_summary(pii_service.strip_markers(message.content), limit or self.message_chars)}"
+
+
+def chat_session_service_from_env() -> ChatSessionService:
+    return ChatSessionService(
+        history_messages=int(os.getenv("CHAT_HISTORY_MESSAGES", "4")),
+        summary_batch=int(os.getenv("CHAT_SUMMARY_BATCH", "4")),
+        max_context_emails=int(os.getenv("CHAT_CONTEXT_MAX_EMAILS", "20")),
+        message_chars=int(os.getenv("CHAT_MESSAGE_CHARS", "600")),
+        summary_chars=int(os.getenv("CHAT_SUMMARY_CHARS", "1200")),
+        ttl_days=float(os.getenv("CHAT_SESSION_TTL_DAYS", "30")),
+    )
+
+
+chat_session_service = chat_session_service_from_env()
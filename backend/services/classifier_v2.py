@@ -8,8 +8,13 @@ A robust ML-based classifier with:
 - High accuracy (96-98%)
 - No LLM API calls required
 """
+import os
+import queue
+import threading
+import time
 import joblib
 import numpy as np
+from concurrent.futures import Future
 from pathlib import Path
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
@@ -28,7 +33,8 @@ except ImportError:
 
 # Paths
 _DATA_DIR = Path(__file__).resolve().parent.parent / "data"
-MODEL_PATH = _DATA_DIR / "classifier_v2.joblib"
+# CLASSIFIER_MODEL_PATH selects an alternative model (e.g. classifier_ooc.joblib from train_from_db.py)
+MODEL_PATH = Path(os.getenv("CLASSIFIER_MODEL_PATH", str(_DATA_DIR / "classifier_v2.joblib")))
 
 # Category definitions
 CATEGORIES = [
@@ -129,6 +135,11 @@ class EmailClassifierV2:
         else:
             logger.warning(f"Classifier model not found at {MODEL_PATH}")
     
+    @staticmethod
+    def _format_input(subject: str, body: str, sender: str = "") -> str:
+        """Format an email exactly as the training data."""
+        return f"Subject: {subject}. Body: {body}. Sender: {sender}"
+    
     def predict(self, subject: str, body: str, sender: str = "") -> tuple[str, float]:
         """
         Predict email category with confidence score.
@@ -136,36 +147,109 @@ class EmailClassifierV2:
         Returns:
             (category, confidence) tuple
         """
+        return self.predict_batch([{"subject": subject, "body": body, "sender": sender}])[0]
+    
+    def predict_batch(self, emails: list[dict]) -> list[tuple[str, float]]:
+        """
+        Batch prediction for multiple emails.
+        
+        Runs a single vectorized predict_proba over the whole batch; the
+        predicted label is the argmax of the probabilities, so the pipeline
+        is only traversed once per batch.
+        """
+        if not emails:
+            return []
         if self.model is None:
-            return "General", 0.5
+            return [("General", 0.5)] * len(emails)
         
-        # Format input exactly as training data
-        text = f"Subject: {subject}. Body: {body}. Sender: {sender}"
+        texts = [
+            self._format_input(
+                email.get("subject", ""),
+                email.get("body", ""),
+                email.get("sender", "")
+            )
+            for email in emails
+        ]
         
         try:
-            # Get prediction
-            prediction = self.model.predict([text])[0]
-            
-            # Get confidence (probability of predicted class)
-            proba = self.model.predict_proba([text])[0]
-            confidence = float(max(proba))
-            
-            return prediction, confidence
+            proba = self.model.predict_proba(texts)
+            best = np.argmax(proba, axis=1)
+            classes = self.model.classes_
+            return [(str(classes[i]), float(proba[row, i])) for row, i in enumerate(best)]
         except Exception as e:
             logger.error(f"Classification error: {e}")
-            return "General", 0.5
+            return [("General", 0.5)] * len(emails)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-email predictions into vectorized batches.
     
-    def predict_batch(self, emails: list[dict]) -> list[tuple[str, float]]:
-        """Batch prediction for multiple emails."""
-        results = []
-        for email in emails:
-            category, conf = self.predict(
-                email.get("subject", ""),
-                email.get("body", ""),
-                email.get("sender", "")
-            )
-            results.append((category, conf))
-        return results
+    Callers on any thread submit an email and get a Future back. A single
+    worker thread drains the queue, waits up to ``max_wait_ms`` for more
+    requests (or until ``max_batch_size`` is reached), runs one
+    ``predict_batch`` and resolves every caller's future. Requests that
+    arrive while a batch is running form the next batch.
+    """
+    
+    def __init__(self, classifier: "EmailClassifierV2", max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        self.classifier = classifier
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.SimpleQueue[tuple[dict, Future]]" = queue.SimpleQueue()
+        self._worker = None
+        self._lock = threading.Lock()
+        # Batch size statistics (for benchmarks / debugging)
+        self.batches = 0
+        self.items = 0
+    
+    def submit(self, subject: str, body: str, sender: str = "") -> Future:
+        """Queue an email for classification and return a Future of (category, confidence)."""
+        future = Future()
+        self._ensure_worker()
+        self._queue.put(({"subject": subject, "body": body, "sender": sender}, future))
+        return future
+    
+    def predict(self, subject: str, body: str, sender: str = "") -> tuple[str, float]:
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(subject, body, sender).result()
+    
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="classifier-microbatcher", daemon=True)
+                self._worker.start()
+    
+    def _collect(self) -> list:
+        """Block for the first request, then gather more until the batch is full or the wait expires."""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._collect()
+            emails = [email for email, _ in batch]
+            try:
+                results = self.classifier.predict_batch(emails)
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            self.batches += 1
+            self.items += len(batch)
 
 
 def build_classifier_pipeline():
@@ -222,10 +306,21 @@ def build_classifier_pipeline():
 # Singleton instance
 classifier = EmailClassifierV2()
 
+# Micro-batching in front of the singleton (disable with CLASSIFIER_MICROBATCH=false)
+MICROBATCH_ENABLED = os.getenv("CLASSIFIER_MICROBATCH", "true").lower() in ("1", "true", "yes")
+batcher = MicroBatcher(
+    classifier,
+    max_batch_size=int(os.getenv("CLASSIFIER_BATCH_MAX_SIZE", "32")),
+    max_wait_ms=float(os.getenv("CLASSIFIER_BATCH_MAX_WAIT_MS", "2")),
+)
+
 
 def predict_category(subject: str, body: str, sender: str = "") -> tuple[str, float]:
     """
     Convenience function to predict email category.
+    Concurrent callers are coalesced into one vectorized batch.
     Returns (category, confidence) tuple.
     """
+    if MICROBATCH_ENABLED and classifier.model is not None:
+        return batcher.predict(subject, body, sender)
     return classifier.predict(subject, body, sender)
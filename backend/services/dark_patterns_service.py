@@ -1,9 +1,91 @@
 """
 Dark Patterns Detector
 Identifies manipulative email tactics like fake urgency, hidden unsubscribe, etc.
+
+All regex checks are precompiled into one named-group pattern per field
+(subject, body), and each field is scanned once. Every group sits inside a
+lookahead so a match consumes no text: a phrase of one kind never hides an
+overlapping phrase of another ("urgent.co" is urgency and a t.co link).
+Exclamation counts and the unsubscribe position are plain string operations.
+
+Mailbox scans share one module-level process pool. Its workers are started
+with "spawn", never forked from the multi-threaded API process, and small
+mailboxes are scanned inline where process start-up would cost more than
+the scan.
 """
 
+import json
+import multiprocessing
+import os
 import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Pattern kinds in reporting order, with their warnings
+WARNINGS = {
+    "fake_urgency": "⚠️ Contains artificial urgency language",
+    "excessive_caps": "📢 Excessive capitalization in subject",
+    "excessive_exclamation": "❗ Excessive exclamation marks",
+    "shortened_links": "🔗 Contains shortened/suspicious links",
+    "prize_scam": "🎁 Suspicious prize/winner language",
+    "pressure_tactics": "⚡ Uses pressure/fear tactics",
+    "hidden_unsubscribe": "👁️ Unsubscribe link buried at bottom",
+}
+
+# Phrase kinds must start on a word boundary; the scanner supplies the \b
+_FAKE_URGENCY = (
+    r"(?:urgent|immediately|asap|act now|limited time|expires|hurry|last chance)\b"
+    r"|only \d+ (?:left|remaining)\b"
+    r"|(?:don't miss out|final (?:notice|warning))\b"
+)
+_PRIZE_SCAM = (
+    r"(?:you'?ve? won|congratulations|winner|prize|claim|free)\b"
+    r"|(?:click here to claim|verify your account)\b"
+)
+_PRESSURE_TACTICS = (
+    r"your account will be (?:closed|suspended|deleted)\b"
+    r"|(?:verify (?:now|immediately)|confirm your identity)\b"
+    r"|unusual activity detected\b"
+)
+# Kinds that may start anywhere, even mid-word
+_SHORTENED_LINKS = r"bit\.ly|tinyurl|t\.co|goo\.gl"
+_EXCESSIVE_CAPS = r"(?-i:[A-Z]{5,})"  # Case-sensitive inside the IGNORECASE scanner
+
+
+def _scanner(phrases: dict, anywhere: dict):
+    """
+    One zero-width match per position where any kind starts. Every kind starts
+    with a letter, so the leading class rejects most positions cheaply, and
+    the shared \b rejects mid-word positions before any phrase is tried.
+    """
+    groups = lambda kinds: "|".join(f"(?P<{kind}>{pattern})" for kind, pattern in kinds.items())
+    return re.compile(f"(?=[a-z])(?=\\b(?:{groups(phrases)})|{groups(anywhere)})", re.IGNORECASE)
+
+
+# Urgency and prize language count in either field; capitalization only in
+# the subject; links and pressure tactics only in the body
+_SUBJECT_SCANNER = _scanner({"fake_urgency": _FAKE_URGENCY, "prize_scam": _PRIZE_SCAM},
+                            {"excessive_caps": _EXCESSIVE_CAPS})
+_BODY_SCANNER = _scanner({"fake_urgency": _FAKE_URGENCY, "prize_scam": _PRIZE_SCAM, "pressure_tactics": _PRESSURE_TACTICS},
+                         {"shortened_links": _SHORTENED_LINKS})
+_CAPS = re.compile(_EXCESSIVE_CAPS)
+
+_SUBJECT_KINDS = {"fake_urgency", "prize_scam", "excessive_caps"}
+_BODY_KINDS = {"fake_urgency", "prize_scam", "shortened_links", "pressure_tactics"}
+
+
+def _scan(scanner, text: str, kinds: set, found: set):
+    wanted = kinds - found
+    for match in scanner.finditer(text):
+        kind = match.lastgroup
+        found.add(kind)
+        # Only one kind is reported per position, so check a phrase for a capitalized run too ("HURRY")
+        if "excessive_caps" in wanted and kind != "excessive_caps" and _CAPS.search(match.group(kind)):
+            found.add("excessive_caps")
+        if wanted <= found:
+            return
+
 
 def detect_dark_patterns(subject: str, body: str) -> dict:
     """
@@ -15,80 +97,118 @@ def detect_dark_patterns(subject: str, body: str) -> dict:
         "warnings": list of human-readable warnings
     }
     """
-    patterns_found = []
-    warnings = []
-    
-    # Pattern 1: Fake Urgency
-    urgency_keywords = [
-        r'\b(urgent|immediately|asap|act now|limited time|expires|hurry|last chance)\b',
-        r'\b(only \d+ (left|remaining))\b',
-        r'\b(don\'t miss out|final (notice|warning))\b'
-    ]
-    for pattern in urgency_keywords:
-        if re.search(pattern, subject + " " + body, re.IGNORECASE):
-            patterns_found.append("fake_urgency")
-            warnings.append("⚠️ Contains artificial urgency language")
-            break
-    
-    # Pattern 2: Excessive Capitalization
-    if re.search(r'[A-Z]{5,}', subject):
-        patterns_found.append("excessive_caps")
-        warnings.append("📢 Excessive capitalization in subject")
-    
-    # Pattern 3: Too Many Exclamation Marks
+    subject = subject or ""
+    body = body or ""
+    found = set()
+    _scan(_SUBJECT_SCANNER, subject, _SUBJECT_KINDS, found)
+    _scan(_BODY_SCANNER, body, _BODY_KINDS, found)
+
     if subject.count('!') >= 3 or body.count('!') >= 5:
-        patterns_found.append("excessive_exclamation")
-        warnings.append("❗ Excessive exclamation marks")
-    
-    # Pattern 4: Suspicious Links
-    suspicious_domains = [r'bit\.ly', r'tinyurl', r't\.co', r'goo\.gl']
-    for domain in suspicious_domains:
-        if re.search(domain, body, re.IGNORECASE):
-            patterns_found.append("shortened_links")
-            warnings.append("🔗 Contains shortened/suspicious links")
-            break
-    
-    # Pattern 5: Prize/Winner Language
-    prize_keywords = [
-        r'\b(you\'?ve? won|congratulations|winner|prize|claim|free)\b',
-        r'\b(click here to claim|verify your account)\b'
-    ]
-    for pattern in prize_keywords:
-        if re.search(pattern, subject + " " + body, re.IGNORECASE):
-            patterns_found.append("prize_scam")
-            warnings.append("🎁 Suspicious prize/winner language")
-            break
-    
-    # Pattern 6: Pressure Tactics
-    pressure_keywords = [
-        r'\b(your account will be (closed|suspended|deleted))\b',
-        r'\b(verify (now|immediately)|confirm your identity)\b',
-        r'\b(unusual activity detected)\b'
-    ]
-    for pattern in pressure_keywords:
-        if re.search(pattern, body, re.IGNORECASE):
-            patterns_found.append("pressure_tactics")
-            warnings.append("⚡ Uses pressure/fear tactics")
-            break
-    
-    # Pattern 7: Hidden Unsubscribe
-    if 'unsubscribe' in body.lower():
-        # Check if unsubscribe is in tiny text or at very end
-        unsubscribe_pos = body.lower().rfind('unsubscribe')
-        if unsubscribe_pos > len(body) * 0.9:  # In last 10% of email
-            patterns_found.append("hidden_unsubscribe")
-            warnings.append("👁️ Unsubscribe link buried at bottom")
-    
+        found.add("excessive_exclamation")
+
+    # Unsubscribe link in the last 10% of the email
+    unsubscribe_pos = body.lower().rfind('unsubscribe')
+    if unsubscribe_pos != -1 and unsubscribe_pos > len(body) * 0.9:
+        found.add("hidden_unsubscribe")
+
+    patterns_found = [kind for kind in WARNINGS if kind in found]
+
     # Determine severity
     severity = "low"
     if len(patterns_found) >= 3:
         severity = "high"
     elif len(patterns_found) >= 2:
         severity = "medium"
-    
+
     return {
         "has_dark_patterns": len(patterns_found) > 0,
-        "patterns_found": list(set(patterns_found)),  # Remove duplicates
+        "patterns_found": patterns_found,
         "severity": severity,
-        "warnings": warnings
+        "warnings": [WARNINGS[kind] for kind in patterns_found]
+    }
+
+
+def _scan_rows(rows: list) -> list:
+    """Worker: [(id, subject, body)] -> update mappings for Email."""
+    updates = []
+    for email_id, subject, body in rows:
+        result = detect_dark_patterns(subject, body)
+        updates.append({
+            "id": email_id,
+            "has_dark_patterns": result["has_dark_patterns"],
+            "dark_patterns": json.dumps(result["patterns_found"]),
+            "dark_pattern_severity": result["severity"],
+        })
+    return updates
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _scan_pool(workers: int) -> ProcessPoolExecutor:
+    """The shared scanner pool, replaced by a larger one when more workers are asked for."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._max_workers < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)  # Scans already running keep their futures
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_scan_pool():
+    """Stop the scanner processes (on application shutdown)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def scan_mailbox(db, chunk_size: int = 500, workers: int = None, min_rows: int = None) -> dict:
+    """
+    Recompute has_dark_patterns / dark_patterns / dark_pattern_severity for
+    every stored email. Rows are read in primary-key chunks; each chunk is
+    split across the shared process pool and written back with one bulk
+    UPDATE per chunk. workers=1, or a mailbox of fewer than min_rows emails
+    (DARK_PATTERN_SCAN_MIN_ROWS, default 5000), is scanned inline.
+    """
+    from sqlalchemy import func, update
+    from backend.models import Email
+
+    if workers is None:
+        workers = int(os.getenv("DARK_PATTERN_SCAN_WORKERS", str(os.cpu_count() or 1)))
+    if min_rows is None:
+        min_rows = int(os.getenv("DARK_PATTERN_SCAN_MIN_ROWS", "5000"))
+    start = time.perf_counter()
+    parallel = workers > 1 and db.query(func.count(Email.id)).scalar() >= min_rows
+    scanned = flagged = 0
+    last_id = None
+    while True:
+        query = db.query(Email.id, Email.subject, Email.body).order_by(Email.id)
+        if last_id is not None:
+            query = query.filter(Email.id > last_id)
+        rows = [tuple(row) for row in query.limit(chunk_size)]
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        if parallel:
+            step = -(-len(rows) // workers)
+            parts = _scan_pool(workers).map(_scan_rows, [rows[i:i + step] for i in range(0, len(rows), step)])
+            updates = [u for part in parts for u in part]
+        else:
+            updates = _scan_rows(rows)
+
+        db.execute(update(Email), updates)
+        db.commit()
+        scanned += len(updates)
+        flagged += sum(u["has_dark_patterns"] for u in updates)
+
+    return {
+        "scanned": scanned,
+        "flagged": flagged,
+        "workers": workers if parallel else 1,
+        "seconds": round(time.perf_counter() - start, 3),
     }
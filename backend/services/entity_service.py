@@ -1,6 +1,7 @@
 import json
 from backend.services.llm_service import llm_service
 from backend.models import Email
+from backend.services.ingest_service import prompt_body, prompt_field
 
 class EntityService:
     """
@@ -12,9 +13,9 @@ class EntityService:
         prompt = f"""
         Analyze this email and extract structured entity data for a knowledge graph.
         
-        From: {email.sender}
-        Subject: {email.subject}
-        Body: {email.body}
+        From: {prompt_field(email.sender)}
+        Subject: {prompt_field(email.subject)}
+        Body: {prompt_body(email)}
         
         Return a JSON object with:
         {{
@@ -26,7 +27,7 @@ class EntityService:
         }}
         """
         
-        response = llm_service.generate_text(prompt, json_mode=True)
+        response = llm_service.generate_text(prompt, json_mode=True, prompt_type="entities")
         try:
             data = json.loads(response)
             return data
@@ -34,7 +34,7 @@ If no commitments found, return empty array: []
 """
 
     try:
-        response = llm_service.generate_text(prompt)
+        response = llm_service.generate_text(prompt, prompt_type="followups")
         import json
         import re
         
@@ -6,6 +6,7 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 from backend.models import Email
 from backend.services.classifier_v2 import predict_category
+from backend.services.ingest_service import ingest_bodies
 from backend.logger import get_logger
 
 logger = get_logger(__name__)
@@ -83,6 +84,9 @@ def fetch_emails(db: Session, max_emails: int = 50):
                 if payload:
                     body = payload.decode(errors='replace')
 
+            # Strip quoted history/signatures while line structure is still intact
+            bodies = ingest_bodies(body, limit=3000)
+
             # Clean body
             body = " ".join(body.split())[:3000]
 
@@ -109,6 +113,7 @@ def fetch_emails(db: Session, max_emails: int = 50):
                 sender=sender,
                 subject=subject,
                 body=body,
+                **bodies,
                 timestamp=datetime.now(),
                 category=category,
                 confidence_score=confidence,
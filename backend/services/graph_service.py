@@ -57,6 +57,7 @@ class KnowledgeGraph:
         self.contacts: Dict[str, ContactNode] = {}
         self.relationships: Dict[str, Dict[str, str]] = defaultdict(dict)  # email -> {related_email: relationship_type}
         self.topics_to_contacts: Dict[str, List[str]] = defaultdict(list)
+        self.indexed_email_ids: set = set()  # Emails already recorded as interactions
         
     def add_or_update_contact(self, email: str, **kwargs) -> ContactNode:
         """Add or update a contact node"""
@@ -139,13 +140,20 @@ def get_knowledge_graph() -> KnowledgeGraph:
     return _knowledge_graph
 
 
-def build_graph_from_emails(db: Session):
-    """Build/update knowledge graph from all emails in database"""
+def build_graph_from_emails(db: Session, chunk_size: int = 500):
+    """
+    Build/update knowledge graph from emails in database.
+    Each email is recorded once; later calls only load emails added since.
+    """
     graph = get_knowledge_graph()
-    
-    emails = db.query(Email).all()
-    
+
+    new_ids = [email_id for (email_id,) in db.query(Email.id) if email_id not in graph.indexed_email_ids]
+    emails = []
+    for i in range(0, len(new_ids), chunk_size):
+        emails.extend(db.query(Email).filter(Email.id.in_(new_ids[i:i + chunk_size])).all())
+
     for email in emails:
+        graph.indexed_email_ids.add(email.id)
         # Extract sender info
         sender = email.sender
         if sender:
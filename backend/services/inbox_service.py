@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from backend.models import Email, Prompt, FollowUp, ActionItem
 from backend.schemas import EmailCreate
 from backend.logger import get_logger
+from backend.services.ingest_service import ingest_bodies
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -57,6 +58,7 @@ def load_mock_data(db: Session):
                     email_data.setdefault("has_dark_patterns", False)
                     email_data.setdefault("dark_patterns", "[]")
                     email_data.setdefault("dark_pattern_severity", "low")
+                    email_data.update(ingest_bodies(email_data["body"]))
                     
                     # -------------------------------------------------------
                     # ADVANCED CLASSIFIER: Use local model for classification
@@ -162,3 +164,22 @@ def get_emails(db: Session, skip: int = 0, limit: int = 100, sort_by: str = "dat
 
 def get_email(db: Session, email_id: str):
     return db.query(Email).filter(Email.id == email_id).first()
+
+
+def set_category(db: Session, email_id: str, category: str = None):
+    """
+    Record user feedback on an email's category.
+    Passing no category (or the current one) confirms the classifier output;
+    any other value is stored as a user correction.
+    """
+    email = get_email(db, email_id)
+    if email is None:
+        return None
+    if category is None or category == email.category:
+        email.category_source = "confirmed"
+    else:
+        email.category = category
+        email.category_source = "user"
+    db.commit()
+    db.refresh(email)
+    return email
@@ -0,0 +1,187 @@
+"""
+Ingest-Time Email Cleaning
+==========================
+Computes `Email.clean_body`: the part of a message worth sending to an LLM
+or embedding model. Done once when an email is stored, so every consumer
+(processing, chat, replies, entities, meetings, RAG) pays for fewer tokens.
+
+Removed:
+- Quoted history (">" lines, "On ... wrote:", "-----Original Message-----",
+  Outlook "From:/Sent:" headers and underscore separators)
+- Forwarding headers ("---------- Forwarded message ---------" and its
+  From/Date/Subject/To lines); the forwarded text itself is the content
+- Signatures ("-- " delimiter, "Sent from my ...", trailing sign-off blocks)
+- Boilerplate paragraphs (confidentiality notices, unsubscribe footers)
+- Redundant whitespace (runs of spaces, more than one blank line)
+
+`email.body` is left untouched for display.
+
+`Email.redacted_body` is clean_body with PII redacted, tagged with
+`redaction_version`; prompt_body() hands it to LLM prompts marked as
+pre-redacted so LLMService does not scan the same body on every call.
+Every other email field put in a prompt goes through prompt_field(), so
+text an email carries can't pass itself off as pre-redacted.
+"""
+import re
+from backend.services.pii_service import pii_service, REDACTION_VERSION
+
+# Lines at which the quoted reply chain starts; everything from here on is dropped
+_REPLY_HEADER = re.compile(
+    r"^\s*(?:"
+    r"On\s.{0,200}?\swrote:\s*$"
+    r"|-{2,}\s*Original Message\s*-{2,}"
+    r"|_{10,}\s*$"
+    r"|From:\s.+$(?=\n\s*(?:Sent|Date):)"
+    r")",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+# A forwarded message's banner and header lines; only these lines are dropped
+_FORWARD_HEADER = re.compile(
+    r"^\s*-{2,}\s*Forwarded message\s*-{2,}[ \t]*\n(?:[ \t]*(?:From|Sent|Date|To|Cc|Subject):.*(?:\n|$))*",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+# Signature delimiters; everything from here on is dropped
+_SIGNATURE = re.compile(
+    r"^(?:--\s*$|Sent from my\s.+$|Get Outlook for\s.+$)",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+# Closing lines that start a sign-off block ("Best,\nSarah")
+_SIGN_OFF = re.compile(
+    r"^\s*(?:best(?: regards| wishes)?|kind regards|warm regards|regards|cheers|thanks(?: again)?|"
+    r"thank you|many thanks|sincerely|yours(?: truly| sincerely)?|talk soon)\s*[,.!]?\s*$",
+    re.IGNORECASE,
+)
+_SIGN_OFF_MAX_TAIL_LINES = 4      # Name / title / company / phone
+_SIGN_OFF_MAX_LINE_LENGTH = 60
+_SIGN_OFF_MAX_LINE_WORDS = 6
+
+# Paragraphs that are boilerplate rather than content
+_BOILERPLATE = re.compile(
+    r"confidentiality notice|this (?:e-?mail|message) (?:and any attachments )?(?:is|may be) confidential"
+    r"|intended (?:solely )?for the (?:use of the )?(?:individual|addressee|intended recipient)"
+    r"|if you (?:are not|have received this) .{0,40}(?:intended recipient|in error)"
+    r"|unsubscribe|manage (?:your )?(?:email )?preferences|view (?:this email )?in (?:your )?browser"
+    r"|you are receiving this (?:e-?mail|because)|please consider the environment before printing",
+    re.IGNORECASE,
+)
+
+
+def clean_body(text: str) -> str:
+    """Strip quoted history, signatures, boilerplate and extra whitespace from an email body."""
+    if not text:
+        return ""
+    text = original = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _FORWARD_HEADER.sub("\n", text)
+
+    match = _REPLY_HEADER.search(text)
+    if match:
+        text = text[:match.start()]
+    match = _SIGNATURE.search(text)
+    if match:
+        text = text[:match.start()]
+
+    lines = [line for line in text.split("\n") if not line.lstrip().startswith(">")]
+    lines = _strip_sign_off(lines)
+
+    paragraphs = re.split(r"\n\s*\n", "\n".join(lines))
+    kept = [p for p in paragraphs if p.strip() and not _BOILERPLATE.search(p)]
+
+    cleaned = "\n\n".join(_normalize_whitespace(p) for p in kept).strip()
+    # Never hand consumers an empty body when the original had content
+    # (e.g. a body that starts with what looks like a quoted header)
+    return cleaned or _normalize_whitespace(original)
+
+
+def _strip_sign_off(lines: list) -> list:
+    """Drop a trailing 'Best,\\nName\\nTitle' block; a closing followed by more message text is kept."""
+    end = len(lines)
+    while end and not lines[end - 1].strip():
+        end -= 1
+    start = max(0, end - _SIGN_OFF_MAX_TAIL_LINES - 1)
+    for i in range(start, end):
+        if _SIGN_OFF.match(lines[i]):
+            tail = lines[i + 1:end]
+            if all(_is_signature_line(line) for line in tail):
+                return lines[:i]
+    return lines
+
+
+def _is_signature_line(line: str) -> bool:
+    """Name, title, company or phone line, not a sentence ("Could you send it by Friday?")."""
+    line = line.strip()
+    return (len(line) <= _SIGN_OFF_MAX_LINE_LENGTH and len(line.split()) <= _SIGN_OFF_MAX_LINE_WORDS
+            and not line.endswith(("?", "!", ":")))
+
+
+def _normalize_whitespace(text: str) -> str:
+    lines = [" ".join(line.split()) for line in text.split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def ingest_bodies(body: str, limit: int = None) -> dict:
+    """clean_body / redacted_body / redaction_version for a newly stored email."""
+    cleaned = clean_body(body)[:limit]
+    return {
+        "clean_body": cleaned,
+        "redacted_body": pii_service.redact(pii_service.strip_markers(cleaned)),
+        "redaction_version": REDACTION_VERSION,
+    }
+
+
+def plain_body(email) -> str:
+    """clean_body when computed, else the raw body (for embeddings and local rules)."""
+    return getattr(email, "clean_body", None) or email.body or ""
+
+
+def prompt_body(email, limit: int = None) -> str:
+    """
+    The body to embed in LLM prompts: the ingest-time redacted body, marked
+    so LLMService skips rescanning it, or the plain body (left for
+    LLMService to redact) when that is empty, missing or was redacted by an
+    older REDACTION_VERSION.
+    """
+    redacted = getattr(email, "redacted_body", None)
+    if redacted and getattr(email, "redaction_version", None) == REDACTION_VERSION:
+        return pii_service.mark_redacted(redacted[:limit])
+    return prompt_field(plain_body(email)[:limit])
+
+
+def prompt_field(value) -> str:
+    """An email field (subject, sender, summary, ...) for an LLM prompt, with redaction markers removed."""
+    return pii_service.strip_markers(value or "")
+
+
+def backfill_clean_bodies(db, chunk_size: int = 500) -> int:
+    """Compute clean_body for stored emails that predate ingest-time cleaning."""
+    from backend.models import Email
+
+    updated = 0
+    while True:
+        emails = db.query(Email).filter(Email.clean_body.is_(None)).limit(chunk_size).all()
+        if not emails:
+            return updated
+        for email in emails:
+            email.clean_body = clean_body(email.body or "")
+        db.commit()
+        updated += len(emails)
+
+
+def backfill_redacted_bodies(db, chunk_size: int = 500) -> int:
+    """Redact stored emails that predate ingest-time redaction or an older REDACTION_VERSION."""
+    from sqlalchemy import or_
+    from backend.models import Email
+
+    stale = or_(Email.redaction_version.is_(None), Email.redaction_version != REDACTION_VERSION)
+    updated = 0
+    while True:
+        emails = db.query(Email).filter(stale).limit(chunk_size).all()
+        if not emails:
+            return updated
+        for email in emails:
+            email.redacted_body = pii_service.redact(pii_service.strip_markers(plain_body(email)))
+            email.redaction_version = REDACTION_VERSION
+        db.commit()
+        updated += len(emails)
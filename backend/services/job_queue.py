@@ -0,0 +1,310 @@
+"""
+Durable Job Queue
+Email processing runs as rows in the `jobs` table, claimed by worker threads
+in the API process, instead of FastAPI BackgroundTasks that vanish on restart.
+
+- A job holds an ordered list of email ids and is processed in chunks of
+  JOB_CHUNK_SIZE; progress is committed after every chunk, so a retried or
+  recovered job resumes where it stopped.
+- Workers claim jobs with a conditional UPDATE, so several threads (or API
+  processes sharing the database) never run the same job twice.
+- Running jobs are kept alive by a heartbeat. A job whose heartbeat is older
+  than JOB_LEASE_S (worker crashed, server restarted) is claimed again.
+  Progress and status updates only apply while the worker still holds its
+  claim, so a worker whose job was reclaimed stops instead of double-counting.
+- A job that raises is retried with exponential backoff up to
+  JOB_MAX_ATTEMPTS claims, then marked failed. Per-email errors are counted
+  in `failed` and don't fail the job (LLM calls already retry transient
+  errors, see services/retry_policy).
+"""
+
+import asyncio
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, and_, update
+from sqlalchemy.orm import Session
+
+from backend.database import SessionLocal
+from backend.models import Job
+from backend.services import agent_service
+from backend.services.llm_service import llm_service
+from backend.logger import get_logger
+
+logger = get_logger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+async def _process_chunk(email_ids: list, session_factory, force: bool = False) -> int:
+    """
+    Process emails CONCURRENTLY on the async LLM path; returns how many raised.
+    Throughput is bounded by the provider's requests/min and tokens/min
+    budget (see services/rate_limiter.py) and LLM_MAX_CONCURRENCY.
+    With LLM_BATCH_EXTRACTION on, several emails share each extraction call.
+    """
+    # Cap open sessions/connections at the LLM concurrency limit
+    slots = asyncio.Semaphore(llm_service.max_concurrency)
+
+    if agent_service.BATCH_EXTRACTION:
+        db = session_factory()
+        try:
+            groups = agent_service.plan_email_batches(db, email_ids)
+        finally:
+            db.close()
+        process = agent_service.process_emails_batched_async
+    else:
+        groups = list(email_ids)
+        process = agent_service.process_email_async
+
+    async def process_one(group) -> int:
+        async with slots:
+            # Each task gets its own session; sessions are not shared across tasks
+            db = session_factory()
+            try:
+                await process(db, group, force=force)
+                return 0
+            except Exception as e:
+                # Count but don't crash the whole chunk
+                logger.error(f"Error processing {group}: {e}")
+                return len(group) if isinstance(group, list) else 1
+            finally:
+                db.close()
+
+    return sum(await asyncio.gather(*(process_one(group) for group in groups)))
+
+
+def job_to_dict(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "force": bool(job.force),
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "total": job.total,
+        "processed": job.processed,
+        "failed": job.failed,
+        "progress": round(job.processed / job.total, 3) if job.total else 1.0,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class JobQueue:
+    def __init__(self, session_factory=SessionLocal, chunk_size: int = 25, max_attempts: int = 3,
+                 lease_seconds: float = 60.0, retry_delay: float = 5.0, poll_interval: float = 1.0):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._running = set()  # Job ids claimed by this process, kept alive by the heartbeat
+        self._running_lock = threading.Lock()
+        self._worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    # --- Producers ---
+
+    def enqueue(self, db: Session, email_ids: list, kind: str = "process_emails", force: bool = False) -> Job:
+        job = Job(kind=kind, email_ids=list(email_ids), total=len(email_ids), force=force,
+                  max_attempts=self.max_attempts, status=QUEUED)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self._wake.set()
+        return job
+
+    # --- Workers ---
+
+    def start(self, workers: int = 1):
+        """Start worker threads (plus one heartbeat thread) in this process."""
+        if self._threads or workers < 1:
+            return
+        self._stop.clear()
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, args=(f"{self._worker_prefix}:{i}",),
+                                      name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        logger.info(f"Started {workers} job worker(s)")
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Ask workers to stop after their current chunk; their jobs go back to
+        the queue and resume from their progress. A job still running after
+        the timeout is picked up again once its lease expires.
+        """
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self, worker: str):
+        while not self._stop.is_set():
+            try:
+                ran = self.run_once(worker)
+            except Exception as e:
+                logger.error(f"Job worker {worker} error: {e}")
+                ran = None
+            if ran is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._running_lock:
+                job_ids = list(self._running)
+            if not job_ids:
+                continue
+            db = self.session_factory()
+            try:
+                db.execute(update(Job).where(Job.id.in_(job_ids), Job.status == RUNNING)
+                           .values(heartbeat_at=datetime.utcnow()))
+                db.commit()
+            except Exception as e:
+                logger.error(f"Job heartbeat failed: {e}")
+            finally:
+                db.close()
+
+    def run_once(self, worker: str = None):
+        """Claim and run one job to completion (or failure); returns its id, or None if none was ready."""
+        worker = worker or f"{self._worker_prefix}:inline"
+        db = self.session_factory()
+        try:
+            job = self._claim(db, worker)
+            if job is None:
+                return None
+            with self._running_lock:
+                self._running.add(job.id)
+            try:
+                self._run(db, job)
+            finally:
+                with self._running_lock:
+                    self._running.discard(job.id)
+            return job.id
+        finally:
+            db.close()
+
+    def _claim(self, db: Session, worker: str):
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.lease_seconds)
+        candidates = (
+            db.query(Job)
+            .filter(or_(
+                and_(Job.status == QUEUED, or_(Job.run_after.is_(None), Job.run_after <= now)),
+                and_(Job.status == RUNNING, Job.heartbeat_at < stale),
+            ))
+            .order_by(Job.id)
+            .limit(5)
+            .all()
+        )
+        for job in candidates:
+            recovered = job.status == RUNNING
+            if recovered and job.attempts >= job.max_attempts:
+                self._finish(db, job, FAILED, f"Worker {job.worker} stopped responding",
+                             where=(Job.status == RUNNING, Job.heartbeat_at == job.heartbeat_at))
+                continue
+            # Only one claimant can move the row out of the state it read
+            same_heartbeat = Job.heartbeat_at.is_(None) if job.heartbeat_at is None else Job.heartbeat_at == job.heartbeat_at
+            claimed = db.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.status == job.status, same_heartbeat)
+                .values(status=RUNNING, attempts=Job.attempts + 1, worker=worker,
+                        heartbeat_at=now, started_at=job.started_at or now)
+            ).rowcount
+            db.commit()
+            if claimed:
+                db.refresh(job)
+                if recovered:
+                    logger.warning(f"Recovered job {job.id} from a stopped worker (attempt {job.attempts})")
+                return job
+        return None
+
+    @staticmethod
+    def _claimed(claim: tuple) -> tuple:
+        """
+        Conditions that hold while a claim, (job id, worker, attempts) as read
+        when it was taken, has not been reclaimed by another worker. Never
+        built from the ORM object: a rollback reloads it from the row, which
+        may by then hold the other worker's claim.
+        """
+        job_id, worker, attempts = claim
+        return Job.id == job_id, Job.status == RUNNING, Job.worker == worker, Job.attempts == attempts
+
+    def _update_claimed(self, db: Session, job: Job, claim: tuple, **values) -> bool:
+        """Apply values if the claim still holds; False when the job was reclaimed meanwhile."""
+        updated = db.execute(update(Job).where(*self._claimed(claim)).values(**values)).rowcount
+        db.commit()
+        db.refresh(job)
+        if not updated:
+            logger.warning(f"Job {job.id} was reclaimed by worker {job.worker}, dropping this run")
+        return bool(updated)
+
+    def _run(self, db: Session, job: Job):
+        claim = (job.id, job.worker, job.attempts)
+        attempts = job.attempts
+        try:
+            while job.processed < job.total:
+                if self._stop.is_set():
+                    # Back to the queue with its progress; the interrupted claim doesn't count as an attempt
+                    if self._update_claimed(db, job, claim, status=QUEUED, attempts=Job.attempts - 1, run_after=None):
+                        logger.info(f"Job {job.id} requeued at {job.processed}/{job.total} on shutdown")
+                    return
+                chunk = job.email_ids[job.processed:job.processed + self.chunk_size]
+                failures = asyncio.run(_process_chunk(chunk, self.session_factory, bool(job.force)))
+                if not self._update_claimed(db, job, claim, processed=Job.processed + len(chunk),
+                                            failed=Job.failed + failures, heartbeat_at=datetime.utcnow()):
+                    return
+        except Exception as e:
+            db.rollback()
+            if attempts >= job.max_attempts:
+                logger.error(f"Job {job.id} failed after {attempts} attempts: {e}")
+                self._finish(db, job, FAILED, str(e), where=self._claimed(claim))
+            else:
+                delay = self.retry_delay * 2 ** (attempts - 1)
+                logger.warning(f"Job {job.id} attempt {attempts} failed, retrying in {delay:.0f}s: {e}")
+                self._update_claimed(db, job, claim, status=QUEUED, error=str(e),
+                                     run_after=datetime.utcnow() + timedelta(seconds=delay))
+            return
+        self._finish(db, job, DONE, where=self._claimed(claim))
+
+    def _finish(self, db: Session, job: Job, status: str, error: str = None, where: tuple = ()):
+        """Mark the job finished, if the conditions in `where` still hold."""
+        query = update(Job).where(Job.id == job.id, *where)
+        db.execute(query.values(status=status, error=error or job.error, finished_at=datetime.utcnow()))
+        db.commit()
+        db.refresh(job)
+
+    # --- Status ---
+
+    def get(self, db: Session, job_id: int):
+        return db.get(Job, job_id)
+
+    def recent(self, db: Session, limit: int = 20) -> list:
+        return db.query(Job).order_by(Job.id.desc()).limit(limit).all()
+
+
+def job_queue_from_env(session_factory=SessionLocal) -> JobQueue:
+    return JobQueue(
+        session_factory=session_factory,
+        chunk_size=int(os.getenv("JOB_CHUNK_SIZE", "25")),
+        max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+        lease_seconds=float(os.getenv("JOB_LEASE_S", "60")),
+        retry_delay=float(os.getenv("JOB_RETRY_DELAY_S", "5")),
+        poll_interval=float(os.getenv("JOB_POLL_INTERVAL_S", "1")),
+    )
+
+
+job_queue = job_queue_from_env()
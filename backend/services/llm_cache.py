@@ -0,0 +1,214 @@
+"""
+Persistent LLM Response Cache
+=============================
+SQLite-backed cache for LLM completions, keyed by
+(provider, model, json_mode, sha256(redacted prompt)).
+
+- TTL: entries older than ttl_seconds are treated as misses and purged
+- Size cap: at most max_entries rows, least-recently-used evicted first
+- Hot entries are mirrored in a small in-process LRU, so repeated hits
+  never touch SQLite and return in microseconds
+- Hit / miss / eviction counters for /status
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from backend.logger import get_logger
+
+logger = get_logger(__name__)
+
+_BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_CACHE_PATH = _BACKEND_DIR / "llm_cache.db"
+
+# SQLite last_accessed is refreshed at most this often per key (keeps hits read-only);
+# pending access times of memory-resident keys are flushed before any LRU eviction.
+_TOUCH_INTERVAL_SECONDS = 60
+
+
+class LLMCache:
+    def __init__(self, path: str = None, ttl_seconds: int = 7 * 24 * 3600,
+                 max_entries: int = 5000, memory_entries: int = 512, enabled: bool = True):
+        self.path = str(path or DEFAULT_CACHE_PATH)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.enabled = enabled
+
+        self._conn = None
+        self._lock = threading.Lock()
+        # key -> (value, expires_at, last_access, last_touched_in_sqlite)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(provider: str, model: str, json_mode: bool, prompt: str) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return f"{provider}|{model}|{int(bool(json_mode))}|{prompt_hash}"
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    provider TEXT,
+                    model TEXT,
+                    created_at REAL NOT NULL,
+                    last_accessed REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_lru ON llm_cache (last_accessed)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache (created_at)")
+        return self._conn
+
+    def _remember(self, key: str, value: str, expires_at: float, touched: float):
+        self._memory[key] = (value, expires_at, touched, touched)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str, count: bool = True) -> Optional[str]:
+        """
+        Return the cached value or None (miss / expired / disabled).
+        count=False leaves the hit/miss counters alone (a recheck of a lookup
+        that was already counted).
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at, _, touched = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    if now - touched > _TOUCH_INTERVAL_SECONDS:
+                        self._touch(key, now)
+                        touched = now
+                    self._memory[key] = (value, expires_at, now, touched)
+                    self.hits += count
+                    return value
+                del self._memory[key]
+
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self.misses += count
+                    return None
+                value, created_at = row
+                expires_at = created_at + self.ttl_seconds
+                if expires_at <= now:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self.misses += count
+                    return None
+                self._touch(key, now)
+            except sqlite3.Error as e:
+                logger.error(f"LLM cache read failed: {e}")
+                self.misses += count
+                return None
+
+            self._remember(key, value, expires_at, now)
+            self.hits += count
+            return value
+
+    def _touch(self, key: str, now: float):
+        try:
+            self._connect().execute("UPDATE llm_cache SET last_accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.error(f"LLM cache touch failed: {e}")
+
+    def set(self, key: str, value: str, provider: str = None, model: str = None):
+        if not self.enabled or value is None:
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, provider, model, created_at, last_accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, value, provider, model, now, now),
+                )
+                self._evict(conn)
+            except sqlite3.Error as e:
+                logger.error(f"LLM cache write failed: {e}")
+                return
+            self._remember(key, value, now + self.ttl_seconds, now)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop expired rows, then least-recently-used rows beyond max_entries."""
+        cutoff = time.time() - self.ttl_seconds
+        expired = conn.execute("DELETE FROM llm_cache WHERE created_at <= ?", (cutoff,)).rowcount
+        count = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        excess = count - self.max_entries
+        evicted_keys = []
+        if excess > 0:
+            self._flush_access_times(conn)
+            evicted_keys = [r[0] for r in conn.execute(
+                "SELECT key FROM llm_cache ORDER BY last_accessed ASC LIMIT ?", (excess,)
+            )]
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", [(k,) for k in evicted_keys])
+            for k in evicted_keys:
+                self._memory.pop(k, None)
+        self.evictions += max(expired, 0) + len(evicted_keys)
+
+    def _flush_access_times(self, conn: sqlite3.Connection):
+        """Write memory-only access times to SQLite so LRU order reflects in-memory hits."""
+        dirty = [(access, key) for key, (_, _, access, touched) in self._memory.items() if access > touched]
+        if dirty:
+            conn.executemany("UPDATE llm_cache SET last_accessed = ? WHERE key = ?", dirty)
+            for access, key in dirty:
+                value, expires_at, _, _ = self._memory[key]
+                self._memory[key] = (value, expires_at, access, access)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            try:
+                self._connect().execute("DELETE FROM llm_cache")
+            except sqlite3.Error as e:
+                logger.error(f"LLM cache clear failed: {e}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        entries = 0
+        if self.enabled:
+            with self._lock:
+                try:
+                    entries = self._connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+def cache_from_env() -> LLMCache:
+    """Build the cache from LLM_CACHE_* environment variables."""
+    return LLMCache(
+        path=os.getenv("LLM_CACHE_PATH", str(DEFAULT_CACHE_PATH)),
+        ttl_seconds=int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")),
+        enabled=os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"),
+    )
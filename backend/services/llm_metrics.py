@@ -0,0 +1,172 @@
+"""
+LLM Call Metrics
+================
+In-process counters and latency histograms for every LLM call, labelled by
+the API endpoint that triggered it and the prompt type.
+
+- The endpoint comes from a context variable set by the HTTP middleware in
+  main.py, so it follows the request into threadpool workers and asyncio
+  tasks it starts. Calls made outside a request, including the job-queue
+  worker threads that run /agent/process* jobs, are labelled "background"
+- The prompt type is passed explicitly by the caller (generate_text(..., prompt_type=...))
+- Token counts are estimated from text length (~4 characters per token)
+
+Exposed as Prometheus text on /metrics and as a JSON summary on /status.
+"""
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+
+current_endpoint: ContextVar = ContextVar("llm_endpoint", default="background")
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Series:
+    __slots__ = ("requests", "cache_hits", "coalesced", "errors", "retries",
+                 "prompt_tokens", "completion_tokens", "latency_sum", "latency_count", "buckets")
+
+    def __init__(self):
+        self.requests = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+
+class LLMMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = defaultdict(_Series)  # (endpoint, prompt_type) -> _Series
+
+    def _get(self, prompt_type: str) -> _Series:
+        return self._series[(current_endpoint.get(), prompt_type)]
+
+    def record_cache_hit(self, prompt_type: str):
+        with self._lock:
+            series = self._get(prompt_type)
+            series.requests += 1
+            series.cache_hits += 1
+
+    def record_coalesced(self, prompt_type: str):
+        """A caller that shared another caller's in-flight upstream request."""
+        with self._lock:
+            series = self._get(prompt_type)
+            series.requests += 1
+            series.coalesced += 1
+
+    def record_call(self, prompt_type: str, latency: float, prompt_tokens: int,
+                    completion_tokens: int = 0, error: bool = False):
+        """One upstream call (including any retries inside it)."""
+        with self._lock:
+            series = self._get(prompt_type)
+            series.requests += 1
+            series.errors += int(error)
+            series.prompt_tokens += prompt_tokens
+            series.completion_tokens += completion_tokens
+            series.latency_sum += latency
+            series.latency_count += 1
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    series.buckets[i] += 1
+                    break
+
+    def record_retry(self, prompt_type: str):
+        with self._lock:
+            self._get(prompt_type).retries += 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def summary(self) -> dict:
+        """JSON-friendly totals plus a per endpoint / prompt type breakdown."""
+        with self._lock:
+            items = sorted(self._series.items())
+            by_label = []
+            totals = defaultdict(float)
+            for (endpoint, prompt_type), s in items:
+                row = {
+                    "endpoint": endpoint,
+                    "prompt_type": prompt_type,
+                    "requests": s.requests,
+                    "cache_hits": s.cache_hits,
+                    "coalesced": s.coalesced,
+                    "errors": s.errors,
+                    "retries": s.retries,
+                    "prompt_tokens": s.prompt_tokens,
+                    "completion_tokens": s.completion_tokens,
+                    "avg_latency_ms": round(s.latency_sum / s.latency_count * 1000, 1) if s.latency_count else None,
+                    "p95_latency_le_s": _bucket_quantile(s, 0.95),
+                }
+                by_label.append(row)
+                for key in ("requests", "cache_hits", "coalesced", "errors", "retries",
+                            "prompt_tokens", "completion_tokens"):
+                    totals[key] += row[key]
+                totals["latency_seconds"] += s.latency_sum
+            return {
+                "totals": {k: (round(v, 3) if k == "latency_seconds" else int(v)) for k, v in totals.items()},
+                "by_endpoint": by_label,
+            }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        counters = [
+            ("llm_requests_total", "LLM generate calls, including cache hits", "requests"),
+            ("llm_cache_hits_total", "LLM calls served from the response cache", "cache_hits"),
+            ("llm_coalesced_total", "LLM calls that shared an identical in-flight request", "coalesced"),
+            ("llm_errors_total", "LLM calls that failed after all providers and retries", "errors"),
+            ("llm_retries_total", "Retried upstream LLM attempts", "retries"),
+            ("llm_prompt_tokens_total", "Estimated prompt tokens sent upstream", "prompt_tokens"),
+            ("llm_completion_tokens_total", "Estimated completion tokens received", "completion_tokens"),
+        ]
+        with self._lock:
+            items = sorted(self._series.items())
+            lines = []
+            for name, help_text, attr in counters:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for (endpoint, prompt_type), s in items:
+                    lines.append(f"{name}{{{_labels(endpoint, prompt_type)}}} {getattr(s, attr)}")
+
+            name = "llm_request_duration_seconds"
+            lines.append(f"# HELP {name} Latency of upstream LLM calls")
+            lines.append(f"# TYPE {name} histogram")
+            for (endpoint, prompt_type), s in items:
+                labels = _labels(endpoint, prompt_type)
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, s.buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {s.latency_count}')
+                lines.append(f"{name}_sum{{{labels}}} {s.latency_sum:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {s.latency_count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(endpoint: str, prompt_type: str) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'endpoint="{escape(endpoint)}",prompt_type="{escape(prompt_type)}"'
+
+
+def _bucket_quantile(series: _Series, q: float):
+    """Upper bound of the histogram bucket containing quantile q (None if no samples)."""
+    if not series.latency_count:
+        return None
+    target = q * series.latency_count
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS, series.buckets):
+        cumulative += count
+        if cumulative >= target:
+            return bound
+    return "+Inf"
+
+
+llm_metrics = LLMMetrics()
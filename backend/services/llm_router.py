@@ -0,0 +1,181 @@
+"""
+LLM Provider Routing
+====================
+Tracks the health of every configured provider and decides which one a
+request should try first.
+
+- Circuit breaker per provider: closed -> open after `failure_threshold`
+  consecutive failures; after `reset_seconds` one half-open probe request
+  is let through, and its outcome closes or re-opens the circuit
+- Rolling window of recent calls per provider: p95 latency and error rate
+- Routing order: providers whose circuit allows a request, ranked by
+  p95 latency inflated by their error rate; configured priority breaks ties
+  (and stands in for latency until a provider has been measured).
+  Last-resort providers (the mock) always come after the real ones, however
+  fast they answer
+
+Configuration:
+    LLM_BREAKER_FAILURES        consecutive failures that open a circuit (default 3)
+    LLM_BREAKER_RESET_SECONDS   seconds before a half-open probe (default 30)
+    LLM_ROUTER_WINDOW           calls kept per provider for p95 / error rate (default 100)
+"""
+import os
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Assumed latency for a provider with no measurements yet
+_UNMEASURED_LATENCY = 1.0
+# Error rate multiplies latency by up to (1 + _ERROR_PENALTY)
+_ERROR_PENALTY = 4.0
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 3, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self, now: float) -> bool:
+        """Whether a request may be sent; moves open -> half-open once the reset time has passed."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now - self.opened_at >= self.reset_seconds:
+            self.state = HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self, now: float):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = now
+        self._probe_in_flight = False
+
+    def release(self):
+        """An admitted request ended without an outcome; a half-open circuit may probe again."""
+        self._probe_in_flight = False
+
+
+class ProviderHealth:
+    """Circuit breaker plus a rolling window of (latency, ok) samples for one provider."""
+
+    def __init__(self, name: str, priority: int, window: int, breaker: CircuitBreaker):
+        self.name = name
+        self.priority = priority
+        self.breaker = breaker
+        self.samples = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+
+    def p95(self) -> float:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return self.samples.count(False) / len(self.samples)
+
+    def score(self) -> float:
+        p95 = self.p95()
+        return (_UNMEASURED_LATENCY if p95 is None else p95) * (1 + _ERROR_PENALTY * self.error_rate())
+
+
+class ProviderRouter:
+    def __init__(self, providers: list, failure_threshold: int = 3,
+                 reset_seconds: float = 30.0, window: int = 100, last_resort: tuple = ()):
+        self._lock = threading.Lock()
+        self.last_resort = set(last_resort)
+        self.health = {
+            name: ProviderHealth(name, priority, window, CircuitBreaker(failure_threshold, reset_seconds))
+            for priority, name in enumerate(providers)
+        }
+
+    @property
+    def providers(self) -> list:
+        return list(self.health)
+
+    def ranked(self) -> list:
+        """All providers, best first. Call admit() before sending to each."""
+        with self._lock:
+            ranked = sorted(self.health.values(), key=self._rank)
+            return [h.name for h in ranked]
+
+    def _rank(self, health: ProviderHealth) -> tuple:
+        if health.name in self.last_resort:
+            return True, 0.0, health.priority  # Not scored: after every real provider, in configured order
+        return False, health.score(), health.priority
+
+    def admit(self, provider: str) -> bool:
+        """
+        Ask the provider's circuit breaker for permission to send one request.
+        An admitted request's outcome must be reported via record_success/record_failure,
+        or record_abandoned if it was cancelled before one was known.
+        """
+        with self._lock:
+            return self.health[provider].breaker.allow(time.monotonic())
+
+    def record_success(self, provider: str, latency: float = None):
+        with self._lock:
+            health = self.health[provider]
+            health.requests += 1
+            health.samples.append(True)
+            if latency is not None:
+                health.latencies.append(latency)
+            health.breaker.record_success()
+
+    def record_failure(self, provider: str):
+        with self._lock:
+            health = self.health[provider]
+            health.requests += 1
+            health.errors += 1
+            health.samples.append(False)
+            health.breaker.record_failure(time.monotonic())
+
+    def record_abandoned(self, provider: str):
+        """The caller gave up on an admitted request (task cancelled, stream closed by the client)."""
+        with self._lock:
+            self.health[provider].breaker.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "state": h.breaker.state,
+                    "requests": h.requests,
+                    "errors": h.errors,
+                    "error_rate": round(h.error_rate(), 3),
+                    "p95_ms": round(h.p95() * 1000, 1) if h.p95() is not None else None,
+                }
+                for name, h in self.health.items()
+            }
+
+
+def router_from_env(providers: list, last_resort: tuple = ()) -> ProviderRouter:
+    """Build a router for `providers` (in priority order) from LLM_BREAKER_* / LLM_ROUTER_* variables."""
+    return ProviderRouter(
+        providers,
+        last_resort=last_resort,
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "3")),
+        reset_seconds=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+        window=int(os.getenv("LLM_ROUTER_WINDOW", "100")),
+    )
@@ -1,6 +1,13 @@
 import os
 import json
 import re
+import asyncio
+import contextvars
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Iterator
 from dotenv import load_dotenv
 from pathlib import Path
 from backend.logger import get_logger
@@ -19,77 +26,492 @@ except Exception as e:
     logger.error(f"Environment loading error: {e}")
 
 from backend.services.pii_service import pii_service
+from backend.services.llm_cache import cache_from_env
+from backend.services.rate_limiter import limiter_for, estimate_tokens
+from backend.services.llm_router import router_from_env
+from backend.services.mock_provider import mock_provider_from_env
+from backend.services.local_llm_provider import local_provider_from_env
+from backend.services.llm_metrics import llm_metrics
+from backend.services.retry_policy import retry_policy_from_env
+from backend.services.loop_resources import LoopLocal
+
+# Completion size assumed when reserving tokens/minute budget for a request
+EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "300"))
+
+# Provider that produced the last completion in this thread / task, so its
+# answer is cached under that provider rather than the primary one
+_answered_by = contextvars.ContextVar("llm_answered_by", default=None)
+
+# Result of a single flight whose leader was cancelled; followers try again
+_ABANDONED = object()
 
 
 class LLMService:
     def __init__(self):
-        # Priority: Groq (unlimited) > Gemini (fallback)
+        # All configured providers are initialized; the router picks one per request
         self.groq_key = os.getenv("GROQ_API_KEY")
         self.gemini_key = os.getenv("GEMINI_API_KEY")
         
-        self.provider = None
-        self.is_mock = True
+        self.models = {"mock": "mock"}
+        available = []
+        self.cache = cache_from_env()
+        # Prompt types whose answers should differ on every request (regenerating
+        # a draft or asking again); the cache is neither read nor written for them
+        self.uncached_prompt_types = {
+            t.strip() for t in os.getenv("LLM_CACHE_SKIP_PROMPT_TYPES", "draft,chat,smart_reply").split(",") if t.strip()
+        }
+        
+        # Concurrent in-flight requests on the async path
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        self._semaphores = weakref.WeakKeyDictionary()
+        
+        # Single-flight: cache key -> Future of the upstream call in progress
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self.coalesced = 0
         
-        # Try Groq first (better free tier: 30 req/min, no daily limit)
+        # Backoff/deadline/budget for transient provider failures; the SDKs'
+        # own retries are disabled so attempts are not multiplied
+        self.retry_policy = retry_policy_from_env()
+        
+        # Local OpenAI-compatible server (on-prem; preferred when configured)
+        self.local_provider = local_provider_from_env()
+        if self.local_provider:
+            self.models["local"] = self.local_provider.model
+            available.append("local")
+            logger.info(f"LLM Provider available: Local ({self.local_provider.base_url}, {self.local_provider.model})")
+        
+        # Groq (better free tier: 30 req/min, no daily limit)
         if self.groq_key:
             try:
-                from groq import Groq
-                self.groq_client = Groq(api_key=self.groq_key)
-                self.provider = "groq"
-                self.is_mock = False
-                logger.info("LLM Provider: Groq (Llama 3.3 70B)")
+                from groq import Groq, AsyncGroq
+                client_options = {"max_retries": 0, "timeout": self.retry_policy.deadline}
+                self.groq_client = Groq(api_key=self.groq_key, **client_options)
+                # Its connection pool is bound to an event loop; one client per loop, closed with it
+                self.groq_async_clients = LoopLocal(lambda: AsyncGroq(api_key=self.groq_key, **client_options),
+                                                    close=lambda client: client.close())
+                self.models["groq"] = "llama-3.3-70b-versatile"
+                available.append("groq")
+                logger.info("LLM Provider available: Groq (Llama 3.3 70B)")
             except ImportError:
-                logger.warning("Groq package not installed, trying Gemini...")
+                logger.warning("Groq package not installed, skipping Groq")
         
-        # Fallback to Gemini
-        if not self.provider and self.gemini_key:
+        # Gemini
+        if self.gemini_key:
             try:
                 import google.generativeai as genai
                 genai.configure(api_key=self.gemini_key)
-                self.gemini_model = genai.GenerativeModel('gemini-2.0-flash-lite')
-                self.provider = "gemini"
-                self.is_mock = False
-                logger.info("LLM Provider: Gemini (2.0-flash-lite)")
+                self.models["gemini"] = "gemini-2.0-flash-lite"
+                self.gemini_model = genai.GenerativeModel(self.models["gemini"])
+                available.append("gemini")
+                logger.info("LLM Provider available: Gemini (2.0-flash-lite)")
             except Exception as e:
                 logger.error(f"Gemini init error: {e}")
         
-        if self.is_mock:
+        # Providers in priority order, e.g. LLM_PROVIDERS=gemini,groq or local,groq.
+        # "mock" may be listed as a last resort, or alone to force mock mode.
+        configured = os.getenv("LLM_PROVIDERS")
+        if configured:
+            order = [p.strip() for p in configured.split(",") if p.strip()]
+            providers = [p for p in order if p in available or p == "mock"]
+        else:
+            providers = available
+        
+        if not providers:
             logger.warning("No LLM API keys found. Using Mock LLM.")
+            providers = ["mock"]
+        self.is_mock = providers == ["mock"]
+        self.mock_provider = mock_provider_from_env(self._mock_response)
+        
+        # Primary provider: reported on /status and used to namespace cache keys
+        self.provider = None if self.is_mock else providers[0]
+        self.model = self.models[providers[0]]
+        
+        self.router = router_from_env(providers, last_resort=("mock",))
+        self.rate_limiters = {p: limiter_for(p) for p in providers}
     
     @property
     def api_key(self):
         """For /status endpoint compatibility."""
         return self.groq_key or self.gemini_key
 
-    def generate_text(self, prompt: str, json_mode: bool = False) -> str:
-        """Generate text using the configured LLM provider."""
+    def generate_text(self, prompt: str, json_mode: bool = False, use_cache: bool = True,
+                      prompt_type: str = "general") -> str:
+        """
+        Generate text using the configured LLM provider.
+        
+        Responses are cached by (provider, model, json_mode, redacted prompt)
+        of the provider that answered, and looked up under the primary one;
+        mock answers given as a last resort are not cached. Concurrent
+        identical calls share one upstream request; pass
+        use_cache=False to force a fresh completion. prompt_type labels the
+        call in /metrics (e.g. "extraction", "draft", "chat"); types listed in
+        LLM_CACHE_SKIP_PROMPT_TYPES are never cached.
+        """
         # Redact PII from prompt for safety
         safe_prompt = pii_service.redact(prompt)
         
-        if self.is_mock:
-            return self._mock_response(safe_prompt)
+        if not use_cache or prompt_type in self.uncached_prompt_types:
+            return self._timed_complete(safe_prompt, json_mode, prompt_type)
+        
+        cache_key = self.cache.make_key(self.provider or "mock", self.model, json_mode, safe_prompt)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            llm_metrics.record_cache_hit(prompt_type)
+            return cached
         
+        while True:
+            future, leader = self._join_flight(cache_key)
+            if leader:
+                break
+            response = future.result()
+            if response is not _ABANDONED:
+                llm_metrics.record_coalesced(prompt_type)
+                return response
         try:
-            if self.provider == "groq":
-                return self._call_groq(safe_prompt, json_mode)
-            elif self.provider == "gemini":
-                return self._call_gemini(safe_prompt, json_mode)
+            response = self.cache.get(cache_key, count=False)  # Filled by a flight that just ended; the miss is already counted
+            if response is None:
+                _answered_by.set(None)
+                response = self._timed_complete(safe_prompt, json_mode, prompt_type)
+                self._store(json_mode, safe_prompt, response)
+            else:
+                llm_metrics.record_cache_hit(prompt_type)
         except Exception as e:
-            error_msg = str(e)
-            logger.error(f"LLM Error ({self.provider}): {error_msg}")
-            raise Exception(f"LLM failed: {error_msg}")
+            self._end_flight(cache_key, future, error=e)
+            raise
+        except BaseException:
+            self._end_flight(cache_key, future, response=_ABANDONED)
+            raise
+        self._end_flight(cache_key, future, response=response)
+        return response
+    
+    async def agenerate_text(self, prompt: str, json_mode: bool = False, use_cache: bool = True,
+                             prompt_type: str = "general") -> str:
+        """
+        Async variant of generate_text for batch workloads.
+        
+        At most LLM_MAX_CONCURRENCY requests are in flight per event loop, and
+        each request waits for the provider's requests/min and tokens/min
+        budget instead of sleeping a fixed interval.
+        """
+        safe_prompt = pii_service.redact(prompt)
+        
+        if not use_cache or prompt_type in self.uncached_prompt_types:
+            async with self._async_semaphore():
+                return await self._atimed_complete(safe_prompt, json_mode, prompt_type)
+        
+        cache_key = self.cache.make_key(self.provider or "mock", self.model, json_mode, safe_prompt)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            llm_metrics.record_cache_hit(prompt_type)
+            return cached
+        
+        while True:
+            future, leader = self._join_flight(cache_key)
+            if leader:
+                break
+            # Shielded: a cancelled follower must not cancel the shared future
+            response = await asyncio.shield(asyncio.wrap_future(future))
+            if response is not _ABANDONED:
+                llm_metrics.record_coalesced(prompt_type)
+                return response
+        try:
+            response = self.cache.get(cache_key, count=False)  # Filled by a flight that just ended; the miss is already counted
+            if response is None:
+                _answered_by.set(None)
+                async with self._async_semaphore():
+                    response = await self._atimed_complete(safe_prompt, json_mode, prompt_type)
+                self._store(json_mode, safe_prompt, response)
+            else:
+                llm_metrics.record_cache_hit(prompt_type)
+        except asyncio.CancelledError:
+            # The leader's cancellation is its own; a follower takes over the call
+            self._end_flight(cache_key, future, response=_ABANDONED)
+            raise
+        except BaseException as e:
+            self._end_flight(cache_key, future, error=e)
+            raise
+        self._end_flight(cache_key, future, response=response)
+        return response
+    
+    def stream_text(self, prompt: str, use_cache: bool = True, prompt_type: str = "general") -> Iterator[str]:
+        """
+        Yield the completion in chunks as the provider produces them.
+        
+        A cache hit is yielded as a single chunk; a completed stream is
+        written to the cache so the non-streaming path can reuse it.
+        """
+        safe_prompt = pii_service.redact(prompt)
+        
+        cache_key = None
+        if use_cache and prompt_type not in self.uncached_prompt_types:
+            cache_key = self.cache.make_key(self.provider or "mock", self.model, False, safe_prompt)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                llm_metrics.record_cache_hit(prompt_type)
+                yield cached
+                return
+        
+        chunks = []
+        start = time.perf_counter()
+        _answered_by.set(None)
+        try:
+            for chunk in self._stream(safe_prompt):
+                if chunk:
+                    chunks.append(chunk)
+                    yield chunk
+        except Exception:
+            llm_metrics.record_call(prompt_type, time.perf_counter() - start,
+                                    estimate_tokens(safe_prompt), error=True)
+            raise
+        
+        response = "".join(chunks)
+        llm_metrics.record_call(prompt_type, time.perf_counter() - start,
+                                estimate_tokens(safe_prompt), estimate_tokens(response))
+        if cache_key:
+            self._store(False, safe_prompt, response)
+    
+    def _store(self, json_mode: bool, safe_prompt: str, response: str):
+        """Cache a response under the provider and model that produced it."""
+        provider = _answered_by.get() or self.provider or "mock"
+        if provider == "mock" and not self.is_mock:
+            return  # A canned answer must not be served later as a real one
+        model = self.models[provider]
+        self.cache.set(self.cache.make_key(provider, model, json_mode, safe_prompt), response, provider, model)
+
+    def _timed_complete(self, safe_prompt: str, json_mode: bool, prompt_type: str) -> str:
+        start = time.perf_counter()
+        try:
+            response = self._complete(safe_prompt, json_mode, prompt_type)
+        except Exception:
+            llm_metrics.record_call(prompt_type, time.perf_counter() - start,
+                                    estimate_tokens(safe_prompt), error=True)
+            raise
+        llm_metrics.record_call(prompt_type, time.perf_counter() - start,
+                                estimate_tokens(safe_prompt), estimate_tokens(response))
+        return response
+    
+    async def _atimed_complete(self, safe_prompt: str, json_mode: bool, prompt_type: str) -> str:
+        start = time.perf_counter()
+        try:
+            response = await self._acomplete(safe_prompt, json_mode, prompt_type)
+        except Exception:
+            llm_metrics.record_call(prompt_type, time.perf_counter() - start,
+                                    estimate_tokens(safe_prompt), error=True)
+            raise
+        llm_metrics.record_call(prompt_type, time.perf_counter() - start,
+                                estimate_tokens(safe_prompt), estimate_tokens(response))
+        return response
+    
+    def _stream(self, safe_prompt: str) -> Iterator[str]:
+        """
+        Stream from the best available provider. Failover happens only
+        before the first chunk; once text has been sent, errors propagate.
+        """
+        errors = []
+        for provider in self.router.ranked():
+            if not self.router.admit(provider):
+                continue
+            self.rate_limiters[provider].acquire(estimate_tokens(safe_prompt) + EXPECTED_COMPLETION_TOKENS)
+            try:
+                chunks = self._stream_from(provider, safe_prompt)
+                first = next(chunks, None)
+            except Exception as e:
+                self.router.record_failure(provider)
+                logger.error(f"LLM Stream Error ({provider}): {e}")
+                errors.append(f"{provider}: {e}")
+                continue
+            
+            try:
+                if first is not None:
+                    yield first
+                yield from chunks
+            except Exception as e:
+                self.router.record_failure(provider)
+                logger.error(f"LLM Stream Error ({provider}): {e}")
+                raise Exception(f"LLM failed: {provider}: {e}")
+            except BaseException:
+                # The client stopped reading (GeneratorExit): no verdict on the provider
+                self.router.record_abandoned(provider)
+                raise
+            # Stream duration depends on output length, so it is not a latency sample
+            self.router.record_success(provider)
+            _answered_by.set(provider)
+            return
+        raise Exception(f"LLM failed: {self._failure_summary(errors)}")
     
-    def _call_groq(self, prompt: str, json_mode: bool) -> str:
+    def _join_flight(self, cache_key: str):
+        """
+        Register interest in cache_key. Returns (future, is_leader): the leader
+        makes the upstream call, everyone else waits on the shared future.
+        concurrent.futures.Future works for both threads (.result()) and
+        coroutines (asyncio.wrap_future), whichever kind of caller leads.
+        A cancelled leader resolves it to _ABANDONED, and the waiting callers
+        join again so one of them makes the call.
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(cache_key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._inflight[cache_key] = future
+            return future, True
+    
+    def _end_flight(self, cache_key: str, future: Future, response: str = None, error: BaseException = None):
+        # The response is already cached, so callers arriving after removal hit the cache
+        with self._inflight_lock:
+            self._inflight.pop(cache_key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(response)
+    
+    def _async_semaphore(self) -> asyncio.Semaphore:
+        """One concurrency semaphore per running event loop."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+    
+    def _complete(self, safe_prompt: str, json_mode: bool, prompt_type: str = "general") -> str:
+        """
+        Try providers best-first, failing over until one succeeds. When every
+        provider failed and at least one failure was transient, wait (backoff,
+        jitter, Retry-After) and try again within the call's deadline.
+        """
+        deadline_at = time.monotonic() + self.retry_policy.deadline
+        self.retry_policy.budget.record_request()
+        errors = []
+        attempt = 1
+        while True:
+            failed = []
+            for provider in self.router.ranked():
+                if time.monotonic() >= deadline_at:
+                    errors.append(f"{provider}: call deadline exceeded")
+                    break
+                if not self.router.admit(provider):
+                    continue
+                self.rate_limiters[provider].acquire(estimate_tokens(safe_prompt) + EXPECTED_COMPLETION_TOKENS)
+                start = time.perf_counter()
+                try:
+                    # Each attempt gets what is left of the call's deadline, like wait_for() on the async path
+                    timeout = max(0.001, deadline_at - time.monotonic())
+                    response = self._call(provider, safe_prompt, json_mode, timeout)
+                except Exception as e:
+                    self.router.record_failure(provider)
+                    logger.error(f"LLM Error ({provider}): {e}")
+                    errors.append(f"{provider}: {e}")
+                    failed.append(e)
+                    continue
+                self.router.record_success(provider, time.perf_counter() - start)
+                _answered_by.set(provider)
+                return response
+            
+            delay = self.retry_policy.next_delay(attempt, failed, deadline_at)
+            if delay is None:
+                raise Exception(f"LLM failed: {self._failure_summary(errors)}")
+            llm_metrics.record_retry(prompt_type)
+            logger.warning(f"LLM attempt {attempt} failed, retrying in {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
+    
+    async def _acomplete(self, safe_prompt: str, json_mode: bool, prompt_type: str = "general") -> str:
+        deadline_at = time.monotonic() + self.retry_policy.deadline
+        self.retry_policy.budget.record_request()
+        errors = []
+        attempt = 1
+        while True:
+            failed = []
+            for provider in self.router.ranked():
+                if time.monotonic() >= deadline_at:
+                    errors.append(f"{provider}: call deadline exceeded")
+                    break
+                if not self.router.admit(provider):
+                    continue
+                start = time.perf_counter()
+                try:
+                    try:
+                        await asyncio.wait_for(
+                            self.rate_limiters[provider].acquire_async(estimate_tokens(safe_prompt) + EXPECTED_COMPLETION_TOKENS),
+                            deadline_at - time.monotonic())
+                    except asyncio.TimeoutError:
+                        # The deadline ran out in our own rate limiter: no verdict on the provider
+                        self.router.record_abandoned(provider)
+                        errors.append(f"{provider}: call deadline exceeded waiting for the rate limit")
+                        break
+                    start = time.perf_counter()
+                    remaining = max(0.001, deadline_at - time.monotonic())
+                    response = await asyncio.wait_for(self._acall(provider, safe_prompt, json_mode), remaining)
+                except asyncio.CancelledError:
+                    # E.g. a speculative extraction cancelled by the stage graph
+                    self.router.record_abandoned(provider)
+                    raise
+                except Exception as e:
+                    self.router.record_failure(provider)
+                    detail = str(e) or type(e).__name__  # asyncio.TimeoutError has no message
+                    logger.error(f"LLM Error ({provider}): {detail}")
+                    errors.append(f"{provider}: {detail}")
+                    failed.append(e)
+                    continue
+                self.router.record_success(provider, time.perf_counter() - start)
+                _answered_by.set(provider)
+                return response
+            
+            delay = self.retry_policy.next_delay(attempt, failed, deadline_at)
+            if delay is None:
+                raise Exception(f"LLM failed: {self._failure_summary(errors)}")
+            llm_metrics.record_retry(prompt_type)
+            logger.warning(f"LLM attempt {attempt} failed, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+    
+    @staticmethod
+    def _failure_summary(errors: list) -> str:
+        return "; ".join(errors) if errors else "all providers unavailable (circuit open)"
+    
+    def _call(self, provider: str, prompt: str, json_mode: bool, timeout: float = None) -> str:
+        if provider == "groq":
+            return self._call_groq(prompt, json_mode, timeout)
+        if provider == "gemini":
+            return self._call_gemini(prompt, json_mode, timeout)
+        if provider == "local":
+            return self.local_provider.complete(prompt, json_mode, timeout)
+        return self.mock_provider.complete(prompt, timeout)
+    
+    async def _acall(self, provider: str, prompt: str, json_mode: bool) -> str:
+        if provider == "groq":
+            return await self._acall_groq(prompt, json_mode)
+        if provider == "gemini":
+            return await self._acall_gemini(prompt, json_mode)
+        if provider == "local":
+            return await self.local_provider.acomplete(prompt, json_mode)
+        return await self.mock_provider.acomplete(prompt)
+    
+    def _stream_from(self, provider: str, prompt: str) -> Iterator[str]:
+        if provider == "groq":
+            return self._stream_groq(prompt)
+        if provider == "gemini":
+            return self._stream_gemini(prompt)
+        if provider == "local":
+            return self.local_provider.stream(prompt)
+        # Word-sized chunks so clients exercise the same incremental path
+        return self.mock_provider.stream(prompt)
+    
+    def _call_groq(self, prompt: str, json_mode: bool, timeout: float = None) -> str:
         response = self.groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+            model=self.models["groq"],
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
             max_tokens=2048,
-            response_format={"type": "json_object"} if json_mode else None
+            response_format={"type": "json_object"} if json_mode else None,
+            timeout=timeout or self.retry_policy.deadline
         )
         return response.choices[0].message.content
     
-    def _call_gemini(self, prompt: str, json_mode: bool) -> str:
+    def _call_gemini(self, prompt: str, json_mode: bool, timeout: float = None) -> str:
         import google.generativeai as genai
         generation_config = {}
         if json_mode:
@@ -97,12 +519,51 @@ class LLMService:
         
         response = self.gemini_model.generate_content(
             prompt, 
-            generation_config=generation_config
+            generation_config=generation_config,
+            request_options={"timeout": timeout or self.retry_policy.deadline}
         )
         return response.text
 
+    def _stream_groq(self, prompt: str) -> Iterator[str]:
+        stream = self.groq_client.chat.completions.create(
+            model=self.models["groq"],
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=2048,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content or ""
+    
+    def _stream_gemini(self, prompt: str) -> Iterator[str]:
+        for chunk in self.gemini_model.generate_content(prompt, stream=True):
+            yield chunk.text
+    
+    async def _acall_groq(self, prompt: str, json_mode: bool) -> str:
+        client = await self.groq_async_clients.get()
+        response = await client.chat.completions.create(
+            model=self.models["groq"],
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=2048,
+            response_format={"type": "json_object"} if json_mode else None
+        )
+        return response.choices[0].message.content
+    
+    async def _acall_gemini(self, prompt: str, json_mode: bool) -> str:
+        # The SDK's async client is a process-wide gRPC channel bound to the first
+        # event loop that used it, so run the sync call in a worker thread instead
+        return await asyncio.to_thread(self._call_gemini, prompt, json_mode)
+
     def _mock_response(self, prompt: str) -> str:
         """Simple heuristic mock responses for demo when no API keys are configured."""
+        if "Analyze each of the following emails" in prompt:
+            blocks = re.findall(r"=== EMAIL id=(.*?) ===\n(.*?)\n=== END EMAIL ===", prompt, re.DOTALL)
+            return json.dumps({
+                email_id: self._mock_analysis(block.lower()) for email_id, block in blocks
+            })
+        
         if "Analyze this email" in prompt or "Categorize" in prompt:
             subject_match = re.search(r"Subject: (.*)", prompt)
             body_match = re.search(r"Body: (.*?)(\nReturn a single JSON|\n\nReturn)", prompt, re.DOTALL)
@@ -110,42 +571,7 @@ class LLMService:
             subject_text = subject_match.group(1) if subject_match else ""
             body_text = body_match.group(1) if body_match else ""
             
-            content_lower = (subject_text + " " + body_text).lower()
-            
-            category = "Work: Routine"
-            reasoning = "Mock analysis: Defaulting to routine work."
-            urgency = 3
-            sentiment = "neutral"
-
-            if "urgent" in content_lower or "asap" in content_lower or "due" in content_lower:
-                category = "Work: Important"
-                reasoning = "Mock analysis: Detected urgency keywords."
-                urgency = 9
-                sentiment = "tense"
-            elif "newsletter" in content_lower or "digest" in content_lower:
-                category = "Newsletter"
-                reasoning = "Mock analysis: Appears to be a periodical."
-            elif "invoice" in content_lower or "payment" in content_lower:
-                category = "Finance"
-                reasoning = "Mock analysis: Transactional keywords."
-            elif "flight" in content_lower or "hotel" in content_lower:
-                category = "Travel"
-                reasoning = "Mock analysis: Travel confirmation."
-                sentiment = "happy"
-            elif "lottery" in content_lower or "winner" in content_lower:
-                category = "Spam"
-                reasoning = "Mock analysis: Suspicious keywords."
-                sentiment = "negative"
-
-            return json.dumps({
-                "category": category,
-                "category_reasoning": reasoning,
-                "sentiment": sentiment,
-                "emotion": sentiment,
-                "urgency_score": urgency,
-                "action_items": [],
-                "followups": []
-            })
+            return json.dumps(self._mock_analysis((subject_text + " " + body_text).lower()))
         
         if "Extract action items" in prompt:
             return '[{"description": "Review report", "deadline": "tomorrow"}]'
@@ -157,6 +583,44 @@ class LLMService:
             return '[{"commitment": "Send report", "committed_by": "me", "due_date": "Friday"}]'
 
         return "I am a mock agent. (Reason: No API keys configured)"
+    
+    @staticmethod
+    def _mock_analysis(content_lower: str) -> dict:
+        """Keyword heuristics standing in for a real email analysis."""
+        category = "Work: Routine"
+        reasoning = "Mock analysis: Defaulting to routine work."
+        urgency = 3
+        sentiment = "neutral"
+
+        if "urgent" in content_lower or "asap" in content_lower or "due" in content_lower:
+            category = "Work: Important"
+            reasoning = "Mock analysis: Detected urgency keywords."
+            urgency = 9
+            sentiment = "tense"
+        elif "newsletter" in content_lower or "digest" in content_lower:
+            category = "Newsletter"
+            reasoning = "Mock analysis: Appears to be a periodical."
+        elif "invoice" in content_lower or "payment" in content_lower:
+            category = "Finance"
+            reasoning = "Mock analysis: Transactional keywords."
+        elif "flight" in content_lower or "hotel" in content_lower:
+            category = "Travel"
+            reasoning = "Mock analysis: Travel confirmation."
+            sentiment = "happy"
+        elif "lottery" in content_lower or "winner" in content_lower:
+            category = "Spam"
+            reasoning = "Mock analysis: Suspicious keywords."
+            sentiment = "negative"
+
+        return {
+            "category": category,
+            "category_reasoning": reasoning,
+            "sentiment": sentiment,
+            "emotion": sentiment,
+            "urgency_score": urgency,
+            "action_items": [],
+            "followups": []
+        }
 
 
 llm_service = LLMService()
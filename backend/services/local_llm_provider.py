@@ -0,0 +1,129 @@
+"""
+Local OpenAI-Compatible LLM Provider
+====================================
+Talks to an on-prem server exposing the OpenAI chat completions API
+(llama.cpp server, vLLM, Ollama's /v1, LM Studio, ...), so processing,
+chat and drafts can run without prompts leaving the network.
+
+- Connection pooling: one keep-alive httpx.Client shared by all threads,
+  and one httpx.AsyncClient per event loop (batch runs use asyncio.run),
+  closed when its loop shuts down
+- Errors are raised as httpx.HTTPStatusError (status and Retry-After on
+  .response) or httpx transport errors, which the retry layer understands
+
+Configured from the environment:
+    LOCAL_LLM_BASE_URL      e.g. http://localhost:8080/v1 (enables the provider)
+    LOCAL_LLM_MODEL         model name sent in requests (default "local")
+    LOCAL_LLM_TIMEOUT       read timeout in seconds (default 60)
+    LOCAL_LLM_CONNECT_TIMEOUT  connect timeout in seconds (default 2)
+    LOCAL_LLM_MAX_CONNECTIONS  pool size (default 8)
+    LOCAL_LLM_API_KEY       optional bearer token
+"""
+import json
+import os
+import threading
+from typing import Iterator
+
+import httpx
+
+from backend.services.loop_resources import LoopLocal
+
+
+class LocalLLMProvider:
+    def __init__(self, base_url: str, model: str = "local", timeout: float = 60.0,
+                 connect_timeout: float = 2.0, max_connections: int = 8, api_key: str = None,
+                 temperature: float = 0.7, max_tokens: int = 2048):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_connections)
+        self._headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._async_clients = LoopLocal(
+            lambda: httpx.AsyncClient(base_url=self.base_url, timeout=self._timeout,
+                                      limits=self._limits, headers=self._headers),
+            close=lambda client: client.aclose(),
+        )
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = httpx.Client(base_url=self.base_url, timeout=self._timeout,
+                                                limits=self._limits, headers=self._headers)
+        return self._client
+
+    def _payload(self, prompt: str, json_mode: bool = False, stream: bool = False) -> dict:
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+        }
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    @staticmethod
+    def _content(response: httpx.Response) -> str:
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"] or ""
+
+    def complete(self, prompt: str, json_mode: bool = False, timeout: float = None) -> str:
+        """timeout caps the connect and read waits (e.g. to what is left of the caller's deadline)."""
+        request_timeout = self._timeout
+        if timeout is not None:
+            request_timeout = httpx.Timeout(min(timeout, self._timeout.read),
+                                            connect=min(timeout, self._timeout.connect))
+        response = self.client.post("/chat/completions", json=self._payload(prompt, json_mode),
+                                    timeout=request_timeout)
+        return self._content(response)
+
+    async def acomplete(self, prompt: str, json_mode: bool = False) -> str:
+        client = await self._async_clients.get()  # Pooled connections are bound to the running loop
+        response = await client.post("/chat/completions", json=self._payload(prompt, json_mode))
+        return self._content(response)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield content deltas from the server-sent event stream."""
+        with self.client.stream("POST", "/chat/completions", json=self._payload(prompt, stream=True)) as response:
+            if response.is_error:
+                response.read()
+                response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                choices = json.loads(data).get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+def local_provider_from_env():
+    """LocalLLMProvider from LOCAL_LLM_* variables, or None when LOCAL_LLM_BASE_URL is unset."""
+    base_url = os.getenv("LOCAL_LLM_BASE_URL")
+    if not base_url:
+        return None
+    return LocalLLMProvider(
+        base_url,
+        model=os.getenv("LOCAL_LLM_MODEL", "local"),
+        timeout=float(os.getenv("LOCAL_LLM_TIMEOUT", "60")),
+        connect_timeout=float(os.getenv("LOCAL_LLM_CONNECT_TIMEOUT", "2")),
+        max_connections=int(os.getenv("LOCAL_LLM_MAX_CONNECTIONS", "8")),
+        api_key=os.getenv("LOCAL_LLM_API_KEY"),
+    )
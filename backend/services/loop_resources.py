@@ -0,0 +1,51 @@
+"""
+Per-Event-Loop Resources
+Async SDK clients pool connections that are bound to the event loop that
+opened them, while batch work runs every chunk in its own asyncio.run()
+loop. LoopLocal keeps one resource per running loop and closes it when that
+loop shuts down, so a client is neither reused on a closed loop nor leaked.
+"""
+
+import asyncio
+import inspect
+import threading
+import weakref
+
+
+async def _close_at_shutdown(resource, close):
+    # Finalized by loop.shutdown_asyncgens(), which asyncio.run() calls before closing the loop
+    try:
+        yield
+    finally:
+        result = close(resource)
+        if inspect.isawaitable(result):
+            await result
+
+
+class LoopLocal:
+    def __init__(self, factory, close=None):
+        """factory() builds the resource; close(resource) (sync or async) releases it."""
+        self._factory = factory
+        self._close = close
+        self._resources = weakref.WeakKeyDictionary()  # loop -> (resource, shutdown hook)
+        self._lock = threading.Lock()
+
+    async def get(self):
+        """The resource of the running loop, created on first use."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._resources.get(loop)
+        if entry is not None:
+            return entry[0]
+        resource = self._factory()
+        hook = None
+        if self._close is not None:
+            hook = _close_at_shutdown(resource, self._close)
+            await hook.__anext__()  # Registers the generator with the loop
+        with self._lock:
+            self._resources[loop] = (resource, hook)
+        return resource
+
+    def __len__(self):
+        with self._lock:
+            return len(self._resources)
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from backend.models import Email
 from backend.services.llm_service import llm_service
+from backend.services.ingest_service import prompt_body, prompt_field
 from datetime import datetime, timedelta
 import json
 
@@ -50,10 +51,10 @@ def generate_meeting_brief(db: Session, meeting_id: str):
     
     Based on this email thread, generate a concise meeting preparation brief.
     
-    Email Subject: {email.subject}
-    Sender: {email.sender}
+    Email Subject: {prompt_field(email.subject)}
+    Sender: {prompt_field(email.sender)}
     Body:
-    {email.body}
+    {prompt_body(email)}
     
     Output JSON format:
     {{
@@ -65,7 +66,7 @@ def generate_meeting_brief(db: Session, meeting_id: str):
     """
     
     try:
-        response = llm_service.generate_response(prompt)
+        response = llm_service.generate_text(prompt, json_mode=True, prompt_type="meeting_brief")
         # Clean up potential markdown code blocks
         cleaned_response = response.replace("```json", "").replace("```", "").strip()
         brief = json.loads(cleaned_response)
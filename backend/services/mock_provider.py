@@ -0,0 +1,142 @@
+"""
+Latency- and Fault-Injecting Mock LLM Provider
+==============================================
+Wraps the heuristic mock responses with the behaviour of a real provider,
+so load tests and batch runs can be exercised offline:
+
+- Latency: lognormal with the given median (LLM_MOCK_LATENCY_MS) and
+  shape (LLM_MOCK_LATENCY_SIGMA); 0 ms keeps the mock instant
+- Errors: LLM_MOCK_ERROR_RATE of calls fail with a 5xx MockProviderError
+- Rate limiting: more than LLM_MOCK_RATE_LIMIT_RPM calls in a rolling
+  minute fail fast with a 429 carrying a Retry-After header
+- Output size: LLM_MOCK_OUTPUT_TOKENS pads responses to roughly that many
+  tokens (JSON responses get a padding field so they still parse)
+- Streaming: LLM_MOCK_CHUNK_DELAY_MS between streamed chunks
+- LLM_MOCK_SEED makes latency/error sampling reproducible
+
+Select it with LLM_PROVIDERS=mock (it is also used when no API keys are set).
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Callable, Iterator
+
+_FILLER = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+
+
+class MockProviderError(Exception):
+    """Shaped like provider SDK errors: status_code plus response.headers."""
+
+    def __init__(self, status_code: int, message: str, retry_after: float = None):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+        headers = {"retry-after": f"{retry_after:.3f}"} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class MockProvider:
+    def __init__(self, render: Callable[[str], str], latency_ms: float = 0.0, latency_sigma: float = 0.5,
+                 error_rate: float = 0.0, rate_limit_rpm: int = 0, output_tokens: int = 0,
+                 chunk_delay_ms: float = 0.0, seed: int = None):
+        self.render = render
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rpm = rate_limit_rpm
+        self.output_tokens = output_tokens
+        self.chunk_delay_ms = chunk_delay_ms
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()  # monotonic timestamps of accepted calls in the last minute
+
+    def _admit(self) -> tuple:
+        """
+        Sample this call's outcome: (latency seconds, failed). A call over the
+        rate limit raises a 429 immediately, like a real provider.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.rate_limit_rpm > 0:
+                while self._recent and now - self._recent[0] >= 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rate_limit_rpm:
+                    retry_after = 60 - (now - self._recent[0])
+                    raise MockProviderError(429, "Rate limit reached (mock)", retry_after=retry_after)
+                self._recent.append(now)
+
+            latency = 0.0
+            if self.latency_ms > 0:
+                latency = self._rng.lognormvariate(0.0, self.latency_sigma) * self.latency_ms / 1000
+            failed = self.error_rate > 0 and self._rng.random() < self.error_rate
+        return latency, failed
+
+    def _failure(self) -> MockProviderError:
+        return MockProviderError(503, "Service unavailable (mock)")
+
+    def _output(self, prompt: str) -> str:
+        text = self.render(prompt)
+        if self.output_tokens <= 0:
+            return text
+        missing_chars = self.output_tokens * 4 - len(text)
+        if missing_chars <= 0:
+            return text
+        padding = (_FILLER * (missing_chars // len(_FILLER) + 1))[:missing_chars].strip()
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return f"{text}\n\n{padding}"
+        if isinstance(data, dict):
+            data["_padding"] = padding
+            return json.dumps(data)
+        return text
+
+    def complete(self, prompt: str, timeout: float = None) -> str:
+        latency, failed = self._admit()
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Mock response took longer than {timeout:.2f}s")
+        time.sleep(latency)
+        if failed:
+            raise self._failure()
+        return self._output(prompt)
+
+    async def acomplete(self, prompt: str) -> str:
+        latency, failed = self._admit()
+        await asyncio.sleep(latency)
+        if failed:
+            raise self._failure()
+        return self._output(prompt)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Word-sized chunks; latency applies before the first chunk."""
+        latency, failed = self._admit()
+        time.sleep(latency)
+        if failed:
+            raise self._failure()
+        for i, chunk in enumerate(re.findall(r"\S+\s*|\s+", self._output(prompt))):
+            if i and self.chunk_delay_ms > 0:
+                time.sleep(self.chunk_delay_ms / 1000)
+            yield chunk
+
+
+def mock_provider_from_env(render: Callable[[str], str]) -> MockProvider:
+    """Build the mock provider from LLM_MOCK_* environment variables."""
+    seed = os.getenv("LLM_MOCK_SEED")
+    return MockProvider(
+        render,
+        latency_ms=float(os.getenv("LLM_MOCK_LATENCY_MS", "0")),
+        latency_sigma=float(os.getenv("LLM_MOCK_LATENCY_SIGMA", "0.5")),
+        error_rate=float(os.getenv("LLM_MOCK_ERROR_RATE", "0")),
+        rate_limit_rpm=int(os.getenv("LLM_MOCK_RATE_LIMIT_RPM", "0")),
+        output_tokens=int(os.getenv("LLM_MOCK_OUTPUT_TOKENS", "0")),
+        chunk_delay_ms=float(os.getenv("LLM_MOCK_CHUNK_DELAY_MS", "0")),
+        seed=int(seed) if seed else None,
+    )
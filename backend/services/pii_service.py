@@ -1,26 +1,126 @@
 import re
 
+# One alternation, tried left to right at each position. Every branch is
+# bounded (no nested or unbounded repeats), so matching stays linear even on
+# long digit-heavy bodies such as invoices and logs.
+_CREDIT_CARD = r'\b\d(?:[ -]{0,3}\d){12,18}\b'      # 13-19 digits, up to 3 spaces/dashes between them
+_SSN = r'\b\d{3}-\d{2}-\d{4}\b'
+_PHONE = r'(?:(?:\+|\b)1[-. ]?(?:\(\d{3}\)|\d{3})|\(\d{3}\)|\b\d{3})[-. ]?\d{3}[-. ]?\d{4}\b'
+
+# Every pattern above needs a run of at least 10 of these characters. This
+# class-prefixed regex skips ordinary prose quickly; the full alternation
+# only runs inside the candidate runs it finds.
+_CANDIDATE = re.compile(r'[(+\d][\d ().+-]{9,}')
+
+# Bump when the patterns change so bodies redacted at ingest are recomputed
+REDACTION_VERSION = 3
+
+# Private-use characters delimiting prompt segments that were already
+# redacted at ingest (see mark_redacted); redact() skips and removes them
+PRE_REDACTED_START = "\uE000"
+PRE_REDACTED_END = "\uE001"
+_PRE_REDACTED = re.compile("\uE000([^\uE000\uE001]*)\uE001")
+_MARKERS = str.maketrans("", "", PRE_REDACTED_START + PRE_REDACTED_END)
+
+# Luhn doubles every second digit from the right; the digit sum of 2*d is a single digit
+_LUHN_DOUBLED = str.maketrans("0123456789", "0246813579")
+_SEPARATORS = str.maketrans("", "", " -")
+_DIGIT_GROUP = re.compile(r'\d+')
+
+
+def luhn_valid(digits: str) -> bool:
+    """Luhn checksum, used to tell card numbers from other long digit runs."""
+    total = sum(map(int, digits[-1::-2])) + sum(map(int, digits[-2::-2].translate(_LUHN_DOUBLED)))
+    return total % 10 == 0
+
+
+def _card_span(value: str):
+    """
+    (start, end) of a Luhn-valid 13-19 digit card inside a card-shaped digit
+    run that also caught neighbouring digits ("4111 1111 1111 1111 123"), or
+    None. Cards start or end the run and end at a separator.
+    """
+    groups = [m.span() for m in _DIGIT_GROUP.finditer(value)]
+    windows = [(0, j) for j in range(len(groups) - 1, -1, -1)]   # Longest prefix first
+    windows += [(i, len(groups) - 1) for i in range(1, len(groups))]  # then longest suffix
+    for i, j in windows:
+        start, end = groups[i][0], groups[j][1]
+        digits = value[start:end].translate(_SEPARATORS)
+        if 13 <= len(digits) <= 19 and luhn_valid(digits):
+            return start, end
+    return None
+
+
 class PIIService:
     def __init__(self):
-        # Regex patterns for sensitive data
+        # Patterns for sensitive data, in priority order.
+        # We explicitly DO NOT redact email addresses as they are crucial for the agent's context
         self.patterns = {
-            'CREDIT_CARD': r'\b(?:\d[ -]*?){13,16}\b',
-            'SSN': r'\b\d{3}-\d{2}-\d{4}\b',
-            'PHONE': r'\b(?:\+?1[-.]?)?\s*\(?([0-9]{3})\)?[-. ]?([0-9]{3})[-. ]?([0-9]{4})\b',
-            # We explicitly DO NOT redact email addresses as they are crucial for the agent's context
+            'CREDIT_CARD': _CREDIT_CARD,
+            'SSN': _SSN,
+            'PHONE': _PHONE,
         }
+        # The lookahead rejects positions that cannot start any pattern before trying the branches
+        self._scanner = re.compile("(?=[(+\\d])(?:" + "|".join(
+            f"(?P<{label}>{pattern})" for label, pattern in self.patterns.items()) + ")")
+        # Rescans a digit run that looked like a card but failed the Luhn check
+        self._non_card = re.compile(f"(?P<SSN>{_SSN})|(?P<PHONE>{_PHONE})")
+
+    def _replace(self, match: re.Match) -> str:
+        label = match.lastgroup
+        if label == 'CREDIT_CARD':
+            value = match.group()
+            if not luhn_valid(value.translate(_SEPARATORS)):
+                span = _card_span(value)
+                if span is None:
+                    return self._non_card.sub(self._replace, value)
+                start, end = span
+                return (self._non_card.sub(self._replace, value[:start]) + '[REDACTED_CREDIT_CARD]'
+                        + self._non_card.sub(self._replace, value[end:]))
+        return f'[REDACTED_{label}]'
 
     def redact(self, text: str) -> str:
         """
-        Redacts sensitive information from the text.
+        Redacts sensitive information from the text in a single pass.
+        Segments wrapped by mark_redacted() were redacted at ingest and are
+        passed through unscanned; the markers are removed.
         """
         if not text:
             return ""
+        if PRE_REDACTED_START not in text:
+            return self._redact(text).translate(_MARKERS) if PRE_REDACTED_END in text else self._redact(text)
+        parts = []
+        last = 0
+        for segment in _PRE_REDACTED.finditer(text):
+            parts.append(self._redact(text[last:segment.start()]))
+            parts.append(segment.group(1))
+            last = segment.end()
+        parts.append(self._redact(text[last:]))
+        return "".join(parts).translate(_MARKERS)
+
+    def _redact(self, text: str) -> str:
+        parts = []
+        last = 0
+        for candidate in _CANDIDATE.finditer(text):
+            # endpos includes the character after the run so trailing \b checks see it
+            start, end = candidate.start(), candidate.end() + 1
+            for match in self._scanner.finditer(text, start, end):
+                parts.append(text[last:match.start()])
+                parts.append(self._replace(match))
+                last = match.end()
+        if not parts:
+            return text
+        parts.append(text[last:])
+        return "".join(parts)
+
+    @staticmethod
+    def mark_redacted(text: str) -> str:
+        """Wrap text that is already redacted so redact() does not rescan it."""
+        return f"{PRE_REDACTED_START}{text.translate(_MARKERS)}{PRE_REDACTED_END}"
 
-        redacted_text = text
-        for label, pattern in self.patterns.items():
-            redacted_text = re.sub(pattern, f'[REDACTED_{label}]', redacted_text)
-        
-        return redacted_text
+    @staticmethod
+    def strip_markers(text: str) -> str:
+        """Remove pre-redaction markers from untrusted text (e.g. user input) so it is always scanned."""
+        return text.translate(_MARKERS) if text else text
 
 pii_service = PIIService()
@@ -0,0 +1,159 @@
+"""
+Per-Email Processing Policy
+===========================
+Decides, from the local classifier and dark-pattern results, how much work
+an email deserves before any LLM call is made:
+
+- "skip":  bulk mail the classifier is sure about (Spam / Promotions /
+           Newsletter at >= PROCESSING_SKIP_CONFIDENCE); defaults only
+- "rules": bulk mail at >= PROCESSING_RULES_CONFIDENCE, and high-severity
+           dark-pattern mail; handled by the regex extractor
+- "llm":   everything else gets the full extraction prompt
+
+Configured from the environment:
+    PROCESSING_POLICY                    false sends every email to the LLM
+    PROCESSING_SKIP_CATEGORIES           default "Spam,Promotions,Newsletter"
+    PROCESSING_SKIP_CONFIDENCE           default 0.95
+    PROCESSING_RULES_CATEGORIES          default "Spam,Promotions,Newsletter,Social"
+    PROCESSING_RULES_CONFIDENCE          default 0.80
+"""
+import os
+import re
+
+SKIP = "skip"
+RULES = "rules"
+LLM = "llm"
+
+# Baseline urgency for mail handled without the LLM
+_CATEGORY_URGENCY = {
+    "Spam": 1,
+    "Promotions": 2,
+    "Newsletter": 2,
+    "Social": 2,
+    "Work: Routine": 3,
+}
+
+_DEADLINE = re.compile(
+    r"\b(?:by|before|due(?: on| by)?|until|no later than|deadline(?: is|:)?)\s+"
+    r"(?:today|tonight|tomorrow|eod|end of (?:day|week|month)|this week|next week"
+    r"|(?:mon|tues|wednes|thurs|fri|satur|sun)day"
+    r"|(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.? \d{1,2}(?:st|nd|rd|th)?"
+    r"|\d{1,2}/\d{1,2}(?:/\d{2,4})?"
+    r"|\d{1,2}(?::\d{2})? ?(?:am|pm))\b",
+    re.IGNORECASE,
+)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Explicit requests in routine mail ("Please submit your timesheet by Friday.")
+_REQUEST = re.compile(
+    r"(?:^|[.!?]\s+)((?:please|kindly|action required:?|reminder:?)\s+"
+    r"(?:submit|complete|review|confirm|approve|sign|update|register|rsvp|reply|respond|renew|verify|pay|read)\b[^.!?\n]{0,120})",
+    re.IGNORECASE,
+)
+
+
+def _csv(value: str) -> set:
+    return {item.strip() for item in value.split(",") if item.strip()}
+
+
+class ProcessingPolicy:
+    def __init__(self, enabled: bool = True,
+                 skip_categories=("Spam", "Promotions", "Newsletter"), skip_confidence: float = 0.95,
+                 rules_categories=("Spam", "Promotions", "Newsletter", "Social"),
+                 rules_confidence: float = 0.80):
+        self.enabled = enabled
+        self.skip_categories = set(skip_categories)
+        self.skip_confidence = skip_confidence
+        self.rules_categories = set(rules_categories)
+        self.rules_confidence = rules_confidence
+
+    def decide(self, category: str, confidence: float, has_dark_patterns: bool = False,
+               dark_pattern_severity: str = "low") -> str:
+        """Return SKIP, RULES or LLM for one email."""
+        if not self.enabled:
+            return LLM
+        confidence = confidence or 0.0
+        if category in self.skip_categories and confidence >= self.skip_confidence:
+            return SKIP
+        if category in self.rules_categories and confidence >= self.rules_confidence:
+            return RULES
+        # Manipulative bulk mail: worth flagging, not worth an extraction prompt
+        if has_dark_patterns and dark_pattern_severity == "high" and category in self.rules_categories:
+            return RULES
+        return LLM
+
+
+def lead_summary(text: str, limit: int = 200) -> str:
+    """Leading sentences of the text, up to `limit` characters (cut at a word if the first is longer)."""
+    text = " ".join((text or "").split())
+    if len(text) <= limit:
+        return text
+    summary = ""
+    for sentence in _SENTENCE_END.split(text):
+        if len(summary) + len(sentence) + 1 > limit:
+            break
+        summary = f"{summary} {sentence}" if summary else sentence
+    return summary or text[:limit].rsplit(" ", 1)[0] + "…"
+
+
+def extract_with_rules(subject: str, body: str, category: str) -> dict:
+    """
+    Regex stand-in for the LLM extraction prompt, returning the same shape
+    (urgency_score, sentiment, deadline, action_items, followups, summary,
+    key_facts).
+    """
+    text = f"{subject or ''}\n{body or ''}"
+    urgency = _CATEGORY_URGENCY.get(category, 3)
+
+    deadline = {"has_deadline": False, "deadline_text": None, "deadline_iso": None}
+    match = _DEADLINE.search(text)
+    if match:
+        deadline.update(has_deadline=True, deadline_text=match.group(0))
+
+    action_items = []
+    if category != "Spam":
+        for request in _REQUEST.findall(text)[:3]:
+            description = " ".join(request.split()).rstrip(" ,;:")
+            action_items.append({"description": description, "deadline": deadline["deadline_text"]})
+    if action_items:
+        urgency += 2 if deadline["has_deadline"] else 1
+
+    key_facts = [item["description"] for item in action_items]
+    if deadline["has_deadline"] and not key_facts:
+        key_facts.append(f"Deadline: {deadline['deadline_text']}")
+
+    return {
+        "urgency_score": min(urgency, 10),
+        "sentiment": "neutral",
+        "deadline": deadline,
+        "action_items": action_items,
+        "followups": [],
+        "summary": lead_summary(body),
+        "key_facts": key_facts[:3],
+    }
+
+
+def skipped_extraction(category: str) -> dict:
+    """Defaults recorded for emails that get no extraction at all."""
+    return {
+        "urgency_score": _CATEGORY_URGENCY.get(category, 1),
+        "sentiment": "neutral",
+        "action_items": [],
+        "followups": [],
+    }
+
+
+def policy_from_env() -> ProcessingPolicy:
+    """Build the policy from PROCESSING_* environment variables."""
+    return ProcessingPolicy(
+        enabled=os.getenv("PROCESSING_POLICY", "true").lower() in ("1", "true", "yes"),
+        skip_categories=_csv(os.getenv("PROCESSING_SKIP_CATEGORIES", "Spam,Promotions,Newsletter")),
+        skip_confidence=float(os.getenv("PROCESSING_SKIP_CONFIDENCE", "0.95")),
+        rules_categories=_csv(os.getenv("PROCESSING_RULES_CATEGORIES",
+                                        "Spam,Promotions,Newsletter,Social")),
+        rules_confidence=float(os.getenv("PROCESSING_RULES_CONFIDENCE", "0.80")),
+    )
+
+
+processing_policy = policy_from_env()
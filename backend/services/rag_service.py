@@ -11,6 +11,7 @@ import numpy as np
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 from backend.logger import get_logger
+from backend.services.ingest_service import plain_body
 
 logger = get_logger(__name__)
 
@@ -214,7 +215,7 @@ class RAGService:
         
         try:
             # Create rich content for embedding
-            content = f"From: {email.sender}\nSubject: {email.subject}\n\n{email.body}"
+            content = f"From: {email.sender}\nSubject: {email.subject}\n\n{plain_body(email)}"
             embedding = self.generate_embedding(content)
             
             # Rich metadata for filtering and context
@@ -223,7 +224,7 @@ class RAGService:
                 "subject": email.subject or "",
                 "timestamp": str(email.timestamp) if email.timestamp else "",
                 "category": email.category or "General",
-                "body_snippet": (email.body or "")[:500],
+                "body_snippet": plain_body(email)[:500],
                 "is_read": email.is_read if hasattr(email, 'is_read') else False,
                 "urgency": email.urgency_score if hasattr(email, 'urgency_score') else 5,
             }
@@ -256,7 +257,7 @@ class RAGService:
         
         for email in emails:
             try:
-                content = f"From: {email.sender}\nSubject: {email.subject}\n\n{email.body}"
+                content = f"From: {email.sender}\nSubject: {email.subject}\n\n{plain_body(email)}"
                 embedding = self.generate_embedding(content)
                 
                 metadata = {
@@ -264,7 +265,7 @@ class RAGService:
                     "subject": email.subject or "",
                     "timestamp": str(email.timestamp) if email.timestamp else "",
                     "category": email.category or "General",
-                    "body_snippet": (email.body or "")[:500],
+                    "body_snippet": plain_body(email)[:500],
                 }
                 
                 vectors.append({
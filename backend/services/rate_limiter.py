@@ -0,0 +1,104 @@
+"""
+Token-Bucket Rate Limiting for LLM Providers
+============================================
+Each provider gets two buckets: requests/minute and tokens/minute.
+Buckets hand out *reservations*: a caller deducts what it needs up front
+and is told how long to wait until its share has refilled, so concurrent
+callers are spaced out instead of retrying in a burst.
+
+Limits come from the environment (0 disables a bucket):
+    GROQ_RPM / GROQ_TPM, GEMINI_RPM / GEMINI_TPM, LOCAL_RPM / LOCAL_TPM, MOCK_RPM / MOCK_TPM
+"""
+import asyncio
+import os
+import threading
+import time
+
+# Free-tier defaults; raise them to match a paid quota
+DEFAULT_LIMITS = {
+    "groq": {"rpm": 30, "tpm": 12000},
+    "gemini": {"rpm": 30, "tpm": 1000000},
+    "local": {"rpm": 0, "tpm": 0},   # Bounded by LLM_MAX_CONCURRENCY / the server itself
+    "mock": {"rpm": 0, "tpm": 0},
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)."""
+    return len(text or "") // 4 + 1
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def reserve(self, amount: float = 1) -> float:
+        """Deduct `amount` and return the seconds to wait before using it."""
+        if self.unlimited:
+            return 0.0
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class ProviderRateLimiter:
+    """Requests/minute + tokens/minute limits for one provider."""
+
+    def __init__(self, rpm: float = 0, tpm: float = 0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.waits = 0
+        self.waited_seconds = 0.0
+
+    def reserve(self, tokens: int) -> float:
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if wait > 0:
+            self.waits += 1
+            self.waited_seconds += wait
+        return wait
+
+    def acquire(self, tokens: int):
+        """Block the calling thread until the request may be sent."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int):
+        """Suspend the calling coroutine until the request may be sent."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict:
+        return {
+            "rpm": self.requests.rate * 60,
+            "tpm": self.tokens.rate * 60,
+            "waits": self.waits,
+            "waited_seconds": round(self.waited_seconds, 2),
+        }
+
+
+def limiter_for(provider: str) -> ProviderRateLimiter:
+    """Build a limiter for `provider` from <PROVIDER>_RPM / <PROVIDER>_TPM."""
+    defaults = DEFAULT_LIMITS.get(provider, {"rpm": 0, "tpm": 0})
+    prefix = provider.upper()
+    return ProviderRateLimiter(
+        rpm=float(os.getenv(f"{prefix}_RPM", defaults["rpm"])),
+        tpm=float(os.getenv(f"{prefix}_TPM", defaults["tpm"])),
+    )
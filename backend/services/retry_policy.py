@@ -0,0 +1,159 @@
+"""
+Retry Policy for LLM Calls
+==========================
+Transient provider failures (429, 408, 5xx, timeouts, dropped connections)
+are retried with exponential backoff and full jitter instead of failing the
+call outright:
+
+- Delay before retry n: uniform(0, min(max_delay, base_delay * 2**n)), but
+  never shorter than the provider's Retry-After
+- Deadline: no retry is scheduled that would end past the call's deadline
+  (LLM_CALL_DEADLINE_S, measured from the first attempt)
+- Budget: retries may add at most LLM_RETRY_BUDGET_RATIO extra load on top
+  of first attempts over a rolling window (plus a small floor), so an outage
+  does not turn every request into several
+
+Configured from the environment:
+    LLM_RETRY_MAX_ATTEMPTS, LLM_RETRY_BASE_DELAY_S, LLM_RETRY_MAX_DELAY_S,
+    LLM_CALL_DEADLINE_S, LLM_RETRY_BUDGET_RATIO, LLM_RETRY_BUDGET_MIN
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+TRANSIENT_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+
+def status_code_of(exc: Exception):
+    """HTTP status of a provider SDK error (Groq/OpenAI: status_code, Google: code)."""
+    for attr in ("status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_transient(exc: Exception) -> bool:
+    """Whether retrying the same request could succeed."""
+    status = status_code_of(exc)
+    if status is not None:
+        return status in TRANSIENT_STATUS_CODES
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    # SDK/httpx transport errors without a status (APIConnectionError, ConnectError, ReadTimeout, ...)
+    name = type(exc).__name__
+    return "Timeout" in name or "Connect" in name
+
+
+def retry_after_seconds(exc: Exception):
+    """Seconds the provider asked us to wait, from retry_after or a Retry-After header."""
+    value = getattr(exc, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+        try:
+            value = headers.get("retry-after") or headers.get("Retry-After")
+        except AttributeError:
+            value = None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """Caps retries at `ratio` of first attempts over a rolling window (plus `minimum`)."""
+
+    def __init__(self, ratio: float = 0.2, minimum: int = 10, window_seconds: float = 60.0):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window_seconds
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] >= self.window:
+                events.popleft()
+
+    def record_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        """Reserve one retry; False when the budget is exhausted."""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) >= self.minimum + self.ratio * len(self._requests):
+                return False
+            self._retries.append(now)
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._trim(time.monotonic())
+            return {"requests": len(self._requests), "retries": len(self._retries)}
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 20.0,
+                 deadline: float = 60.0, budget: RetryBudget = None, seed: int = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.budget = budget or RetryBudget()
+        self._rng = random.Random(seed)
+
+    def backoff(self, retry: int) -> float:
+        """Full-jitter delay before retry number `retry` (0-based)."""
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    def next_delay(self, attempt: int, errors: list, deadline_at: float):
+        """
+        Seconds to wait before attempt number `attempt + 1`, or None to give up.
+        `errors` are the exceptions from the attempt that just failed (one per
+        provider tried); at least one of them must be transient.
+        """
+        transient = [e for e in errors if is_transient(e)]
+        if attempt >= self.max_attempts or not transient:
+            return None
+        delay = self.backoff(attempt - 1)
+        hints = [h for h in (retry_after_seconds(e) for e in transient) if h is not None]
+        if hints:
+            # Any provider that asked for a wait is ready after the shortest one
+            delay = max(delay, min(hints))
+        if time.monotonic() + delay >= deadline_at:
+            return None
+        if not self.budget.try_spend():
+            return None
+        return delay
+
+
+def retry_policy_from_env() -> RetryPolicy:
+    """Build the retry policy from LLM_RETRY_* / LLM_CALL_DEADLINE_S."""
+    budget = RetryBudget(
+        ratio=float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.2")),
+        minimum=int(os.getenv("LLM_RETRY_BUDGET_MIN", "10")),
+    )
+    return RetryPolicy(
+        max_attempts=int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3")),
+        base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY_S", "0.5")),
+        max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY_S", "20")),
+        deadline=float(os.getenv("LLM_CALL_DEADLINE_S", "60")),
+        budget=budget,
+    )
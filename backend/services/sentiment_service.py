@@ -24,7 +24,7 @@ Provide a JSON response with:
 Respond ONLY with valid JSON, no other text."""
 
     try:
-        response = llm_service.generate_text(prompt)
+        response = llm_service.generate_text(prompt, prompt_type="sentiment")
         # Try to extract JSON from response
         import json
         import re
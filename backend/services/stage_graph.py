@@ -0,0 +1,65 @@
+"""
+Stage Graph
+Runs the steps of email processing as a small dependency graph so
+independent stages overlap: the CPU-local classifier and dark-pattern scan
+run in worker threads while the event loop keeps network-bound LLM calls
+(of this email or of others in the same batch) in flight.
+
+Stages only compute values; they never touch the database session, so the
+caller applies every result in one transaction afterwards.
+"""
+
+import asyncio
+import inspect
+import time
+
+
+class StageGraph:
+    def __init__(self):
+        self._stages = {}
+        self._tasks = {}
+        self.results = {}
+        self.timings = {}  # name -> (offset from graph start, duration) in seconds
+
+    def add(self, name: str, fn, after: tuple = (), blocking: bool = True):
+        """
+        Register a stage. fn(results) receives the results of earlier stages;
+        a coroutine function is awaited, a plain function runs in a worker
+        thread (blocking=True) or inline on the event loop (cheap steps).
+        The stage starts once every stage in `after` has finished.
+        """
+        self._stages[name] = (fn, tuple(after), blocking)
+        return self
+
+    def cancel(self, name: str):
+        """Stop a stage whose result is no longer needed; its result becomes None."""
+        task = self._tasks.get(name)
+        if task and not task.done():
+            task.cancel()
+
+    async def run(self, started: float = None) -> dict:
+        """Run every stage; timing offsets are relative to `started` (perf_counter), default now."""
+        started = time.perf_counter() if started is None else started
+
+        async def run_stage(name, fn, after, blocking):
+            stage_started = value = None
+            try:
+                for dependency in after:
+                    await asyncio.shield(self._tasks[dependency])
+                stage_started = time.perf_counter()
+                if inspect.iscoroutinefunction(fn):
+                    value = await fn(self.results)
+                elif blocking:
+                    value = await asyncio.to_thread(fn, self.results)
+                else:
+                    value = fn(self.results)
+            except asyncio.CancelledError:
+                pass  # Cancelled via cancel(); dependents see None
+            self.results[name] = value
+            if stage_started is not None:
+                self.timings[name] = (stage_started - started, time.perf_counter() - stage_started)
+
+        for name, (fn, after, blocking) in self._stages.items():
+            self._tasks[name] = asyncio.ensure_future(run_stage(name, fn, after, blocking))
+        await asyncio.gather(*self._tasks.values())
+        return self.results
@@ -1,3 +1,4 @@
+import os
 import pytest
 from unittest.mock import patch
 from fastapi.testclient import TestClient
@@ -5,6 +6,9 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+# Jobs are run explicitly with job_queue.run_once(); no worker threads against the on-disk DB
+os.environ["JOB_WORKERS"] = "0"
+
 from backend.main import app
 from backend.database import Base, get_db
 
@@ -0,0 +1,283 @@
+import asyncio
+import time
+from datetime import datetime
+import json
+from types import SimpleNamespace
+
+from backend.models import ActionItem, Email, FollowUp, StageTiming
+from backend.services import agent_service
+from backend.services.llm_service import llm_service
+from backend.services.processing_policy import LLM, RULES, SKIP, ProcessingPolicy, extract_with_rules, lead_summary
+
+
+def _email(email_id, body="Short body"):
+    return SimpleNamespace(id=email_id, subject="Subject", sender="a@example.com", body=body)
+
+
+def test_plan_extraction_batches_respects_budget_and_size():
+    emails = [_email(str(i)) for i in range(7)] + [_email("big", body="x" * 40000)]
+    batches = agent_service.plan_extraction_batches(emails, token_budget=2000, max_emails=3)
+
+    assert [[e.id for e in b] for b in batches] == [["0", "1", "2"], ["3", "4", "5"], ["6"], ["big"]]
+
+
+def test_parse_batch_results_recovers_per_email():
+    ids = ["e1", "e2", "e3"]
+    good = json.dumps({"results": {"e1": {"urgency_score": 7}, "e2": {"urgency_score": 2}}})
+    assert agent_service.parse_batch_results(good, ids) == {
+        "e1": {"urgency_score": 7}, "e2": {"urgency_score": 2},
+    }
+
+    as_list = '```json\n[{"id": "e3", "urgency_score": 4}, {"id": "other"}]\n```'
+    assert agent_service.parse_batch_results(as_list, ids) == {"e3": {"id": "e3", "urgency_score": 4}}
+
+    # Truncated response: complete objects are still recovered
+    truncated = '{"e1": {"urgency_score": 7, "action_items": []}, "e2": {"urgency_sc'
+    assert agent_service.parse_batch_results(truncated, ids) == {
+        "e1": {"urgency_score": 7, "action_items": []},
+    }
+
+
+def test_batched_processing_falls_back_only_for_missing_results(db_session, monkeypatch):
+    for i in range(3):
+        db_session.add(Email(id=f"e{i}", subject=f"Subject {i}", sender="a@example.com", body="Please review"))
+    db_session.commit()
+
+    prompts = []
+
+    async def fake_agenerate(self, prompt, json_mode=False, use_cache=True, prompt_type="general"):
+        prompts.append(prompt)
+        if "Analyze each of the following emails" in prompt:
+            return json.dumps({
+                "e0": {"urgency_score": 8, "action_items": [{"description": "Review"}]},
+                "e1": "not an object",
+            })
+        return json.dumps({"urgency_score": 3})
+
+    monkeypatch.setattr(type(llm_service), "agenerate_text", fake_agenerate)
+    asyncio.run(agent_service.process_emails_batched_async(db_session, ["e0", "e1", "e2"]))
+
+    # One batched call plus single-email fallbacks for e1 and e2
+    assert len(prompts) == 3
+    assert sum("Analyze this email" in p for p in prompts) == 2
+    urgency = {e.id: e.urgency_score for e in db_session.query(Email).all()}
+    assert urgency == {"e0": 8, "e1": 3, "e2": 3}
+    assert db_session.query(ActionItem).filter(ActionItem.email_id == "e0").count() == 1
+
+
+def test_processing_policy_tiers():
+    policy = ProcessingPolicy()
+    assert policy.decide("Newsletter", 0.97) == SKIP
+    assert policy.decide("Newsletter", 0.85) == RULES
+    assert policy.decide("Social", 0.97) == RULES
+    assert policy.decide("Work: Routine", 0.97) == LLM  # Only bulk mail is handled without the LLM
+    assert policy.decide("Work: Important", 0.99) == LLM
+    assert policy.decide("Promotions", 0.5) == LLM
+    assert policy.decide("Promotions", 0.5, has_dark_patterns=True, dark_pattern_severity="high") == RULES
+    assert ProcessingPolicy(enabled=False).decide("Spam", 1.0) == LLM
+
+
+def test_rule_based_extraction():
+    data = extract_with_rules("Timesheet reminder", "Hi all. Please submit your timesheet by Friday. Thanks!",
+                              "Work: Routine")
+    assert data["deadline"]["deadline_text"] == "by Friday"
+    assert data["action_items"] == [{"description": "Please submit your timesheet by Friday", "deadline": "by Friday"}]
+    assert data["urgency_score"] == 5
+
+    promo = extract_with_rules("50% off", "Our biggest sale ever. Shop now!", "Promotions")
+    assert promo["action_items"] == [] and promo["urgency_score"] == 2
+
+
+def test_process_email_skips_llm_for_confident_bulk_mail(db_session, monkeypatch):
+    db_session.add(Email(id="n1", subject="Tech Weekly", sender="news@example.com", body="Top stories this week"))
+    db_session.commit()
+    monkeypatch.setattr(agent_service, "predict_category", lambda *args: ("Newsletter", 0.98))
+    calls = []
+    monkeypatch.setattr(type(llm_service), "generate_text", lambda *args, **kwargs: calls.append(args) or "{}")
+
+    email = agent_service.process_email(db_session, "n1")
+    assert calls == []
+    assert (email.processing_tier, email.category, email.urgency_score) == (SKIP, "Newsletter", 2)
+
+    # A deadline stored by an earlier run doesn't survive a run that finds none
+    email.deadline_text, email.deadline_datetime = "by Friday", datetime(2026, 1, 2)
+    db_session.commit()
+    email = agent_service.process_email(db_session, "n1", force=True)
+    assert (email.deadline_text, email.deadline_datetime) == (None, None)
+
+
+def test_reprocessing_is_skipped_until_content_or_pipeline_changes(db_session, monkeypatch):
+    db_session.add(Email(id="r1", subject="Budget", sender="cfo@example.com", body="Please send the budget"))
+    db_session.commit()
+    monkeypatch.setattr(agent_service, "predict_category", lambda *args: ("Work: Important", 0.9))
+    calls = []
+    extraction = json.dumps({"urgency_score": 7, "action_items": [{"description": "Send budget"}, {"description": "Book room"}],
+                             "followups": [{"commitment": "Share numbers", "committed_by": "me"}]})
+    monkeypatch.setattr(type(llm_service), "generate_text",
+                        lambda *args, **kwargs: calls.append(kwargs["use_cache"]) or extraction)
+
+    assert agent_service.process_email(db_session, "r1") is not None
+    assert agent_service.process_email(db_session, "r1") is None
+    assert len(calls) == 1 and agent_service.stale_email_ids(db_session) == []
+
+    # Forced reprocessing replaces pending items and keeps ones the user moved on
+    db_session.query(ActionItem).filter(ActionItem.description == "Send budget").one().status = "completed"
+    db_session.commit()
+    agent_service.process_email(db_session, "r1", force=True)
+    items = sorted((a.description, a.status) for a in db_session.query(ActionItem))
+    assert items == [("Book room", "pending"), ("Send budget", "completed")]
+    assert db_session.query(FollowUp).count() == 1
+    assert calls == [True, False]  # Forced reprocessing bypasses the LLM cache
+
+    # Edited content or a newer pipeline makes the email stale again
+    db_session.get(Email, "r1").body = "Please send the revised budget"
+    db_session.commit()
+    assert agent_service.stale_email_ids(db_session) == ["r1"]
+    agent_service.process_email(db_session, "r1")
+    monkeypatch.setattr(agent_service, "PIPELINE_VERSION", agent_service.PIPELINE_VERSION + 1)
+    assert agent_service.stale_email_ids(db_session) == ["r1"]
+    assert len(calls) == 3
+
+
+def test_reprocessing_keeps_a_category_set_by_the_user(db_session, monkeypatch):
+    db_session.add(Email(id="u1", subject="Invoice 42", sender="billing@example.com", body="Amount due: $40",
+                         category="Finance", category_source="user", confidence_score=0.4))
+    db_session.add(Email(id="u2", subject="Invoice 43", sender="billing@example.com", body="Amount due: $50",
+                         category="Finance", category_source="classifier"))
+    db_session.commit()
+    monkeypatch.setattr(agent_service, "predict_category", lambda *args: ("Newsletter", 0.98))
+
+    for email_id in ("u1", "u2"):
+        agent_service.process_email(db_session, email_id, force=True)
+    corrected, predicted = db_session.get(Email, "u1"), db_session.get(Email, "u2")
+    assert (corrected.category, corrected.category_source, corrected.confidence_score) == ("Finance", "user", 0.4)
+    assert corrected.processing_tier == LLM  # Routed by the user's label, not the classifier's
+    assert (predicted.category, predicted.processing_tier) == ("Newsletter", SKIP)
+
+
+def _slow(seconds, value):
+    def fn(*args, **kwargs):
+        time.sleep(seconds)
+        return value
+    return fn
+
+
+def _end(timing) -> float:
+    """When a stage finished; stored offsets and durations are rounded to 0.1ms, hence the slack in comparisons."""
+    return timing.offset_seconds + timing.seconds
+
+
+def test_process_email_runs_stages_as_a_graph_and_commits_once(db_session, monkeypatch):
+    db_session.add(Email(id="g1", subject="Contract", sender="legal@example.com", body="Please sign by Friday"))
+    db_session.commit()
+    monkeypatch.setattr(agent_service, "predict_category", _slow(0.2, ("Work: Important", 0.9)))
+    monkeypatch.setattr(type(llm_service), "generate_text", _slow(0.2, json.dumps({"urgency_score": 8})))
+    commits = []
+    real_commit = db_session.commit
+    monkeypatch.setattr(db_session, "commit", lambda: commits.append(1) or real_commit())
+
+    # Default: the LLM call waits for the processing-policy decision
+    email = agent_service.process_email(db_session, "g1")
+    timings = {t.stage: t for t in db_session.query(StageTiming).filter(StageTiming.email_id == "g1")}
+    assert set(timings) == {"classify", "dark_patterns", "route", "rules", "extract"}
+    assert timings["extract"].offset_seconds >= _end(timings["classify"]) - 0.001
+    assert email.urgency_score == 8
+    assert len(commits) == 1
+
+    # The blocking path never speculates: a call in a worker thread can't be cancelled
+    monkeypatch.setattr(agent_service, "SPECULATIVE_EXTRACTION", True)
+    agent_service.process_email(db_session, "g1", force=True)
+    timings = {t.stage: t for t in db_session.query(StageTiming).filter(StageTiming.email_id == "g1")}
+    assert timings["extract"].offset_seconds >= _end(timings["classify"]) - 0.001
+
+    # Speculative (async): the extraction starts before the classifier ends; old timings are replaced
+    async def slow_agenerate(*args, **kwargs):
+        await asyncio.sleep(0.2)
+        return json.dumps({"urgency_score": 7})
+
+    monkeypatch.setattr(type(llm_service), "agenerate_text", slow_agenerate)
+    email = asyncio.run(agent_service.process_email_async(db_session, "g1", force=True))
+    timings = {t.stage: t for t in db_session.query(StageTiming).filter(StageTiming.email_id == "g1")}
+    assert timings["extract"].offset_seconds < _end(timings["classify"])
+    assert email.urgency_score == 7
+
+
+def test_speculative_extraction_is_dropped_when_policy_skips_llm(db_session, monkeypatch):
+    db_session.add(Email(id="g2", subject="Tech Weekly", sender="news@example.com", body="Top stories"))
+    db_session.commit()
+    monkeypatch.setattr(agent_service, "SPECULATIVE_EXTRACTION", True)
+    monkeypatch.setattr(agent_service, "predict_category", _slow(0.05, ("Newsletter", 0.99)))
+
+    cancelled = []
+
+    async def slow_agenerate(*args, **kwargs):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return json.dumps({"urgency_score": 9})
+
+    monkeypatch.setattr(type(llm_service), "agenerate_text", slow_agenerate)
+    email = asyncio.run(agent_service.process_email_async(db_session, "g2"))
+    assert cancelled == [True]
+    assert (email.processing_tier, email.urgency_score) == (SKIP, 2)
+
+
+def test_processing_stores_summary_and_key_facts(db_session, monkeypatch):
+    db_session.add(Email(id="s1", subject="Q3 budget", sender="cfo@example.com", body="Long thread about the budget. " * 20))
+    db_session.add(Email(id="s2", subject="Timesheets", sender="hr@example.com",
+                         body="Hi all. Please submit your timesheet by Friday. Thanks!"))
+    db_session.commit()
+    monkeypatch.setattr(agent_service, "predict_category", lambda subject, *args: (
+        ("Work: Important", 0.9) if subject == "Q3 budget" else ("Social", 0.95)))
+    extraction = {"urgency_score": 6, "summary": "CFO  asks to cut the Q3 budget by 10%.",
+                  "key_facts": ["Cut: 10%", "Due: Oct 1", "Owner: finance", "extra"]}
+    monkeypatch.setattr(type(llm_service), "generate_text", lambda *args, **kwargs: json.dumps(extraction))
+
+    llm = agent_service.process_email(db_session, "s1")
+    assert llm.summary == "CFO asks to cut the Q3 budget by 10%."
+    assert llm.key_facts == ["Cut: 10%", "Due: Oct 1", "Owner: finance"]
+
+    rules = agent_service.process_email(db_session, "s2")
+    assert rules.processing_tier == RULES
+    assert rules.summary == "Hi all. Please submit your timesheet by Friday. Thanks!"
+    assert rules.key_facts == ["Please submit your timesheet by Friday"]
+
+
+def test_lead_summary_keeps_whole_sentences():
+    assert lead_summary("One.  Two!\nThree?", limit=10) == "One. Two!"
+    assert lead_summary("word " * 100, limit=20) == "word word word word…"
+    assert lead_summary(None) == ""
+
+
+def test_chat_context_is_built_from_summaries_in_one_query(db_session, monkeypatch):
+    from sqlalchemy import event
+    from backend.services import graph_service, rag_service as rag_module
+
+    for i in range(3):
+        db_session.add(Email(id=f"c{i}", subject=f"Subject {i}", sender="a@example.com", body="BODY TEXT " * 200,
+                             summary=f"Summary {i}", key_facts=[f"fact {i}"], timestamp=datetime(2026, 1, i + 1)))
+    db_session.add(Email(id="c9", subject="Unprocessed", sender="b@example.com", body="Fresh email body. More text.",
+                         timestamp=datetime(2025, 1, 1)))
+    db_session.commit()
+    monkeypatch.setattr(graph_service, "get_context_for_chat", lambda db, query: "")
+    monkeypatch.setattr(rag_module.rag_service, "is_mock", False)
+    monkeypatch.setattr(rag_module.rag_service, "search", lambda query, k=5: [{"id": "c2"}, {"id": "gone"}, {"id": "c0"}])
+
+    statements = []
+    engine = db_session.get_bind()
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        prompt = agent_service.build_chat_prompt(db_session, "budget questions")
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 1 and " IN " in statements[0]
+    assert prompt.index("ID: c2") < prompt.index("ID: c0") and "ID: c1" not in prompt
+    assert "Summary: Summary 2\nKey facts: fact 2" in prompt and "BODY TEXT" not in prompt
+
+    # Recent-inbox context; unprocessed emails fall back to the start of their body
+    prompt = agent_service.build_chat_prompt(db_session, "summarize my inbox")
+    assert "ID: c1" in prompt and "Summary: Fresh email body. More text." in prompt
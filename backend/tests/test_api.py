@@ -1,3 +1,14 @@
+import json
+from unittest.mock import patch
+
+from backend.models import Draft
+from backend.services.llm_metrics import llm_metrics
+from backend.services.llm_service import LLMService
+
+# conftest patches LLMService.generate_text; the metrics test needs the real one
+_generate_text = LLMService.generate_text
+
+
 def test_read_root(client):
     response = client.get("/")
     assert response.status_code == 200
@@ -37,3 +48,58 @@ def test_agent_chat(client):
     assert response.status_code == 200
     assert "response" in response.json()
     assert isinstance(response.json()["response"], str)
+
+def test_update_category(client):
+    client.post("/inbox/load")
+    email_id = client.get("/inbox/").json()[0]["id"]
+
+    response = client.put(f"/inbox/{email_id}/category", json={})
+    assert response.status_code == 200
+    assert response.json()["category_source"] == "confirmed"
+
+    response = client.put(f"/inbox/{email_id}/category", json={"category": "Finance"})
+    assert response.status_code == 200
+    assert response.json()["category"] == "Finance"
+    assert response.json()["category_source"] == "user"
+
+def _sse_events(response):
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = block.split("\n")
+        name = lines[0][len("event: "):] if lines[0].startswith("event: ") else "message"
+        events.append((name, json.loads(lines[-1][len("data: "):])))
+    return events
+
+def test_draft_stream_persists_draft(client, db_session):
+    client.post("/inbox/load")
+    email_id = client.get("/inbox/").json()[0]["id"]
+
+    with patch("backend.services.llm_service.LLMService.stream_text", return_value=iter(["Hi ", "there", "."])):
+        response = client.post("/agent/draft/stream", json={"email_id": email_id})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = _sse_events(response)
+    assert [e["delta"] for name, e in events if name == "message"] == ["Hi ", "there", "."]
+    name, done = events[-1]
+    assert name == "done"
+    draft = db_session.query(Draft).filter(Draft.id == done["draft_id"]).first()
+    assert draft.body == "Hi there."
+
+
+def test_metrics_labelled_by_route_and_prompt_type(client):
+    client.post("/inbox/load")
+    llm_metrics.reset()
+
+    with patch.object(LLMService, "generate_text", _generate_text), \
+            patch.object(LLMService, "_complete", lambda self, prompt, json_mode, prompt_type="general": "Two emails."):
+        response = client.post("/agent/chat", json={"query": "Metrics test: what is new?", "email_id": None})
+    assert response.status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'llm_requests_total{endpoint="POST /agent/chat",prompt_type="chat"} 1' in response.text
+
+    rows = client.get("/status").json()["llm"]["metrics"]["by_endpoint"]
+    assert [(r["endpoint"], r["prompt_type"]) for r in rows] == [("POST /agent/chat", "chat")]
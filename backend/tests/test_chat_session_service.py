@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.models import ChatMessage, ChatSession, Email
+from backend.services import graph_service, rag_service as rag_module
+from backend.services.chat_session_service import ChatSessionService
+from backend.services.llm_service import LLMService
+
+
+@pytest.fixture
+def inbox(db_session, monkeypatch):
+    """Six summarized emails; RAG returns whatever ids the test puts in `hits`."""
+    for i in range(6):
+        db_session.add(Email(id=f"m{i}", subject=f"Subject {i}", sender="a@example.com", body="BODY TEXT " * 200,
+                             summary=f"Summary {i}", timestamp=datetime(2026, 1, i + 1)))
+    db_session.commit()
+    hits = ["m0", "m1"]
+    monkeypatch.setattr(graph_service, "get_context_for_chat", lambda db, query: "")
+    monkeypatch.setattr(rag_module.rag_service, "is_mock", False)
+    monkeypatch.setattr(rag_module.rag_service, "search", lambda query, k=5: [{"id": i} for i in hits])
+    return hits
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    """Record every prompt sent to the LLM as (prompt_type, prompt)."""
+    sent = []
+
+    def generate_text(self, prompt, json_mode=False, use_cache=True, prompt_type="general"):
+        sent.append((prompt_type, prompt))
+        return f"Answer {len(sent)}"
+
+    monkeypatch.setattr(LLMService, "generate_text", generate_text)
+    return sent
+
+
+def test_follow_ups_send_only_new_context(db_session, inbox, prompts):
+    service = ChatSessionService()
+    session = service.create(db_session)
+
+    service.chat(db_session, session, "What about the budget?")
+    first = prompts[-1][1]
+    assert "Summary: Summary 0" in first and "Summary: Summary 1" in first
+
+    inbox[:] = ["m1", "m2"]
+    service.chat(db_session, session, "And the offsite?")
+    follow_up = prompts[-1][1]
+    assert "Summary: Summary 2" in follow_up
+    assert "Summary: Summary 1" not in follow_up and "- ID: m1 | 2026-01-02" in follow_up
+    assert "User: What about the budget?\nAgent: Answer 1" in follow_up
+    assert follow_up.endswith("User Query: And the offsite?\n\nAgent Response:")
+
+    db_session.expire_all()
+    stored = db_session.get(ChatSession, session.id)
+    assert stored.context_email_ids == ["m0", "m1", "m2"]
+    assert [m.role for m in stored.messages] == ["user", "assistant"] * 2
+    assert stored.messages[0].prompt_tokens is None and stored.messages[3].prompt_tokens > 0
+
+
+def test_prompt_size_stays_flat_as_history_is_summarized(db_session, inbox, prompts):
+    service = ChatSessionService(history_messages=2, summary_batch=4, max_context_emails=3)
+    session = service.create(db_session)
+    for turn in range(12):
+        inbox[:] = [f"m{turn % 6}"]
+        service.chat(db_session, session, f"Question {turn}: " + "details " * 50)
+
+    summaries = [prompt for prompt_type, prompt in prompts if prompt_type == "chat_summary"]
+    assert len(summaries) == 5  # Four messages folded every other turn from the fourth on
+    assert "User: Question 0" in summaries[0] and "Answer 1" in summaries[0]
+
+    assert session.summarized_count == 20 and session.summary.startswith("Answer")
+    assert len(session.context_email_ids) == 3
+    tokens = [m.prompt_tokens for m in session.messages if m.role == "assistant"]
+    assert max(tokens[8:]) <= max(tokens[2:6]) + 5
+
+    last = prompts[-1][1]
+    assert "Question 10" in last and "Question 9" not in last
+
+
+def test_summary_falls_back_to_lead_sentences(db_session, inbox, prompts, monkeypatch):
+    service = ChatSessionService(history_messages=2, summary_batch=2)
+    session = service.create(db_session)
+    service.chat(db_session, session, "First question. With detail.")
+    service.chat(db_session, session, "Second question.")
+
+    def failing(self, prompt, json_mode=False, use_cache=True, prompt_type="general"):
+        if prompt_type == "chat_summary":
+            raise RuntimeError("provider down")
+        return "ok"
+
+    monkeypatch.setattr(LLMService, "generate_text", failing)
+    service.chat(db_session, session, "Third question.")
+    assert session.summary == "User: First question. With detail. Agent: Answer 1"
+    assert session.summarized_count == 2
+
+
+def test_email_chat_follow_ups_use_the_summary(db_session, inbox, prompts):
+    service = ChatSessionService()
+    session = service.create(db_session, email_id="m3")
+    service.chat(db_session, session, "What does this say?")
+    service.chat(db_session, session, "Who sent it?")
+    assert "BODY TEXT" in prompts[0][1]
+    assert "BODY TEXT" not in prompts[1][1] and "Summary: Summary 3" in prompts[1][1]
+
+
+def test_chat_session_endpoints(client, db_session, inbox, prompts):
+    response = client.post("/agent/chat", json={"query": "Hi"}).json()
+    session_id = response["session_id"]
+    assert response["response"] == "Answer 1"
+
+    assert client.post("/agent/chat", json={"query": "More", "session_id": session_id}).json()["session_id"] == session_id
+    session = client.get(f"/agent/chat/sessions/{session_id}").json()
+    assert [m["content"] for m in session["messages"]] == ["Hi", "Answer 1", "More", "Answer 2"]
+
+    assert client.post("/agent/chat", json={"query": "x", "session_id": 999}).status_code == 404
+    assert client.post("/agent/chat/sessions", json={"email_id": "m1"}).json()["email_id"] == "m1"
+    assert client.delete(f"/agent/chat/sessions/{session_id}").status_code == 200
+    assert client.get(f"/agent/chat/sessions/{session_id}").status_code == 404
+
+
+def test_chat_stream_reports_session(client, db_session, inbox, monkeypatch):
+    monkeypatch.setattr(LLMService, "stream_text", lambda self, prompt, use_cache=True, prompt_type="general": iter(["Hel", "lo"]))
+    response = client.post("/agent/chat/stream", json={"query": "Hi"})
+    assert 'event: done\ndata: {"done": true, "session_id": 1}' in response.text
+    session = client.get("/agent/chat/sessions/1").json()
+    assert session["messages"][1]["content"] == "Hello"
+
+
+def test_sessions_are_stored_with_a_successful_turn_and_expire(client, db_session, inbox, monkeypatch):
+    def failing(self, prompt, json_mode=False, use_cache=True, prompt_type="general"):
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(LLMService, "generate_text", failing)
+    with pytest.raises(RuntimeError):
+        client.post("/agent/chat", json={"query": "Hi"})
+    assert db_session.query(ChatSession).count() == 0
+
+    service = ChatSessionService(ttl_days=30)
+    stale = service.create(db_session)
+    stale.messages.append(ChatMessage(role="user", content="old"))
+    stale.updated_at = datetime.utcnow() - timedelta(days=31)
+    db_session.commit()
+    monkeypatch.setattr(LLMService, "generate_text", lambda self, prompt, **kwargs: "Answer")
+    stale_id = stale.id
+    fresh = service.new()
+    service.chat(db_session, fresh, "Hi")
+    assert [s.id for s in db_session.query(ChatSession)] == [fresh.id]
+    assert fresh.id != stale_id  # An expired session_id never points at a newer conversation
+    assert db_session.query(ChatMessage).count() == 2
@@ -0,0 +1,34 @@
+import threading
+
+from backend.services.classifier_v2 import MicroBatcher
+
+
+class EchoClassifier:
+    """Stand-in classifier that labels each email with its own subject."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict_batch(self, emails):
+        self.batch_sizes.append(len(emails))
+        return [(email["subject"], 1.0) for email in emails]
+
+
+def test_microbatcher_resolves_each_caller():
+    clf = EchoClassifier()
+    batcher = MicroBatcher(clf, max_batch_size=8, max_wait_ms=20)
+    results = {}
+
+    def call(i):
+        results[i] = batcher.predict(f"email-{i}", "body")
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {i: (f"email-{i}", 1.0) for i in range(20)}
+    assert sum(clf.batch_sizes) == 20
+    assert max(clf.batch_sizes) <= 8
+    assert len(clf.batch_sizes) < 20
@@ -0,0 +1,74 @@
+import json
+
+from backend.models import Email
+from backend.services import dark_patterns_service
+from backend.services.dark_patterns_service import detect_dark_patterns, scan_mailbox
+
+
+def test_detects_each_pattern_in_its_field():
+    result = detect_dark_patterns(
+        "CONGRATULATIONS!!! You've won",
+        "Claim at bit.ly/x now. Your account will be suspended. " + "x" * 200 + " unsubscribe",
+    )
+    assert result["patterns_found"] == ["excessive_caps", "excessive_exclamation", "shortened_links",
+                                        "prize_scam", "pressure_tactics", "hidden_unsubscribe"]
+    assert result["severity"] == "high"
+    assert result["warnings"][0] == "📢 Excessive capitalization in subject"
+
+    # Capitalization counts only in the subject, links and pressure only in the body
+    assert detect_dark_patterns("Weekly notes", "MEETING moved, see bit.ly")["patterns_found"] == ["shortened_links"]
+    assert detect_dark_patterns("Verify now: t.co/abc", "Hi")["has_dark_patterns"] is False
+    assert detect_dark_patterns("", None) == {"has_dark_patterns": False, "patterns_found": [],
+                                              "severity": "low", "warnings": []}
+
+
+def test_overlapping_matches_are_all_reported():
+    # "HURRY" is both urgency language and a capitalized run
+    assert detect_dark_patterns("HURRY", "")["patterns_found"] == ["fake_urgency", "excessive_caps"]
+    # Each phrase starts where another ends
+    assert detect_dark_patterns("", "see urgent.co")["patterns_found"] == ["fake_urgency", "shortened_links"]
+    assert detect_dark_patterns("", "t.congratulations")["patterns_found"] == ["shortened_links", "prize_scam"]
+    # Phrases still need a word boundary; links do not
+    assert detect_dark_patterns("", "insurgent freely xbit.ly")["patterns_found"] == ["shortened_links"]
+
+
+def _add_emails(db, count):
+    for i in range(count):
+        body = "Act now, only 3 left!" if i % 3 == 0 else "Minutes from Tuesday's sync."
+        db.add(Email(id=f"scan-{i:03d}", sender="a@example.com", subject=f"Update {i}", body=body))
+    db.commit()
+
+
+def test_scan_mailbox_backfills_in_chunks(db_session):
+    _add_emails(db_session, 10)
+    stats = scan_mailbox(db_session, chunk_size=4, workers=1)
+    assert (stats["scanned"], stats["flagged"], stats["workers"]) == (10, 4, 1)
+
+    flagged = db_session.get(Email, "scan-003")
+    assert flagged.has_dark_patterns and json.loads(flagged.dark_patterns) == ["fake_urgency"]
+    assert db_session.get(Email, "scan-004").has_dark_patterns is False
+
+
+def test_scan_mailbox_process_pool_matches_inline(db_session):
+    _add_emails(db_session, 7)
+    # Small mailboxes are scanned inline
+    assert scan_mailbox(db_session, chunk_size=5, workers=2, min_rows=8)["workers"] == 1
+
+    try:
+        for _ in range(2):
+            stats = scan_mailbox(db_session, chunk_size=5, workers=2, min_rows=7)
+            assert (stats["scanned"], stats["flagged"], stats["workers"]) == (7, 3, 2)
+        pool = dark_patterns_service._pool  # Shared across scans, workers spawned rather than forked
+        assert pool is not None and pool._mp_context.get_start_method() == "spawn"
+        assert db_session.get(Email, "scan-006").dark_pattern_severity == "low"
+    finally:
+        dark_patterns_service.shutdown_scan_pool()
+    assert dark_patterns_service._pool is None
+
+
+def test_scan_endpoint(client, db_session):
+    _add_emails(db_session, 3)
+    response = client.post("/inbox/dark-patterns/scan?chunk_size=2&workers=1")
+    assert response.status_code == 200
+    assert response.json()["scanned"] == 3
+    assert client.post("/inbox/dark-patterns/scan?chunk_size=0").status_code == 400
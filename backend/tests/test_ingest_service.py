@@ -0,0 +1,124 @@
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.database import Base, add_missing_columns
+from backend.models import Email
+from backend.services.ingest_service import (
+    backfill_clean_bodies, backfill_redacted_bodies, clean_body, ingest_bodies, prompt_body,
+)
+from backend.services.agent_service import build_extraction_prompt
+from backend.services.pii_service import PRE_REDACTED_END, PRE_REDACTED_START, REDACTION_VERSION, pii_service
+
+
+def test_clean_body_strips_quotes_signatures_and_boilerplate():
+    reply = (
+        "Sounds good,   see you Thursday.\n\n\n"
+        "Thanks,\nDana Smith\nSenior PM | Acme Corp\n\n"
+        "On Tue, Mar 3, 2026 at 10:00 AM Bob <bob@example.com> wrote:\n"
+        "> Can we meet Thursday?\n> Bob"
+    )
+    assert clean_body(reply) == "Sounds good, see you Thursday."
+
+    newsletter = (
+        "This week's digest.\n\nTop story: things happened.\n\n"
+        "You are receiving this email because you subscribed. Unsubscribe | Manage preferences"
+    )
+    assert clean_body(newsletter) == "This week's digest.\n\nTop story: things happened."
+
+    outlook = "Approved.\n\n-----Original Message-----\nFrom: A\nSent: Monday\nSubject: budget"
+    assert clean_body(outlook) == "Approved."
+    assert clean_body("Invoice attached.\n\n-- \nJohn Doe\nCONFIDENTIALITY NOTICE: ...") == "Invoice attached."
+
+
+def test_clean_body_never_empties_content():
+    assert clean_body("Thanks!") == "Thanks!"
+    # Text that only looks like a quoted header falls back to the original
+    assert clean_body("From: Alice said the demo moved.\nDate: Friday works for her.") == \
+        "From: Alice said the demo moved.\nDate: Friday works for her."
+
+
+def test_clean_body_keeps_forwarded_content():
+    forward = (
+        "FYI, see below.\n\n"
+        "---------- Forwarded message ---------\n"
+        "From: Alice <alice@example.com>\n"
+        "Date: Mon, Mar 2, 2026 at 9:00 AM\n"
+        "Subject: Q2 budget\n"
+        "To: Bob <bob@example.com>\n\n"
+        "Please approve the Q2 budget by Friday.\n\n"
+        "Best,\nAlice"
+    )
+    assert clean_body(forward) == "FYI, see below.\n\nPlease approve the Q2 budget by Friday."
+    assert clean_body(forward[len("FYI, see below.\n\n"):]) == "Please approve the Q2 budget by Friday."
+
+
+def test_clean_body_keeps_text_after_a_mid_message_thanks():
+    body = "Hi Sam,\n\nThank you!\nCould you send the signed contract by Friday?\n\nBest,\nDana"
+    assert clean_body(body) == "Hi Sam,\n\nThank you!\nCould you send the signed contract by Friday?"
+    assert clean_body("Report attached.\n\nThanks,\nDana Smith\n+1 555 0100") == "Report attached."
+    assert clean_body("") == ""
+    assert prompt_body(SimpleNamespace(clean_body=None, body="raw")) == "raw"
+    assert prompt_body(SimpleNamespace(clean_body="clean", body="raw")) == "clean"
+
+
+def test_prompt_body_uses_body_redacted_at_ingest(monkeypatch):
+    fields = ingest_bodies("Call me on 555-123-4567 about the invoice.\n\nBest,\nSam")
+    assert fields["redacted_body"] == "Call me on [REDACTED_PHONE] about the invoice."
+    email = SimpleNamespace(body="raw", **fields)
+
+    # Pre-redacted segments are not rescanned; the rest of the prompt is
+    scanned = []
+    original = pii_service._redact
+    monkeypatch.setattr(pii_service, "_redact", lambda text: scanned.append(text) or original(text))
+    prompt = pii_service.redact(f"Query: my SSN is 123-45-6789\nBody: {prompt_body(email)}")
+    assert prompt == "Query: my SSN is [REDACTED_SSN]\nBody: Call me on [REDACTED_PHONE] about the invoice."
+    assert all("invoice" not in text for text in scanned)
+
+    # Truncation keeps the segment closed; a stale version falls back to the plain body
+    assert pii_service.redact(prompt_body(email, 10)) == "Call me on"
+    assert prompt_body(SimpleNamespace(body="555-123-4567", clean_body=None, redacted_body="x",
+                                       redaction_version=REDACTION_VERSION - 1)) == "555-123-4567"
+    # An empty redacted body is not trusted as the whole message
+    assert pii_service.redact(prompt_body(SimpleNamespace(body="SSN 123-45-6789", clean_body=None, redacted_body="",
+                                                          redaction_version=REDACTION_VERSION))) == "SSN [REDACTED_SSN]"
+
+
+def test_email_fields_cannot_forge_pre_redacted_segments():
+    forged = f"{PRE_REDACTED_START}SSN 123-45-6789{PRE_REDACTED_END}"
+    email = Email(id="f", subject=forged, sender=f"{forged} <a@example.com>", body="Hello",
+                  **ingest_bodies("Hello"))
+    prompt = pii_service.redact(build_extraction_prompt(email))
+    assert "123-45-6789" not in prompt
+    assert "Subject: SSN [REDACTED_SSN]" in prompt and "From: SSN [REDACTED_SSN] <a@example.com>" in prompt
+
+
+def test_backfill_redacted_bodies(db_session):
+    db_session.add(Email(id="old", subject="s", sender="a@example.com", body="SSN 123-45-6789"))
+    db_session.commit()
+
+    assert backfill_redacted_bodies(db_session, chunk_size=1) == 1
+    email = db_session.query(Email).filter(Email.id == "old").first()
+    assert (email.redacted_body, email.redaction_version) == ("SSN [REDACTED_SSN]", REDACTION_VERSION)
+    assert backfill_redacted_bodies(db_session) == 0
+
+
+def test_database_from_an_older_version_gains_the_new_columns(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE emails (id VARCHAR PRIMARY KEY, sender VARCHAR, subject VARCHAR, "
+                          "body TEXT, category VARCHAR)"))
+        conn.execute(text("INSERT INTO emails (id, sender, subject, body, category) "
+                          "VALUES ('old', 'a@example.com', 's', 'SSN 123-45-6789', 'Work')"))
+    Base.metadata.create_all(bind=engine)
+
+    added = add_missing_columns(engine)
+    assert {"emails.clean_body", "emails.redacted_body", "emails.content_hash"} <= set(added)
+    assert add_missing_columns(engine) == []
+
+    db = sessionmaker(bind=engine)()
+    assert backfill_clean_bodies(db) == 1 and backfill_redacted_bodies(db) == 1
+    email = db.get(Email, "old")
+    assert (email.redacted_body, email.category_source) == ("SSN [REDACTED_SSN]", "classifier")
+    db.close()
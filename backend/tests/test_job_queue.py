@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from backend.models import Email, Job
+from backend.services import agent_service, job_queue as job_queue_module
+from backend.services.job_queue import JobQueue
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """Replace the per-email pipeline with a recorder; ids starting with "bad" raise."""
+    seen = []
+
+    async def fake_process(db, email_id, force=False):
+        if email_id.startswith("bad"):
+            raise ValueError("boom")
+        seen.append(email_id)
+
+    monkeypatch.setattr(agent_service, "BATCH_EXTRACTION", False)
+    monkeypatch.setattr(agent_service, "process_email_async", fake_process)
+    return seen
+
+
+@pytest.fixture
+def queue(db_session):
+    return JobQueue(session_factory=sessionmaker(bind=db_session.get_bind()), chunk_size=2, retry_delay=0)
+
+
+def test_process_all_queues_every_email_and_reports_progress(client, db_session, queue, processed):
+    for i in range(5):
+        db_session.add(Email(id=f"e{i}", sender="a@example.com", subject="s", body="b",
+                             timestamp=datetime(2026, 1, 1) + timedelta(hours=i)))
+    db_session.add(Email(id="bad-1", sender="a@example.com", subject="s", body="b", timestamp=datetime(2025, 1, 1)))
+    db_session.commit()
+
+    job_id = client.post("/agent/process-all").json()["job_id"]
+    assert client.get(f"/agent/jobs/{job_id}").json()["status"] == "queued"
+
+    assert queue.run_once() == job_id
+    assert processed == ["e4", "e3", "e2", "e1", "e0"]
+    job = client.get(f"/agent/jobs/{job_id}").json()
+    assert (job["status"], job["total"], job["processed"], job["failed"], job["attempts"]) == ("done", 6, 6, 1, 1)
+    assert job["progress"] == 1.0
+    assert queue.run_once() is None
+    assert client.get("/agent/jobs/999").status_code == 404
+
+
+def test_failed_job_is_retried_and_resumes_from_its_progress(db_session, queue, processed, monkeypatch):
+    job = queue.enqueue(db_session, ["a", "b", "c", "d"])
+    real_chunk = job_queue_module._process_chunk
+    calls = []
+
+    async def flaky_chunk(email_ids, session_factory, force=False):
+        calls.append(email_ids)
+        if len(calls) == 2:
+            raise RuntimeError("database is locked")
+        return await real_chunk(email_ids, session_factory, force)
+
+    monkeypatch.setattr(job_queue_module, "_process_chunk", flaky_chunk)
+    queue.run_once()
+    db_session.refresh(job)
+    assert (job.status, job.processed, job.attempts, job.error) == ("queued", 2, 1, "database is locked")
+
+    queue.run_once()
+    db_session.refresh(job)
+    assert (job.status, job.processed, job.attempts) == ("done", 4, 2)
+    assert calls == [["a", "b"], ["c", "d"], ["c", "d"]]
+    assert processed == ["a", "b", "c", "d"]
+
+
+def test_jobs_of_a_dead_worker_are_recovered_after_the_lease(db_session, queue, processed):
+    now = datetime.utcnow()
+    alive = Job(email_ids=["x"], total=1, status="running", attempts=1, heartbeat_at=now)
+    dead = Job(email_ids=["y"], total=1, status="running", attempts=1, heartbeat_at=now - timedelta(minutes=5))
+    exhausted = Job(email_ids=["z"], total=1, status="running", attempts=3, heartbeat_at=now - timedelta(minutes=5))
+    db_session.add_all([alive, dead, exhausted])
+    db_session.commit()
+
+    assert queue.run_once() == dead.id
+    assert queue.run_once() is None
+    for job in (alive, dead, exhausted):
+        db_session.refresh(job)
+    assert (alive.status, dead.status, dead.attempts, exhausted.status) == ("running", "done", 2, "failed")
+    assert processed == ["y"]
+
+
+def test_stopping_requeues_the_job_between_chunks(db_session, queue, processed, monkeypatch):
+    job = queue.enqueue(db_session, ["a", "b", "c", "d"])
+    real_chunk = job_queue_module._process_chunk
+
+    async def chunk_then_stop(email_ids, session_factory, force=False):
+        queue._stop.set()  # Shutdown requested while the first chunk runs
+        return await real_chunk(email_ids, session_factory, force)
+
+    monkeypatch.setattr(job_queue_module, "_process_chunk", chunk_then_stop)
+    assert queue.run_once() == job.id
+    db_session.refresh(job)
+    assert (job.status, job.processed, job.attempts) == ("queued", 2, 0)
+
+    queue._stop.clear()
+    monkeypatch.setattr(job_queue_module, "_process_chunk", real_chunk)
+    queue.run_once()
+    db_session.refresh(job)
+    assert (job.status, job.processed, job.attempts) == ("done", 4, 1)
+    assert processed == ["a", "b", "c", "d"]
+
+
+def test_a_worker_whose_job_was_reclaimed_stops_counting(db_session, queue, processed, monkeypatch):
+    job = queue.enqueue(db_session, ["a", "b", "c", "d"])
+    real_chunk = job_queue_module._process_chunk
+    other = sessionmaker(bind=db_session.get_bind())
+
+    async def reclaimed_during_chunk(email_ids, session_factory, force=False):
+        # The lease expired and another worker claimed the job
+        db = other()
+        db.query(Job).filter(Job.id == job.id).update({"worker": "other", "attempts": Job.attempts + 1})
+        db.commit()
+        db.close()
+        return await real_chunk(email_ids, session_factory, force)
+
+    monkeypatch.setattr(job_queue_module, "_process_chunk", reclaimed_during_chunk)
+    queue.run_once()
+    db_session.refresh(job)
+    assert (job.status, job.worker, job.processed, job.attempts) == ("running", "other", 0, 2)
+    assert processed == ["a", "b"]
+
+
+def test_a_reclaimed_worker_that_then_fails_leaves_the_new_claim_alone(db_session, queue, processed, monkeypatch):
+    job = queue.enqueue(db_session, ["a", "b"])
+    other = sessionmaker(bind=db_session.get_bind())
+
+    async def reclaimed_then_failing(email_ids, session_factory, force=False):
+        db = other()
+        db.query(Job).filter(Job.id == job.id).update({"worker": "other", "attempts": Job.attempts + 1})
+        db.commit()
+        db.close()
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(job_queue_module, "_process_chunk", reclaimed_then_failing)
+    queue.run_once()
+    db_session.refresh(job)
+    assert (job.status, job.worker, job.attempts, job.error, job.run_after) == ("running", "other", 2, None, None)
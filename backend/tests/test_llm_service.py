@@ -0,0 +1,468 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.services.llm_cache import LLMCache
+from backend.services.llm_metrics import LLMMetrics, current_endpoint
+from backend.services.llm_router import ProviderRouter
+from backend.services.llm_service import LLMService
+from backend.services.mock_provider import MockProvider, MockProviderError
+from backend.services.rate_limiter import ProviderRateLimiter, TokenBucket
+from backend.services.retry_policy import RetryBudget, RetryPolicy, is_transient, retry_after_seconds
+
+# conftest patches LLMService.generate_text for API tests; keep the real one here
+_generate_text = LLMService.generate_text
+
+
+def test_cache_hit_miss_and_persistence(tmp_path):
+    path = tmp_path / "cache.db"
+    cache = LLMCache(path=path)
+    key = cache.make_key("groq", "model", False, "prompt")
+
+    assert cache.get(key) is None
+    cache.set(key, "answer")
+    assert cache.get(key) == "answer"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+    # A fresh instance reads the same SQLite file
+    assert LLMCache(path=path).get(key) == "answer"
+    assert cache.make_key("groq", "model", True, "prompt") != key
+
+
+def test_cache_ttl_and_lru_eviction(tmp_path):
+    cache = LLMCache(path=tmp_path / "cache.db", ttl_seconds=1, max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    time.sleep(0.01)
+    cache.set("c", "3")  # evicts least recently used: "b"
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.stats()["evictions"] == 1
+
+    cache._memory.clear()
+    cache.ttl_seconds = 0
+    assert cache.get("a") is None
+
+
+def test_generate_text_uses_cache_and_bypass(tmp_path, monkeypatch):
+    service = LLMService()
+    service.cache = LLMCache(path=tmp_path / "cache.db")
+    calls = []
+    monkeypatch.setattr(service, "_complete", lambda prompt, json_mode, prompt_type="general": calls.append(prompt) or f"reply {len(calls)}")
+
+    assert _generate_text(service, "Hello") == "reply 1"
+    assert _generate_text(service, "Hello") == "reply 1"
+    assert _generate_text(service, "Hello", use_cache=False) == "reply 2"
+    assert len(calls) == 2
+    assert (service.cache.hits, service.cache.misses) == (1, 1)  # The single-flight recheck isn't counted
+
+    async def acomplete(prompt, json_mode, prompt_type="general"):
+        return service._complete(prompt, json_mode)
+    monkeypatch.setattr(service, "_acomplete", acomplete)
+    assert asyncio.run(service.agenerate_text("Async hello")) == "reply 3" and service.cache.misses == 2
+
+    # Drafts, chat and smart replies are regenerated on every request
+    assert _generate_text(service, "Draft it", prompt_type="draft") == "reply 4"
+    assert _generate_text(service, "Draft it", prompt_type="draft") == "reply 5"
+    monkeypatch.setattr(service, "_stream", lambda prompt: iter(["new ", "chat"]))
+    assert "".join(service.stream_text("Hello", prompt_type="chat")) == "new chat"
+    assert service.cache.stats()["entries"] == 2
+
+
+def test_failover_answers_are_cached_under_the_provider_that_gave_them(tmp_path, monkeypatch):
+    service = LLMService()
+    service.cache = LLMCache(path=tmp_path / "cache.db")
+    service.provider, service.is_mock = "groq", False
+    service.models.update(groq="llama", gemini="flash")
+    service.router = ProviderRouter(["groq", "gemini", "mock"], failure_threshold=10, last_resort=("mock",))
+    service.rate_limiters = {p: ProviderRateLimiter() for p in ("groq", "gemini", "mock")}
+    down, calls = {"groq"}, []
+
+    def fake_call(provider, prompt, json_mode, timeout=None):
+        calls.append(provider)
+        if provider in down:
+            raise ValueError(f"{provider} unavailable")  # Not transient: no retry round
+        return f"{provider} reply"
+
+    monkeypatch.setattr(service, "_call", fake_call)
+    assert _generate_text(service, "Hello") == "gemini reply"
+    key = lambda provider, model: service.cache.make_key(provider, model, False, "Hello")
+    assert service.cache.get(key("gemini", "flash")) == "gemini reply"
+    assert service.cache.get(key("groq", "llama")) is None
+
+    # A canned mock answer is never cached as a real one
+    down.add("gemini")
+    assert _generate_text(service, "Hi") == "mock reply"
+    assert service.cache.stats()["entries"] == 1
+    down.discard("gemini")
+    assert _generate_text(service, "Hi") == "gemini reply"  # Asked again rather than served from the cache
+    assert service.cache.stats()["entries"] == 2
+
+
+def test_token_bucket_spaces_out_reservations():
+    bucket = TokenBucket(rate_per_minute=60, capacity=2)  # 1 token/s, burst of 2
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert 0.9 < bucket.reserve() <= 1.0
+    assert 1.9 < bucket.reserve() <= 2.0
+    assert TokenBucket(0).reserve(10 ** 6) == 0  # 0 disables the limit
+
+    limiter = ProviderRateLimiter(rpm=600, tpm=60)
+    assert limiter.reserve(60) == 0
+    assert limiter.reserve(30) > 0  # token budget, not request budget, is exhausted
+    assert limiter.stats()["waits"] == 1
+
+
+def test_agenerate_text_bounds_concurrency(tmp_path, monkeypatch):
+    service = LLMService()
+    service.cache = LLMCache(path=tmp_path / "cache.db")
+    service.max_concurrency = 3
+    in_flight, peak = 0, 0
+
+    async def fake_acomplete(prompt, json_mode, prompt_type="general"):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return f"reply to {prompt}"
+
+    monkeypatch.setattr(service, "_acomplete", fake_acomplete)
+
+    async def run():
+        return await asyncio.gather(*(service.agenerate_text(f"prompt {i}") for i in range(10)))
+
+    replies = asyncio.run(run())
+    assert replies == [f"reply to prompt {i}" for i in range(10)]
+    assert peak == 3
+    # Second run is served from the cache without touching the provider
+    monkeypatch.setattr(service, "_acomplete", None)
+    assert asyncio.run(run()) == replies
+
+
+def test_identical_concurrent_calls_share_one_upstream_request(tmp_path, monkeypatch):
+    service = LLMService()
+    service.cache = LLMCache(path=tmp_path / "cache.db", enabled=False)
+    calls = []
+    release = threading.Event()
+
+    def slow_complete(prompt, json_mode, prompt_type="general"):
+        calls.append(prompt)
+        release.wait(2)
+        return "shared reply"
+
+    async def async_complete(prompt, json_mode, prompt_type="general"):
+        return slow_complete(prompt, json_mode)
+
+    monkeypatch.setattr(service, "_complete", slow_complete)
+    monkeypatch.setattr(service, "_acomplete", async_complete)
+
+    async def async_caller():
+        return await service.agenerate_text("Brief me on the meeting")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(_generate_text, service, "Brief me on the meeting")
+        while not calls:
+            time.sleep(0.001)
+        followers = [pool.submit(_generate_text, service, "Brief me on the meeting") for _ in range(2)]
+        followers.append(pool.submit(asyncio.run, async_caller()))
+        while service.coalesced < 3:
+            time.sleep(0.001)
+        release.set()
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert results == ["shared reply"] * 4
+    assert len(calls) == 1
+    assert service._inflight == {}
+
+
+def test_cancelled_single_flight_leader_hands_over_to_a_follower(tmp_path, monkeypatch):
+    service = LLMService()
+    service.cache = LLMCache(path=tmp_path / "cache.db")
+    calls = []
+
+    async def acomplete(prompt, json_mode, prompt_type="general"):
+        calls.append(prompt)
+        if len(calls) == 1:
+            await asyncio.sleep(5)  # The leader's call, cancelled below
+        return "fresh reply"
+
+    monkeypatch.setattr(service, "_acomplete", acomplete)
+
+    async def run():
+        leader = asyncio.ensure_future(service.agenerate_text("Hello"))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(service.agenerate_text("Hello"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "fresh reply"
+    assert len(calls) == 2 and not service._inflight
+
+
+def test_stream_text_chunks_and_caches(tmp_path):
+    service = LLMService()
+    service.is_mock = True
+    service.cache = LLMCache(path=tmp_path / "cache.db")
+
+    chunks = list(service.stream_text("Hello there"))
+    assert len(chunks) > 1
+    full = "".join(chunks)
+    assert full == service._mock_response("Hello there")
+    # A repeat is served from the cache as one chunk
+    assert list(service.stream_text("Hello there")) == [full]
+
+
+def test_circuit_breaker_opens_and_recovers_via_half_open_probe():
+    router = ProviderRouter(["groq", "gemini"], failure_threshold=2, reset_seconds=0.05)
+    assert router.ranked() == ["groq", "gemini"]  # priority breaks ties until measured
+
+    for _ in range(2):
+        assert router.admit("groq")
+        router.record_failure("groq")
+    assert router.stats()["groq"]["state"] == "open"
+    assert not router.admit("groq")
+
+    time.sleep(0.06)
+    assert router.admit("groq")       # half-open probe
+    assert not router.admit("groq")   # only one probe at a time
+    router.record_success("groq", 0.1)
+    assert router.stats()["groq"]["state"] == "closed"
+
+
+def test_cancelled_half_open_probe_frees_the_circuit(monkeypatch):
+    service = LLMService()
+    service.router = ProviderRouter(["groq"], failure_threshold=1, reset_seconds=0.01)
+    service.rate_limiters = {"groq": ProviderRateLimiter()}
+
+    def reopen():
+        assert service.router.admit("groq")
+        service.router.record_failure("groq")
+        time.sleep(0.02)
+
+    async def hang(provider, prompt, json_mode):
+        await asyncio.sleep(10)
+
+    async def cancel_probe():
+        task = asyncio.ensure_future(service._acomplete("x", False))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    # A cancelled async call (e.g. a dropped speculative extraction)
+    reopen()
+    monkeypatch.setattr(service, "_acall", hang)
+    asyncio.run(cancel_probe())
+    assert service.router.stats()["groq"]["state"] == "half_open"
+    assert service.router.admit("groq")
+    service.router.record_success("groq")
+
+    # A stream the client stopped reading after the first chunk
+    reopen()
+    monkeypatch.setattr(service, "_stream_from", lambda provider, prompt: iter(["a", "b"]))
+    stream = service._stream("x")
+    assert next(stream) == "a"
+    stream.close()
+    assert service.router.admit("groq")
+
+
+def test_router_prefers_faster_healthier_provider():
+    router = ProviderRouter(["groq", "gemini"])
+    for _ in range(20):
+        router.record_success("groq", 0.8)
+        router.record_success("gemini", 0.3)
+    assert router.ranked() == ["gemini", "groq"]
+
+    for _ in range(20):
+        router.record_failure("gemini")  # 50% errors outweigh the latency advantage
+    assert router.ranked() == ["groq", "gemini"]
+
+
+def test_last_resort_provider_is_ranked_after_real_ones():
+    router = ProviderRouter(["groq", "mock"], last_resort=("mock",))
+    router.record_success("groq", 1.5)  # Slower than an unmeasured provider is assumed to be
+    for _ in range(20):
+        router.record_success("mock", 0.001)
+    assert router.ranked() == ["groq", "mock"]
+
+    for _ in range(20):
+        router.record_failure("groq")
+    assert router.ranked() == ["groq", "mock"]  # Its circuit, not the ranking, decides when mock answers
+    assert not router.admit("groq") and router.admit("mock")
+
+
+def test_complete_fails_over_and_raises_only_when_all_fail(monkeypatch):
+    service = LLMService()
+    service.router = ProviderRouter(["groq", "gemini"], failure_threshold=1, reset_seconds=60)
+    service.rate_limiters = {"groq": ProviderRateLimiter(), "gemini": ProviderRateLimiter()}
+    down = {"groq"}
+
+    def fake_call(provider, prompt, json_mode, timeout=None):
+        if provider in down:
+            raise RuntimeError(f"{provider} unavailable")
+        return f"{provider} reply"
+
+    monkeypatch.setattr(service, "_call", fake_call)
+    assert service._complete("Hi", False) == "gemini reply"
+    assert service.router.stats()["groq"]["state"] == "open"
+    # The open circuit is skipped without another upstream attempt
+    assert service._complete("Hi", False) == "gemini reply"
+    assert service.router.stats()["groq"]["requests"] == 1
+
+    down.add("gemini")
+    with pytest.raises(Exception, match="LLM failed"):
+        service._complete("Hi", False)
+
+
+def test_mock_provider_injects_latency_errors_and_rate_limits():
+    render = lambda prompt: '{"urgency_score": 5}'
+
+    slow = MockProvider(render, latency_ms=30, latency_sigma=0.01, seed=1)
+    t0 = time.perf_counter()
+    assert json.loads(slow.complete("x")) == {"urgency_score": 5}
+    assert time.perf_counter() - t0 >= 0.025
+
+    limited = MockProvider(render, rate_limit_rpm=2)
+    limited.complete("x")
+    limited.complete("x")
+    with pytest.raises(MockProviderError) as excinfo:
+        limited.complete("x")
+    assert excinfo.value.status_code == 429
+    assert 0 < float(excinfo.value.response.headers["retry-after"]) <= 60
+
+    failing = MockProvider(render, error_rate=1.0)
+    with pytest.raises(MockProviderError) as excinfo:
+        asyncio.run(failing.acomplete("x"))
+    assert excinfo.value.status_code == 503
+
+    padded = MockProvider(render, output_tokens=200)
+    data = json.loads(padded.complete("x"))
+    assert data["urgency_score"] == 5 and len(data["_padding"]) > 700
+
+
+def test_generate_text_records_metrics(tmp_path, monkeypatch):
+    metrics = LLMMetrics()
+    monkeypatch.setattr("backend.services.llm_service.llm_metrics", metrics)
+    service = LLMService()
+    service.cache = LLMCache(path=tmp_path / "cache.db")
+    monkeypatch.setattr(service, "_complete", lambda prompt, json_mode, prompt_type="general": "x" * 40)
+
+    token = current_endpoint.set("POST /agent/process/{email_id}")
+    try:
+        _generate_text(service, "Extract this", prompt_type="extraction")
+        _generate_text(service, "Extract this", prompt_type="extraction")
+        monkeypatch.setattr(service, "_complete", lambda prompt, json_mode, prompt_type="general": (_ for _ in ()).throw(Exception("down")))
+        with pytest.raises(Exception):
+            _generate_text(service, "Other", prompt_type="extraction")
+    finally:
+        current_endpoint.reset(token)
+
+    row, = metrics.summary()["by_endpoint"]
+    assert row["endpoint"] == "POST /agent/process/{email_id}"
+    assert (row["requests"], row["cache_hits"], row["errors"]) == (3, 1, 1)
+    assert row["completion_tokens"] == 11
+
+    text = metrics.render_prometheus()
+    labels = 'endpoint="POST /agent/process/{email_id}",prompt_type="extraction"'
+    assert f'llm_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"llm_cache_hits_total{{{labels}}} 1" in text
+
+
+def test_transient_errors_are_retried_honoring_retry_after(monkeypatch):
+    service = LLMService()
+    service.router = ProviderRouter(["mock"], failure_threshold=10)
+    service.rate_limiters = {"mock": ProviderRateLimiter()}
+    service.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.001, deadline=5, seed=1)
+    outcomes = [MockProviderError(429, "slow down", retry_after=0.05), MockProviderError(503, "busy"), "ok"]
+
+    def fake_call(provider, prompt, json_mode, timeout=None):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(service, "_call", fake_call)
+    t0 = time.perf_counter()
+    assert service._complete("Hi", False) == "ok"
+    assert time.perf_counter() - t0 >= 0.05
+    assert service.retry_policy.budget.stats() == {"requests": 1, "retries": 2}
+
+    # Client errors are not retried
+    calls = []
+    monkeypatch.setattr(service, "_call", lambda *args: calls.append(1) or (_ for _ in ()).throw(
+        MockProviderError(400, "bad request")))
+    with pytest.raises(Exception, match="bad request"):
+        service._complete("Hi", False)
+    assert len(calls) == 1
+
+
+def test_retry_policy_respects_budget_and_deadline():
+    assert is_transient(MockProviderError(429, "x")) and is_transient(TimeoutError())
+    assert not is_transient(MockProviderError(401, "x")) and not is_transient(ValueError("x"))
+    assert retry_after_seconds(MockProviderError(429, "x", retry_after=2.5)) == 2.5
+
+    policy = RetryPolicy(max_attempts=5, base_delay=0.01, budget=RetryBudget(ratio=0.5, minimum=0))
+    far = time.monotonic() + 60
+    errors = [MockProviderError(503, "busy")]
+    for _ in range(4):
+        policy.budget.record_request()
+    assert policy.next_delay(1, errors, far) is not None
+    assert policy.next_delay(1, errors, far) is not None
+    assert policy.next_delay(1, errors, far) is None  # 2 retries for 4 requests at ratio 0.5
+
+    policy = RetryPolicy(max_attempts=5)
+    slow = [MockProviderError(429, "x", retry_after=30)]
+    assert policy.next_delay(1, slow, time.monotonic() + 10) is None
+    assert policy.next_delay(5, errors, far) is None
+
+
+def test_async_attempts_stop_at_the_deadline_without_blaming_the_provider():
+    class SlowLimiter(ProviderRateLimiter):
+        async def acquire_async(self, tokens):
+            await asyncio.sleep(5)
+
+    service = LLMService()
+    service.router = ProviderRouter(["mock"], failure_threshold=1)
+    service.rate_limiters = {"mock": SlowLimiter()}
+    service.retry_policy = RetryPolicy(base_delay=0.001, max_delay=0.001, deadline=0.05)
+    with pytest.raises(Exception, match="waiting for the rate limit"):
+        asyncio.run(service._acomplete("Hi", False))
+    assert service.router.stats()["mock"]["errors"] == 0
+
+    # A retry delay that ends at the deadline: no attempt with zero time left, no extra failure
+    service.rate_limiters = {"mock": ProviderRateLimiter()}
+    service.router = ProviderRouter(["mock"], failure_threshold=100)
+    calls = []
+
+    async def acall(provider, prompt, json_mode):
+        calls.append(provider)
+        raise ConnectionError("reset")
+
+    service._acall = acall
+    service.retry_policy.next_delay = lambda attempt, errors, deadline_at: \
+        deadline_at - time.monotonic() + 0.001 if attempt == 1 else None
+    with pytest.raises(Exception, match="call deadline exceeded"):
+        asyncio.run(service._acomplete("Hi", False))
+    assert calls == ["mock"] and service.router.stats()["mock"]["errors"] == 1
+
+
+def test_sync_attempts_are_bounded_by_the_call_deadline():
+    service = LLMService()
+    service.router = ProviderRouter(["mock"], failure_threshold=10)
+    service.rate_limiters = {"mock": ProviderRateLimiter()}
+    service.retry_policy = RetryPolicy(base_delay=0.001, max_delay=0.001, deadline=0.2)
+    service.mock_provider = MockProvider(lambda prompt: "late", latency_ms=5000, latency_sigma=0.01)
+
+    t0 = time.perf_counter()
+    with pytest.raises(Exception, match="LLM failed"):
+        service._complete("Hi", False)
+    assert time.perf_counter() - t0 < 2
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from backend.services.llm_service import LLMService
+from backend.services.local_llm_provider import LocalLLMProvider
+from backend.services.retry_policy import RetryPolicy, is_transient
+from local_llm_server import LocalLLMServer
+
+
+@pytest.fixture
+def server():
+    with LocalLLMServer() as server:
+        yield server
+
+
+def test_complete_stream_and_json_mode_reuse_pooled_connections(server):
+    provider = LocalLLMProvider(server.base_url, model="tiny")
+
+    assert provider.complete("hello") == "echo: hello"
+    assert json.loads(provider.complete("hi", json_mode=True)) == {"echo": "hi"}
+    assert provider.complete("again") == "echo: again"
+    assert server.requests[0]["model"] == "tiny"
+    # Three sequential requests over one keep-alive connection
+    assert len(server.client_ports) == 1
+
+    assert "".join(provider.stream("one two three")).strip() == "echo: one two three"
+
+    async def run():
+        return await asyncio.gather(*(provider.acomplete(f"p{i}") for i in range(4)))
+
+    async def run_and_keep_client():
+        return await run(), await provider._async_clients.get()
+
+    for _ in range(2):  # Each asyncio.run gets its own client, closed with the loop
+        results, client = asyncio.run(run_and_keep_client())
+        assert results == [f"echo: p{i}" for i in range(4)] and client.is_closed
+    provider.close()
+
+
+def test_server_errors_surface_as_transient_http_errors(server):
+    provider = LocalLLMProvider(server.base_url)
+    server.fail_next = [503]
+    with pytest.raises(httpx.HTTPStatusError) as excinfo:
+        provider.complete("hello")
+    assert is_transient(excinfo.value)
+
+    with pytest.raises(httpx.ConnectError) as excinfo:
+        LocalLLMProvider("http://127.0.0.1:9/v1", connect_timeout=0.5).complete("hello")
+    assert is_transient(excinfo.value)
+
+
+def test_llm_service_routes_to_local_provider_and_retries(server, monkeypatch):
+    monkeypatch.setenv("LOCAL_LLM_BASE_URL", server.base_url)
+    monkeypatch.setenv("LOCAL_LLM_MODEL", "tiny")
+    monkeypatch.setenv("LLM_PROVIDERS", "local")
+    service = LLMService()
+    service.retry_policy = RetryPolicy(base_delay=0.001, max_delay=0.001)
+
+    assert not service.is_mock
+    assert service.provider == "local" and service.model == "tiny"
+
+    server.fail_next = [502]
+    assert service._complete("Summarize", False) == "echo: Summarize"
+    assert asyncio.run(service._acomplete("Summarize", True)) == json.dumps({"echo": "Summarize"})
+    assert "".join(service._stream("Draft")).strip() == "echo: Draft"
+    assert service.router.stats()["local"]["errors"] >= 1
+
+
+def test_async_clients_are_per_event_loop_and_closed_with_it(server, monkeypatch):
+    # Batch chunks each run in their own asyncio.run(); the Groq SDK talks to the test server
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    monkeypatch.setenv("GROQ_BASE_URL", server.base_url[:-len("/v1")])
+    monkeypatch.setenv("LLM_PROVIDERS", "groq")
+    service = LLMService()
+    clients = []
+
+    async def batch(i):
+        clients.append(await service.groq_async_clients.get())
+        return await asyncio.gather(*(service._acomplete(f"b{i}-{j}", False) for j in range(3)))
+
+    for i in range(2):
+        assert asyncio.run(batch(i)) == [f"echo: b{i}-{j}" for j in range(3)]
+    assert clients[0] is not clients[1] and all(client.is_closed() for client in clients)
+    assert service.router.stats()["groq"]["errors"] == 0
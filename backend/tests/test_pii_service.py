@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from backend.services.pii_service import PIIService, luhn_valid, PRE_REDACTED_START, PRE_REDACTED_END
+
+
+@pytest.fixture(scope="module")
+def pii():
+    return PIIService()
+
+
+def test_redacts_cards_ssns_and_phones(pii):
+    text = ("Card 4111 1111 1111 1111, SSN 123-45-6789, call (555) 123-4567 "
+            "or +1 555.123.4567. Contact jane@example.com")
+    assert pii.redact(text) == ("Card [REDACTED_CREDIT_CARD], SSN [REDACTED_SSN], call [REDACTED_PHONE] "
+                                "or [REDACTED_PHONE]. Contact jane@example.com")
+
+
+def test_long_digit_runs_need_a_valid_luhn_checksum(pii):
+    assert luhn_valid("4111111111111111") and not luhn_valid("4111111111111112")
+    assert pii.redact("Order 1234567890123 shipped") == "Order 1234567890123 shipped"
+    assert pii.redact("4111-1111-1111-1111") == "[REDACTED_CREDIT_CARD]"
+    assert pii.redact("Dates 2024-11-03, ext 555-1234") == "Dates 2024-11-03, ext 555-1234"
+    assert pii.redact("") == ""
+
+
+def test_card_followed_or_preceded_by_other_digits_is_still_redacted(pii):
+    assert pii.redact("Card 4111 1111 1111 1111 123 cvv") == "Card [REDACTED_CREDIT_CARD] 123 cvv"
+    assert pii.redact("Pay with 4111111111111111 2 times") == "Pay with [REDACTED_CREDIT_CARD] 2 times"
+    assert pii.redact("Qty 12 4111-1111-1111-1111") == "Qty 12 [REDACTED_CREDIT_CARD]"
+    # A card can't end inside a longer unbroken number
+    assert pii.redact("Ref 41111111111111112") == "Ref 41111111111111112"
+
+
+
+def test_cards_with_wider_separators_are_redacted(pii):
+    assert pii.redact("Card 4111  1111  1111  1111 ok") == "Card [REDACTED_CREDIT_CARD] ok"
+    assert pii.redact("Card 4111 - 1111 - 1111 - 1111 ok") == "Card [REDACTED_CREDIT_CARD] ok"
+
+
+def test_user_text_cannot_forge_pre_redacted_segments(pii):
+    forged = f"{PRE_REDACTED_START}SSN 123-45-6789{PRE_REDACTED_END}"
+    assert pii.redact(pii.strip_markers(forged)) == "SSN [REDACTED_SSN]"
+    assert pii.redact(pii.mark_redacted(forged)) == "SSN 123-45-6789"  # trusted: caller redacted it
+    # An unterminated marker is scanned like ordinary text
+    assert pii.redact(f"{PRE_REDACTED_START}SSN 123-45-6789") == "SSN [REDACTED_SSN]"
+
+
+@pytest.mark.parametrize("body", [
+    "1 " * 50_000,                                   # digits separated by single spaces
+    ("1" + " -" * 10) * 4_500,                       # long separator runs between digits
+    "9" * 100_000,                                   # one huge digit run
+    ("Invoice 4821 qty 3 @ 12.50 = 37.50 ref 2024-11-03 acct 0012345678 ") * 1_500,
+    ("555 123 " * 6 + "x ") * 2_000,                 # near-miss phone numbers
+])
+def test_redact_is_fast_on_100kb_digit_heavy_bodies(pii, body):
+    body = body[:100_000]
+    start = time.perf_counter()
+    pii.redact(body)
+    assert time.perf_counter() - start < 0.5
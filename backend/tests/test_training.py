@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.models import Email
+from backend.training.generate_dataset import generate_dataset, iter_dataset, iter_synthetic_emails
+from backend.training.search_hyperparams import (
+    best_config_overrides, candidate_grid, pick_within_budget, successive_halving, write_best_config,
+)
+from backend.training.train_model import (
+    TRAINING_CONFIG, build_classifier_pipeline, generate_semantic_dataset, load_config_overrides,
+)
+from backend.training.train_from_db import train_from_db
+
+
+def test_train_from_db_uses_labelled_rows_and_time_split(db_session, tmp_path):
+    base = datetime(2026, 1, 1)
+    for i, row in enumerate(iter_synthetic_emails(200, seed=1)):
+        db_session.add(Email(
+            id=row["id"],
+            sender=row["sender"],
+            subject=row["subject"],
+            body=row["body"],
+            timestamp=base + timedelta(hours=i),
+            category=row["label"],
+            category_source="confirmed" if i % 4 else "classifier",
+        ))
+    db_session.commit()
+
+    metrics = train_from_db(
+        db_session,
+        config={"chunk_size": 32, "test_fraction": 0.25, "n_features": 2 ** 12},
+        output_path=tmp_path / "ooc.joblib",
+    )
+
+    assert metrics["labelled_rows"] == 150
+    assert metrics["train_rows"] + metrics["test_rows"] == 150
+    assert metrics["test_rows"] > 0
+    assert metrics["accuracy"] > 0.5
+    assert (tmp_path / "ooc.joblib").exists()
+
+
+def test_generate_dataset_rejects_shards_outside_the_plan(tmp_path):
+    manifest = generate_dataset(tmp_path, 30, shard_rows=10, workers=1, shards=[2])
+    assert [s["rows"] for s in manifest["shards"]] == [10]
+    assert (tmp_path / "manifest-00002.json").exists()
+
+    with pytest.raises(ValueError, match="within 0-2"):
+        generate_dataset(tmp_path, 30, shard_rows=10, workers=1, shards=[3, 7])
+
+
+def test_semantic_dataset_uses_the_given_noise_config():
+    clean = {**TRAINING_CONFIG, "label_flip_rate": 0.0, "ambiguous_examples": False, "context_overlap": False}
+    assert len(generate_semantic_dataset(n_per_category=5, config=clean)) < len(generate_semantic_dataset(n_per_category=5))
+
+
+def test_search_pick_is_applied_with_unlimited_depth(tmp_path):
+    df = generate_semantic_dataset(n_per_category=30)
+    space = {"tfidf_max_features": [500], "tfidf_ngram_range": [(1, 1)], "ensemble": ["lr", "rf"],
+             "rf_n_estimators": [5], "rf_max_depth": [None]}
+    candidates = candidate_grid(space)
+    search = successive_halving(df["text"], df["label"], candidates,
+                                {"eta": 2, "min_fraction": 0.5, "latency_repeats": 2, "batch_size": 8},
+                                log=lambda *args: None)
+    assert len(search["rungs"]) == 2 and len(search["rungs"][0]) == 2
+    assert pick_within_budget(search["final"], 1.0) in search["final"]
+
+    rf = next(p for p in candidates if p["ensemble"] == "rf")
+    write_best_config(rf, tmp_path / "best.json")
+    config = {**TRAINING_CONFIG, **load_config_overrides(tmp_path / "best.json")}
+    assert config["rf_max_depth"] is None and config["tfidf_ngram_range"] == (1, 1)
+    assert build_classifier_pipeline(config).named_steps["classifier"].max_depth is None
+
+    lr = next(p for p in candidates if p["ensemble"] == "lr")
+    assert "rf_max_depth" not in best_config_overrides(lr)
+
+
+def test_generate_dataset_uses_the_given_noise_config(tmp_path):
+    clean = {"label_flip_rate": 0.0, "ambiguous_examples": False, "context_overlap": False}
+    manifest = generate_dataset(tmp_path / "clean", 40, seed=3, shard_rows=20, workers=1, config=clean)
+    assert manifest["noise"] == clean
+
+    flipped = generate_dataset(tmp_path / "flipped", 40, seed=3, shard_rows=20, workers=1,
+                               config={**clean, "label_flip_rate": 1.0})
+    assert flipped["noise"]["label_flip_rate"] == 1.0
+    clean_labels = [row["label"] for row in iter_dataset(tmp_path / "clean")]
+    assert clean_labels != [row["label"] for row in iter_dataset(tmp_path / "flipped")]
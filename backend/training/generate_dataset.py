@@ -0,0 +1,270 @@
+"""
+Streaming Synthetic Dataset Generator
+=====================================
+Produces arbitrarily large synthetic email datasets from the semantic
+templates in train_model.py, with bounded memory.
+
+FEATURES:
+- Generator-based: rows are produced one at a time, never held in a DataFrame
+- Same noise controls as training (label_flip_rate, ambiguous_examples,
+  context_overlap from TRAINING_CONFIG, or from a passed-in config)
+- Sharded JSONL or Parquet output (Parquet requires pyarrow)
+- Seedable: every shard has its own RNG derived from (seed, shard index),
+  so output is identical regardless of worker count or scheduling
+- Parallel: shards are written by a process pool
+
+USAGE:
+    python backend/training/generate_dataset.py --rows 2000000 --out data/synthetic
+    python backend/training/generate_dataset.py --rows 5000000 --format parquet --workers 8 --seed 7
+
+Each run writes shard-XXXXX.<ext> files plus a manifest.json describing the run.
+"""
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+try:
+    from backend.training.train_model import (
+        TRAINING_CONFIG, CATEGORIES, EDGE_CASES, AMBIGUOUS_EXAMPLES,
+        OVERLAP_TEXT, SIMILAR_LABEL_MAP, get_category_templates, vary_template,
+        load_config_overrides,
+    )
+except ImportError:
+    from train_model import (
+        TRAINING_CONFIG, CATEGORIES, EDGE_CASES, AMBIGUOUS_EXAMPLES,
+        OVERLAP_TEXT, SIMILAR_LABEL_MAP, get_category_templates, vary_template,
+        load_config_overrides,
+    )
+
+# Mix-in rates matching generate_semantic_dataset() at 150 samples/category:
+# 40 edge-case rows, 40 ambiguous rows and 9 overlap rows per ~1,500 template rows.
+EDGE_CASE_RATE = 0.027
+AMBIGUOUS_RATE = 0.027
+OVERLAP_RATE = 0.006
+
+DEFAULT_SHARD_ROWS = 250_000
+PARQUET_ROW_GROUP = 50_000
+
+NOISE_KEYS = ("label_flip_rate", "ambiguous_examples", "context_overlap")
+
+
+def shard_seed(seed: int, shard_index: int) -> int:
+    """Derive an independent, reproducible seed for one shard."""
+    return (seed * 1_000_003 + shard_index) & 0xFFFFFFFF
+
+
+def _split_text(text: str) -> tuple:
+    """Split a 'Subject: .. Body: .. Sender: ..' training string back into fields."""
+    subject, _, rest = text.partition(". Body: ")
+    body, _, sender = rest.rpartition(". Sender: ")
+    return subject.replace("Subject: ", "", 1), body, sender
+
+
+def iter_synthetic_emails(n_rows: int, seed: int = 42, config: dict = None,
+                          start_id: int = 0) -> Iterator[dict]:
+    """
+    Lazily yield n_rows synthetic labelled emails.
+
+    Categories are round-robined so every prefix of the stream is balanced.
+    Noise is injected per row at the rates in config (missing keys fall back
+    to TRAINING_CONFIG).
+    """
+    config = {**TRAINING_CONFIG, **(config or {})}
+    rng = random.Random(seed)
+    templates = get_category_templates()
+    flip_rate = config["label_flip_rate"]
+    ambiguous_rate = AMBIGUOUS_RATE if config["ambiguous_examples"] else 0.0
+    overlap_rate = OVERLAP_RATE if config["context_overlap"] else 0.0
+    overlap_labels = rng.sample(CATEGORIES, 3)
+
+    for i in range(n_rows):
+        roll = rng.random()
+        if roll < EDGE_CASE_RATE:
+            text, label = rng.choice(EDGE_CASES)
+            subject, body, sender = _split_text(text)
+        elif roll < EDGE_CASE_RATE + ambiguous_rate:
+            text, label = rng.choice(AMBIGUOUS_EXAMPLES)
+            subject, body, sender = _split_text(text)
+        elif roll < EDGE_CASE_RATE + ambiguous_rate + overlap_rate:
+            text, label = OVERLAP_TEXT, rng.choice(overlap_labels)
+            subject, body, sender = _split_text(text)
+        else:
+            label, category_templates = templates[i % len(templates)]
+            subject, body, sender = rng.choice(category_templates)
+            subject, body = vary_template(subject, body, rng)
+            text = f"Subject: {subject}. Body: {body}. Sender: {sender}"
+            if rng.random() < flip_rate:
+                label = SIMILAR_LABEL_MAP.get(label, "General")
+
+        yield {
+            "id": f"syn_{start_id + i:012d}",
+            "subject": subject,
+            "body": body,
+            "sender": sender,
+            "text": text,
+            "label": label,
+        }
+
+
+def _write_jsonl(rows: Iterator[dict], path: Path) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def _write_parquet(rows: Iterator[dict], path: Path, row_group: int = PARQUET_ROW_GROUP) -> int:
+    """Write rows in fixed-size row groups so at most one group is held in memory."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)") from e
+
+    fields = ["id", "subject", "body", "sender", "text", "label"]
+    schema = pa.schema([(name, pa.string()) for name in fields])
+    count = 0
+    buffer = {name: [] for name in fields}
+
+    with pq.ParquetWriter(path, schema) as writer:
+        for row in rows:
+            for name in fields:
+                buffer[name].append(row[name])
+            count += 1
+            if len(buffer["id"]) >= row_group:
+                writer.write_table(pa.table(buffer, schema=schema))
+                buffer = {name: [] for name in fields}
+        if buffer["id"]:
+            writer.write_table(pa.table(buffer, schema=schema))
+    return count
+
+
+def write_shard(out_dir: str, shard_index: int, n_rows: int, seed: int,
+                fmt: str = "jsonl", shard_rows: int = DEFAULT_SHARD_ROWS, config: dict = None) -> dict:
+    """Generate and write a single shard. Safe to call from any process."""
+    ext = "jsonl" if fmt == "jsonl" else "parquet"
+    path = Path(out_dir) / f"shard-{shard_index:05d}.{ext}"
+    rows = iter_synthetic_emails(
+        n_rows,
+        seed=shard_seed(seed, shard_index),
+        config=config,
+        start_id=shard_index * shard_rows,
+    )
+    start = time.perf_counter()
+    count = _write_jsonl(rows, path) if fmt == "jsonl" else _write_parquet(rows, path)
+    return {"shard": shard_index, "path": path.name, "rows": count,
+            "seconds": round(time.perf_counter() - start, 3)}
+
+
+def generate_dataset(out_dir: str, total_rows: int, seed: int = 42, fmt: str = "jsonl",
+                     shard_rows: int = DEFAULT_SHARD_ROWS, workers: int = None,
+                     shards: list = None, config: dict = None) -> dict:
+    """
+    Write total_rows synthetic emails to sharded files in out_dir.
+
+    Args:
+        shards: Optional subset of shard indices to write. Lets several
+            machines/processes split one dataset (e.g. shards 0-9 here, 10-19
+            elsewhere) while producing exactly the same rows as a single run.
+        config: Noise overrides (label_flip_rate, ambiguous_examples,
+            context_overlap); missing keys fall back to TRAINING_CONFIG.
+    """
+    if fmt not in ("jsonl", "parquet"):
+        raise ValueError(f"Unknown format: {fmt}")
+
+    n_shards = max(1, -(-total_rows // shard_rows))
+    if shards is not None:
+        invalid = sorted(set(s for s in shards if not 0 <= s < n_shards))
+        if invalid or not shards:
+            raise ValueError(f"Shard indices must be within 0-{n_shards - 1} for {total_rows:,} rows "
+                             f"of {shard_rows:,}; got {invalid or 'none'}")
+    config = {**TRAINING_CONFIG, **(config or {})}
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    plan = []
+    for index in range(n_shards):
+        rows = min(shard_rows, total_rows - index * shard_rows)
+        if shards is None or index in shards:
+            plan.append((index, rows))
+
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    if workers == 1 or len(plan) == 1:
+        results = [write_shard(out_dir, i, rows, seed, fmt, shard_rows, config) for i, rows in plan]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(plan))) as pool:
+            futures = [pool.submit(write_shard, out_dir, i, rows, seed, fmt, shard_rows, config) for i, rows in plan]
+            results = [f.result() for f in futures]
+
+    manifest = {
+        "total_rows": total_rows,
+        "shard_rows": shard_rows,
+        "n_shards": n_shards,
+        "seed": seed,
+        "format": fmt,
+        "noise": {k: config[k] for k in NOISE_KEYS},
+        "shards": sorted(results, key=lambda r: r["shard"]),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    # Partial runs (--shards) write their own manifest so parallel hosts don't clobber each other
+    manifest_name = "manifest.json" if shards is None else f"manifest-{min(s for s, _ in plan):05d}.json"
+    with open(Path(out_dir) / manifest_name, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def iter_dataset(out_dir: str) -> Iterator[dict]:
+    """Stream rows back from a generated dataset directory, shard by shard."""
+    for path in sorted(Path(out_dir).glob("shard-*")):
+        if path.suffix == ".jsonl":
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+        elif path.suffix == ".parquet":
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches():
+                yield from batch.to_pylist()
+
+
+def _parse_shards(spec: str) -> list:
+    """Parse '0-9,12,15' into a list of shard indices."""
+    result = []
+    for part in spec.split(","):
+        if "-" in part:
+            lo, hi = part.split("-")
+            result.extend(range(int(lo), int(hi) + 1))
+        elif part:
+            result.append(int(part))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream synthetic training emails to sharded files")
+    parser.add_argument("--rows", type=int, required=True, help="Total number of rows")
+    parser.add_argument("--out", default=str(Path(__file__).resolve().parent.parent / "data" / "synthetic"),
+                        help="Output directory")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--seed", type=int, default=TRAINING_CONFIG["random_seed"])
+    parser.add_argument("--shard-rows", type=int, default=DEFAULT_SHARD_ROWS, help="Rows per shard")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--shards", type=str, default=None,
+                        help="Only write these shard indices, e.g. '0-9' (for multi-host runs)")
+    parser.add_argument("--config", type=str, default=None,
+                        help="JSON file of TRAINING_CONFIG overrides (e.g. best_config.json)")
+    args = parser.parse_args()
+
+    manifest = generate_dataset(
+        args.out, args.rows, seed=args.seed, fmt=args.format, shard_rows=args.shard_rows,
+        workers=args.workers, shards=_parse_shards(args.shards) if args.shards else None,
+        config=load_config_overrides(args.config) if args.config else None,
+    )
+    written = sum(s["rows"] for s in manifest["shards"])
+    print(f"✅ Wrote {written:,} rows in {len(manifest['shards'])} shard(s) to {args.out} "
+          f"({manifest['seconds']:.1f}s, {written / max(manifest['seconds'], 1e-3):,.0f} rows/s)")
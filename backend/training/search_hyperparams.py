@@ -0,0 +1,271 @@
+"""
+Latency-Aware Hyperparameter Search
+===================================
+Successive-halving search over vectorizer, ensemble and tree settings that
+records accuracy AND inference cost for every candidate.
+
+For each candidate at each rung we measure:
+- validation accuracy
+- single-email latency (median of repeated one-row predict_proba calls)
+- batch latency (per-email cost of one predict_proba over a batch)
+- serialized model size
+
+Survivors of each rung are the latency/accuracy Pareto frontier plus the
+top 1/eta candidates by accuracy, so fast-but-slightly-less-accurate models
+are not eliminated early. The final report lists the Pareto frontier and
+the fastest model within an accuracy budget of the best one.
+
+USAGE:
+    python backend/training/search_hyperparams.py
+    python backend/training/search_hyperparams.py --samples-per-category 300 --eta 3 --accuracy-budget 0.01
+    python backend/training/search_hyperparams.py --apply   # write the pick into search_best_config.json
+"""
+import argparse
+import itertools
+import json
+import pickle
+import random
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+try:
+    from backend.training.train_model import TRAINING_CONFIG, build_classifier_pipeline, generate_semantic_dataset
+except ImportError:
+    from train_model import TRAINING_CONFIG, build_classifier_pipeline, generate_semantic_dataset
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+REPORT_PATH = SCRIPT_DIR / "search_report.json"
+BEST_CONFIG_PATH = SCRIPT_DIR / "search_best_config.json"
+
+SEARCH_SPACE = {
+    "tfidf_max_features": [2000, 5000, 10000],
+    "tfidf_ngram_range": [(1, 1), (1, 2)],
+    "ensemble": ["lr", "rf", "voting"],
+    "rf_n_estimators": [25, 50, 100],
+    "rf_max_depth": [10, 20, None],
+}
+
+SEARCH_CONFIG = {
+    "eta": 3,                     # Keep ~1/eta of candidates per rung
+    "min_fraction": 1 / 9,        # Training data share used at the first rung
+    "validation_split": 0.2,
+    "latency_repeats": 30,        # Single-email predict calls per measurement
+    "batch_size": 256,            # Rows per batch latency measurement
+}
+
+
+def candidate_grid(space: dict = SEARCH_SPACE) -> list:
+    """Expand the search space, dropping tree settings that don't apply to LR-only models."""
+    keys = list(space)
+    seen, candidates = set(), []
+    for values in itertools.product(*(space[k] for k in keys)):
+        params = dict(zip(keys, values))
+        if params["ensemble"] == "lr":
+            params["rf_n_estimators"] = None
+            params["rf_max_depth"] = None
+        key = json.dumps(params, sort_keys=True, default=str)
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+    return candidates
+
+
+def _model_config(params: dict) -> dict:
+    config = {**TRAINING_CONFIG, **{k: v for k, v in params.items() if v is not None}}
+    if params["ensemble"] != "lr" and params.get("rf_max_depth") is None:
+        config["rf_max_depth"] = None
+    # Latency is measured the way the API serves requests: one thread
+    config["n_jobs"] = 1
+    return config
+
+
+def best_config_overrides(params: dict) -> dict:
+    """
+    The picked parameters as train_model --config overrides. Tree settings
+    are dropped for LR-only models; otherwise None is kept (written as null),
+    since rf_max_depth=None means unlimited depth, not "use the default".
+    """
+    if params["ensemble"] == "lr":
+        return {k: v for k, v in params.items() if not k.startswith("rf_")}
+    return dict(params)
+
+
+def write_best_config(params: dict, path: Path = BEST_CONFIG_PATH):
+    with open(path, "w") as f:
+        json.dump(best_config_overrides(params), f, indent=2, default=list)
+
+
+def measure_latency(model, texts: list, repeats: int, batch_size: int) -> dict:
+    """Single-email median latency and per-email batch latency, in milliseconds."""
+    single = []
+    for i in range(repeats):
+        t0 = time.perf_counter()
+        model.predict_proba([texts[i % len(texts)]])
+        single.append(time.perf_counter() - t0)
+
+    batch = (texts * (batch_size // len(texts) + 1))[:batch_size]
+    t0 = time.perf_counter()
+    model.predict_proba(batch)
+    batch_seconds = time.perf_counter() - t0
+
+    return {
+        "single_ms": round(statistics.median(single) * 1000, 3),
+        "batch_ms_per_email": round(batch_seconds / batch_size * 1000, 4),
+    }
+
+
+def evaluate_candidate(params: dict, X_train, y_train, X_val, y_val, search_config: dict) -> dict:
+    model = build_classifier_pipeline(_model_config(params), n_jobs=1)
+    t0 = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - t0
+
+    accuracy = float(np.mean(model.predict(X_val) == np.asarray(y_val)))
+    latency = measure_latency(
+        model, list(X_val[:64]), search_config["latency_repeats"], search_config["batch_size"]
+    )
+    return {
+        "params": params,
+        "accuracy": round(accuracy, 4),
+        **latency,
+        "size_kb": round(len(pickle.dumps(model)) / 1024, 1),
+        "fit_seconds": round(fit_seconds, 2),
+        "train_rows": len(X_train),
+    }
+
+
+def pareto_frontier(results: list) -> list:
+    """Results not dominated on (higher accuracy, lower single-email latency)."""
+    frontier = []
+    for r in results:
+        dominated = any(
+            o["accuracy"] >= r["accuracy"] and o["single_ms"] <= r["single_ms"]
+            and (o["accuracy"] > r["accuracy"] or o["single_ms"] < r["single_ms"])
+            for o in results
+        )
+        if not dominated:
+            frontier.append(r)
+    return sorted(frontier, key=lambda r: r["single_ms"])
+
+
+def pick_within_budget(results: list, accuracy_budget: float) -> dict:
+    """Fastest result whose accuracy is within accuracy_budget of the best."""
+    best_accuracy = max(r["accuracy"] for r in results)
+    eligible = [r for r in results if r["accuracy"] >= best_accuracy - accuracy_budget]
+    return min(eligible, key=lambda r: (r["single_ms"], r["size_kb"]))
+
+
+def successive_halving(X, y, candidates: list, search_config: dict = None, log=print) -> dict:
+    """Run the search and return {"rungs": [...], "final": [...]}."""
+    search_config = {**SEARCH_CONFIG, **(search_config or {})}
+    eta = search_config["eta"]
+    X_train, X_val, y_train, y_val = train_test_split(
+        X, y, test_size=search_config["validation_split"],
+        random_state=TRAINING_CONFIG["random_seed"], stratify=y,
+    )
+
+    n_rungs = 1
+    while search_config["min_fraction"] * eta ** n_rungs <= 1 + 1e-9:
+        n_rungs += 1
+
+    rungs = []
+    survivors = candidates
+    for rung in range(n_rungs):
+        fraction = min(1.0, search_config["min_fraction"] * eta ** rung)
+        if fraction < 1.0:
+            X_rung, _, y_rung, _ = train_test_split(
+                X_train, y_train, train_size=fraction,
+                random_state=TRAINING_CONFIG["random_seed"] + rung, stratify=y_train,
+            )
+        else:
+            X_rung, y_rung = X_train, y_train
+
+        log(f"\n[rung {rung}] {len(survivors)} candidates on {len(X_rung)} rows ({fraction:.0%} of train)")
+        results = []
+        for params in survivors:
+            result = evaluate_candidate(params, X_rung, y_rung, X_val, y_val, search_config)
+            result["rung"] = rung
+            results.append(result)
+            log(f"   acc={result['accuracy']:.3f} single={result['single_ms']:.2f}ms "
+                f"batch={result['batch_ms_per_email']:.3f}ms size={result['size_kb']:.0f}KB  {_describe(params)}")
+        rungs.append(results)
+
+        if rung == n_rungs - 1:
+            break
+        keep = max(1, len(results) // eta)
+        by_accuracy = sorted(results, key=lambda r: (-r["accuracy"], r["single_ms"]))[:keep]
+        frontier = pareto_frontier(results)
+        kept_ids = {id(r) for r in by_accuracy} | {id(r) for r in frontier}
+        survivors = [r["params"] for r in results if id(r) in kept_ids]
+
+    return {"rungs": rungs, "final": rungs[-1]}
+
+
+def _describe(params: dict) -> str:
+    text = f"{params['ensemble']:<6} tfidf={params['tfidf_max_features']} ngram={tuple(params['tfidf_ngram_range'])}"
+    if params["ensemble"] != "lr":
+        text += f" trees={params['rf_n_estimators']} depth={params['rf_max_depth']}"
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Successive-halving search with latency/size measurements")
+    parser.add_argument("--samples-per-category", type=int, default=TRAINING_CONFIG["samples_per_category"])
+    parser.add_argument("--eta", type=int, default=SEARCH_CONFIG["eta"])
+    parser.add_argument("--accuracy-budget", type=float, default=0.01,
+                        help="Pick the fastest model within this accuracy of the best (absolute, e.g. 0.01 = 1pt)")
+    parser.add_argument("--report", type=str, default=str(REPORT_PATH))
+    parser.add_argument("--apply", action="store_true",
+                        help=f"Write the picked parameters to {BEST_CONFIG_PATH.name}")
+    args = parser.parse_args()
+
+    random.seed(TRAINING_CONFIG["random_seed"])
+    np.random.seed(TRAINING_CONFIG["random_seed"])
+
+    print("=" * 72)
+    print("LATENCY-AWARE HYPERPARAMETER SEARCH (successive halving)")
+    print("=" * 72)
+    df = generate_semantic_dataset(n_per_category=args.samples_per_category)
+    candidates = candidate_grid()
+    print(f"Dataset: {len(df)} rows | Candidates: {len(candidates)} | eta={args.eta}")
+
+    start = time.perf_counter()
+    search = successive_halving(df["text"], df["label"], candidates, {"eta": args.eta})
+    final = search["final"]
+    frontier = pareto_frontier(final)
+    pick = pick_within_budget(final, args.accuracy_budget)
+
+    print(f"\n{'=' * 72}")
+    print("PARETO FRONTIER (accuracy vs single-email latency)")
+    print(f"{'=' * 72}")
+    print(f"{'accuracy':>9} | {'single ms':>9} | {'batch ms':>9} | {'size KB':>8} | model")
+    for r in frontier:
+        marker = "  <- pick" if r is pick else ""
+        print(f"{r['accuracy']:>9.3f} | {r['single_ms']:>9.2f} | {r['batch_ms_per_email']:>9.3f} | "
+              f"{r['size_kb']:>8.0f} | {_describe(r['params'])}{marker}")
+    print(f"\nFastest within {args.accuracy_budget:.3f} of best accuracy: {_describe(pick['params'])}")
+    print(f"Search time: {time.perf_counter() - start:.1f}s")
+
+    report = {
+        "accuracy_budget": args.accuracy_budget,
+        "eta": args.eta,
+        "samples_per_category": args.samples_per_category,
+        "pick": pick,
+        "pareto_frontier": frontier,
+        "rungs": search["rungs"],
+    }
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Report saved to: {args.report}")
+
+    if args.apply:
+        write_best_config(pick["params"])
+        print(f"Best config saved to: {BEST_CONFIG_PATH} (retrain with: train_model.py --config {BEST_CONFIG_PATH.name})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Out-of-Core Training on the Mailbox Database
+============================================
+Trains a classifier on real, user-labelled emails from the `emails` table.
+
+Labelled rows are emails whose category the user confirmed or corrected
+(`category_source` in "confirmed" / "user", set via PUT /inbox/{id}/category).
+
+FEATURES:
+- Rows are streamed from SQLite in chunks (never loaded all at once)
+- HashingVectorizer features: stateless, no vocabulary held in memory
+- SGDClassifier(log_loss).partial_fit per chunk, so memory stays flat
+  regardless of mailbox size
+- Time-based hold-out: the newest `test_fraction` of labelled mail is
+  used for evaluation, everything older for training
+
+USAGE:
+    python backend/training/train_from_db.py
+    python backend/training/train_from_db.py --chunk-size 5000 --epochs 3 --test-fraction 0.2
+
+Use the resulting model with CLASSIFIER_MODEL_PATH=backend/data/classifier_ooc.joblib.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Iterator
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, classification_report
+from sklearn.pipeline import Pipeline
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy.orm import Session
+from backend.models import Email
+from backend.services.classifier_v2 import CATEGORIES
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+OOC_MODEL_PATH = DATA_DIR / "classifier_ooc.joblib"
+
+LABELLED_SOURCES = ("confirmed", "user")
+
+OOC_CONFIG = {
+    "chunk_size": 2000,          # Rows per partial_fit call
+    "test_fraction": 0.2,        # Newest share of labelled mail held out for evaluation
+    "epochs": 2,                 # Passes over the training stream
+    "n_features": 2 ** 20,       # Hashing space
+    "alpha": 1e-5,               # SGD regularization
+    "random_seed": 42,
+}
+
+
+def build_ooc_vectorizer(n_features: int = OOC_CONFIG["n_features"]) -> HashingVectorizer:
+    """Stateless text features - identical at train and predict time, nothing to fit."""
+    return HashingVectorizer(
+        n_features=n_features,
+        ngram_range=(1, 2),
+        stop_words='english',
+        alternate_sign=False,
+        norm='l2',
+    )
+
+
+def _labelled_query(db: Session):
+    return (
+        db.query(Email.subject, Email.body, Email.sender, Email.category, Email.timestamp)
+        .filter(Email.category_source.in_(LABELLED_SOURCES))
+        .filter(Email.category.in_(CATEGORIES))
+    )
+
+
+def find_time_cutoff(db: Session, test_fraction: float):
+    """
+    Timestamp splitting labelled mail into train (older) and test (newer).
+    Returns (cutoff, total) where cutoff is None if there is nothing to hold out.
+    """
+    total = _labelled_query(db).count()
+    n_train = int(total * (1 - test_fraction))
+    if total == 0 or n_train >= total:
+        return None, total
+    row = _labelled_query(db).order_by(Email.timestamp, Email.id).offset(n_train).first()
+    return row.timestamp, total
+
+
+def iter_labelled_chunks(db: Session, chunk_size: int, before=None, since=None) -> Iterator[tuple]:
+    """Yield (texts, labels) chunks streamed from the emails table in time order."""
+    query = _labelled_query(db)
+    if before is not None:
+        query = query.filter(Email.timestamp < before)
+    if since is not None:
+        query = query.filter(Email.timestamp >= since)
+
+    texts, labels = [], []
+    for subject, body, sender, category, _ in query.order_by(Email.timestamp, Email.id).yield_per(chunk_size):
+        texts.append(f"Subject: {subject}. Body: {body}. Sender: {sender}")
+        labels.append(category)
+        if len(texts) >= chunk_size:
+            yield texts, labels
+            texts, labels = [], []
+    if texts:
+        yield texts, labels
+
+
+def train_from_db(db: Session, config: dict = None, output_path: Path = OOC_MODEL_PATH) -> dict:
+    """
+    Fit the out-of-core classifier on labelled mailbox rows and evaluate it
+    on the time-based hold-out. Returns a metrics dict.
+    """
+    config = {**OOC_CONFIG, **(config or {})}
+    chunk_size = config["chunk_size"]
+
+    cutoff, total = find_time_cutoff(db, config["test_fraction"])
+    if total == 0:
+        raise ValueError("No labelled emails found (confirm or correct categories via PUT /inbox/{id}/category)")
+
+    vectorizer = build_ooc_vectorizer(config["n_features"])
+    model = SGDClassifier(
+        loss='log_loss',
+        alpha=config["alpha"],
+        random_state=config["random_seed"],
+    )
+    classes = np.array(CATEGORIES)
+
+    start = time.perf_counter()
+    n_train = 0
+    for epoch in range(config["epochs"]):
+        for texts, labels in iter_labelled_chunks(db, chunk_size, before=cutoff):
+            model.partial_fit(vectorizer.transform(texts), labels, classes=classes)
+            if epoch == 0:
+                n_train += len(texts)
+    train_seconds = time.perf_counter() - start
+
+    if n_train == 0:
+        raise ValueError("Not enough labelled history before the hold-out cutoff to train")
+
+    y_true, y_pred = [], []
+    if cutoff is not None:
+        for texts, labels in iter_labelled_chunks(db, chunk_size, since=cutoff):
+            y_true.extend(labels)
+            y_pred.extend(model.predict(vectorizer.transform(texts)))
+
+    pipeline = Pipeline([('hashing', vectorizer), ('classifier', model)])
+    output_path.parent.mkdir(exist_ok=True)
+    joblib.dump(pipeline, output_path)
+
+    return {
+        "labelled_rows": total,
+        "train_rows": n_train,
+        "test_rows": len(y_true),
+        "cutoff": cutoff.isoformat() if cutoff else None,
+        "accuracy": accuracy_score(y_true, y_pred) if y_true else None,
+        "report": classification_report(y_true, y_pred, zero_division=0) if y_true else "",
+        "train_seconds": round(train_seconds, 2),
+        "model_path": str(output_path),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the classifier out-of-core on labelled mailbox rows")
+    parser.add_argument("--chunk-size", type=int, default=OOC_CONFIG["chunk_size"])
+    parser.add_argument("--test-fraction", type=float, default=OOC_CONFIG["test_fraction"])
+    parser.add_argument("--epochs", type=int, default=OOC_CONFIG["epochs"])
+    parser.add_argument("--out", type=str, default=str(OOC_MODEL_PATH))
+    args = parser.parse_args()
+
+    from backend.database import SessionLocal
+
+    print("=" * 60)
+    print("OUT-OF-CORE CLASSIFIER - TRAINING ON MAILBOX")
+    print("=" * 60)
+    db = SessionLocal()
+    try:
+        metrics = train_from_db(
+            db,
+            config={"chunk_size": args.chunk_size, "test_fraction": args.test_fraction, "epochs": args.epochs},
+            output_path=Path(args.out),
+        )
+    finally:
+        db.close()
+
+    print(f"Labelled rows: {metrics['labelled_rows']} (train {metrics['train_rows']}, test {metrics['test_rows']})")
+    print(f"Hold-out cutoff: {metrics['cutoff']}")
+    print(f"Training time: {metrics['train_seconds']}s")
+    if metrics["accuracy"] is not None:
+        print(f"Hold-out Accuracy: {metrics['accuracy']:.2%}")
+        print(f"\nClassification Report:\n\n{metrics['report']}")
+    print(f"Model saved to: {metrics['model_path']}")
@@ -85,7 +85,8 @@ export const analyticsApi = {
 export const agentApi = {
     process: (id: string) => api.post(`/agent/process/${id}`),
     processAll: () => api.post('/agent/process-all'),
-    chat: (query: string, emailId?: string) => api.post('/agent/chat', { query, email_id: emailId }),
+    chat: (query: string, emailId?: string, sessionId?: number) =>
+        api.post('/agent/chat', { query, email_id: emailId, session_id: sessionId }),
     draft: (emailId: string, instructions?: string, tone?: string, length?: string) => api.post('/agent/draft', { email_id: emailId, instructions, tone, length }),
 };
 
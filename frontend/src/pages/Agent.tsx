@@ -18,6 +18,7 @@ const Agent = () => {
     ]);
     const [input, setInput] = useState('');
     const [loading, setLoading] = useState(false);
+    const [sessionId, setSessionId] = useState<number>();
     const scrollRef = useRef<HTMLDivElement>(null);
 
     useEffect(() => {
@@ -36,7 +37,8 @@ const Agent = () => {
         setLoading(true);
 
         try {
-            const res = await agentApi.chat(userMsg);
+            const res = await agentApi.chat(userMsg, undefined, sessionId);
+            setSessionId(res.data.session_id);
             setMessages(prev => [...prev, { role: 'agent', content: res.data.response, timestamp: new Date() }]);
         } catch (err) {
             setMessages(prev => [...prev, { role: 'agent', content: 'Sorry, I encountered an error processing your request.', timestamp: new Date() }]);